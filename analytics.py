@@ -0,0 +1,387 @@
+"""
+analytics.py
+
+Mission KPIs over recorded timelines, per run and across batches of runs.
+
+Per target (from events, falling back to target state changes):
+    time_to_detect       mission start -> first detection
+    detect_to_confirm    detection -> confirmation
+    confirm_to_dispatch  confirmation -> UGV dispatched
+    time_to_rescue       detection -> rescued (what a found person waits)
+Per run:
+    ugv_idle_ratio       share of UGV-ticks spent in STANDBY
+    coverage             share of SEARCH_AREA swept by a UAV sensor footprint
+
+A run is a stream of frames: a live HISTORY list, an /export_timeline file
+(optionally .gz), an NDJSON file (one frame per line) or a mission.json from
+either the current or the legacy generator schema. Frames without a 'tick'
+(the oldest, agents-only files such as mission.json.bak) are numbered by
+their position in the file; such files carry no targets, so they only give
+mission length and coverage (their stateless drones count as sweeping).
+
+Files are parsed incrementally and RunKPIs keeps per-target ticks and one
+coverage grid only, so memory does not grow with the length of a run.
+Frames are weighted by the tick gap to the next one, so decimated (budget)
+exports give the same ratios.
+
+Batch summaries keep one row of numbers per run and aggregate every metric
+column at once with numpy:
+
+    python analytics.py mission.json export.json.gz
+    python analytics.py --seeds 100 --uav 6 --csv kpis.csv
+"""
+import argparse
+import csv
+import gzip
+import json
+import math
+import warnings
+
+import numpy as np
+
+from engine import SEARCH_AREA, make_config
+from engine import events
+
+# --- Schema ---
+# Legacy mission.json event types / target states mapped onto the current ones
+LEGACY_EVENT_TYPES = {'TARGET_FOUND': events.HUMAN_DETECTED}
+MILESTONE_EVENTS = {
+    events.HUMAN_DETECTED: 'detect',
+    events.TARGET_CONFIRMED: 'confirm',
+    events.UGV_DISPATCHED: 'dispatch',
+    events.TARGET_RESCUED: 'rescue',
+}
+MILESTONE_STATES = {'DETECTED': 'detect', 'FOUND': 'detect', 'CONFIRMED': 'confirm', 'RESCUED': 'rescue'}
+IDLE_UGV_STATES = ('STANDBY', 'IDLE')
+LEGACY_AGENT_TYPES = {'drone': 'UAV', 'ugv': 'UGV'}
+# UAV states in which the sensor sweeps the ground (legacy: SEARCHING_B, ...)
+SENSING_UAV_STATES = ('PATROL', 'REPORTING')
+
+COVERAGE_CELL = 1.0 # World units per coverage grid cell
+COLUMN_WIDTH = 20
+
+TARGET_METRICS = ('time_to_detect', 'detect_to_confirm', 'confirm_to_dispatch', 'time_to_rescue')
+RUN_METRICS = ('mission_ticks', 'targets', 'rescued', 'last_detect', 'ugv_idle_ratio', 'coverage')
+METRICS = RUN_METRICS + TARGET_METRICS
+SUMMARY_STATS = ('runs', 'mean', 'std', 'min', 'p50', 'p90', 'max')
+
+
+# --- Streaming input ---
+def iter_json_array(fp, chunk_size=1 << 16):
+    """Yield the items of a top-level JSON array one at a time"""
+    decoder = json.JSONDecoder()
+    buf = ''
+    pos = 0
+    started = False
+    eof = False
+    while True:
+        # Skip whitespace / separators, refilling the buffer as needed
+        while True:
+            while pos < len(buf) and buf[pos] in ' \t\r\n,':
+                pos += 1
+            if pos < len(buf) or eof:
+                break
+            buf, pos = fp.read(chunk_size), 0
+            eof = not buf
+        if pos >= len(buf):
+            return
+        if not started:
+            if buf[pos] != '[':
+                raise ValueError("Expected a JSON array of frames")
+            started = True
+            pos += 1
+            continue
+        if buf[pos] == ']':
+            return
+        while True:
+            try:
+                item, end = decoder.raw_decode(buf, pos)
+                break
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                more = fp.read(chunk_size)
+                eof = not more
+                buf, pos = buf[pos:] + more, 0
+        yield item
+        pos = end
+
+
+def _open(path):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8')
+    return open(path, 'r', encoding='utf-8')
+
+
+def stream_frames(source):
+    """Frames of a run: a list / iterable of frames, or a path to a recorded timeline"""
+    if not isinstance(source, str):
+        yield from source
+        return
+    with _open(source) as fp:
+        if source.endswith(('.ndjson', '.jsonl', '.ndjson.gz', '.jsonl.gz')):
+            for line in fp:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from iter_json_array(fp)
+
+
+def _polygon_mask(polygon, xs, zs):
+    """Even-odd point-in-polygon test for a whole grid at once"""
+    inside = np.zeros(np.broadcast(xs, zs).shape, dtype=bool)
+    n = len(polygon)
+    for k in range(n):
+        (x0, z0), (x1, z1) = polygon[k], polygon[(k + 1) % n]
+        if z0 == z1:
+            continue
+        crosses = (zs >= min(z0, z1)) & (zs < max(z0, z1))
+        x_at = x0 + (zs - z0) * (x1 - x0) / (z1 - z0)
+        inside ^= crosses & (xs < x_at)
+    return inside
+
+
+class _CoverageGrid:
+    """Boolean grid over the search polygon's bounding box, padded by the sensor radius"""
+
+    def __init__(self, polygon, radius, cell=COVERAGE_CELL):
+        self.cell = cell
+        self.pad = int(math.ceil(radius / cell))
+        xs = [p[0] for p in polygon]
+        zs = [p[1] for p in polygon]
+        self.x0 = min(xs) - self.pad * cell
+        self.z0 = min(zs) - self.pad * cell
+        nx = int(math.ceil((max(xs) - min(xs)) / cell)) + 2 * self.pad + 1
+        nz = int(math.ceil((max(zs) - min(zs)) / cell)) + 2 * self.pad + 1
+        cx = self.x0 + (np.arange(nx) + 0.5) * cell
+        cz = self.z0 + (np.arange(nz) + 0.5) * cell
+        self.area = _polygon_mask(polygon, cx[None, :], cz[:, None])
+        self.seen = np.zeros((nz, nx), dtype=bool)
+        r = np.arange(-self.pad, self.pad + 1) * cell
+        self.disc = (r[None, :] ** 2 + r[:, None] ** 2) <= radius * radius
+        self._last = {}
+
+    def stamp(self, key, x, z):
+        i = int((z - self.z0) // self.cell)
+        j = int((x - self.x0) // self.cell)
+        if self._last.get(key) == (i, j):
+            return # Hovering: same footprint as last frame
+        self._last[key] = (i, j)
+        p = self.pad
+        if p <= i < self.seen.shape[0] - p and p <= j < self.seen.shape[1] - p:
+            self.seen[i - p:i + p + 1, j - p:j + p + 1] |= self.disc
+
+    def ratio(self):
+        total = np.count_nonzero(self.area)
+        return float(np.count_nonzero(self.seen & self.area) / total) if total else 0.0
+
+
+# --- Per-run KPIs ---
+def _norm_event(evt, tick):
+    return (LEGACY_EVENT_TYPES.get(evt.get('type'), evt.get('type')),
+            evt.get('tick', tick),
+            evt.get('target', evt.get('target_id')))
+
+
+def _xz(obj):
+    pos = obj.get('pos')
+    if pos is not None:
+        return pos['x'], pos['z']
+    return obj['x'], obj['z']
+
+
+class RunKPIs:
+    """
+    Streaming KPI accumulator for one run: feed() every frame in tick order,
+    then result(). Holds O(targets + coverage grid) state.
+    """
+
+    def __init__(self, config=None, polygon=SEARCH_AREA):
+        cfg = make_config(config)
+        self.grid = _CoverageGrid(polygon, cfg['sensor_radius'])
+        self.start = None
+        self.end = None
+        self.frames = 0
+        self.milestones = {} # target id -> {'detect': tick, ...}
+        self.ugv_ticks = 0
+        self.idle_ticks = 0
+        self._pending = None # Previous frame's UGV (idle, total), weighted once the next tick is known
+
+    def _settle(self, tick):
+        if self._pending is None:
+            return
+        prev_tick, idle, total = self._pending
+        weight = max(1, tick - prev_tick)
+        self.idle_ticks += idle * weight
+        self.ugv_ticks += total * weight
+        self._pending = None
+
+    def feed(self, frame):
+        tick = frame.get('tick', self.frames)
+        self.frames += 1
+        if self.start is None:
+            self.start = tick
+        self.end = tick
+        self._settle(tick)
+
+        for evt in frame.get('events', ()):
+            event_type, evt_tick, target = _norm_event(evt, tick)
+            milestone = MILESTONE_EVENTS.get(event_type)
+            if milestone is not None and target is not None:
+                self.milestones.setdefault(target, {}).setdefault(milestone, evt_tick)
+
+        for t in frame.get('targets', ()):
+            marks = self.milestones.setdefault(t['id'], {})
+            milestone = MILESTONE_STATES.get(t.get('state'))
+            if milestone is not None:
+                marks.setdefault(milestone, tick)
+
+        idle = total = 0
+        for a in frame.get('agents', ()):
+            state = a.get('state')
+            a_type = LEGACY_AGENT_TYPES.get(a.get('type'), a.get('type'))
+            if a_type == 'UGV':
+                total += 1
+                idle += state in IDLE_UGV_STATES
+            elif state is None or state in SENSING_UAV_STATES or state.startswith('SEARCHING'):
+                x, z = _xz(a)
+                self.grid.stamp(a['id'], x, z)
+        self._pending = (tick, idle, total)
+
+    def result(self):
+        if self._pending is not None:
+            self._settle(self._pending[0] + 1)
+        start = self.start or 0
+        per_target = {name: [] for name in TARGET_METRICS}
+        spans = (
+            ('time_to_detect', None, 'detect'),
+            ('detect_to_confirm', 'detect', 'confirm'),
+            ('confirm_to_dispatch', 'confirm', 'dispatch'),
+            ('time_to_rescue', 'detect', 'rescue'),
+        )
+        for marks in self.milestones.values():
+            for name, a, b in spans:
+                if b in marks and (a is None or a in marks):
+                    per_target[name].append(marks[b] - (start if a is None else marks[a]))
+
+        detects = per_target['time_to_detect']
+        row = {
+            'mission_ticks': (self.end or 0) - start,
+            'targets': len(self.milestones),
+            'rescued': sum(1 for marks in self.milestones.values() if 'rescue' in marks),
+            'last_detect': max(detects) if detects else math.nan,
+            'ugv_idle_ratio': self.idle_ticks / self.ugv_ticks if self.ugv_ticks else math.nan,
+            'coverage': self.grid.ratio(),
+        }
+        for name in TARGET_METRICS:
+            values = per_target[name]
+            row[name] = sum(values) / len(values) if values else math.nan
+        return row
+
+
+def run_kpis(source, config=None):
+    """KPI row (see METRICS; target metrics are means over targets) of one recorded run"""
+    kpis = RunKPIs(config)
+    for frame in stream_frames(source):
+        kpis.feed(frame)
+    return kpis.result()
+
+
+def cached_run_kpis(seed, config=None, cache=None):
+    """KPI row of an offline run, cached next to its timeline"""
+    import mission_generator
+    from run_cache import RunCache
+
+    cfg = make_config(config)
+    cache = cache or RunCache()
+    return cache.get_or_compute("kpis", cfg, seed,
+                                lambda: run_kpis(mission_generator.cached_mission(seed, cfg, cache), cfg))
+
+
+# --- Batches ---
+def summarize(rows):
+    """Batch summary {metric: {stat: value}} over any number of KPI rows"""
+    table = np.array([[row.get(m, math.nan) for m in METRICS] for row in rows], dtype=float)
+    table = table.reshape(-1, len(METRICS))
+    counts = np.count_nonzero(~np.isnan(table), axis=0)
+    if len(table):
+        with warnings.catch_warnings():
+            # Metrics no run reached (all NaN) simply summarise to NaN
+            warnings.simplefilter('ignore', RuntimeWarning)
+            p50, p90 = np.nanpercentile(table, [50, 90], axis=0)
+            stats = {'mean': np.nanmean(table, axis=0), 'std': np.nanstd(table, axis=0),
+                     'min': np.nanmin(table, axis=0), 'max': np.nanmax(table, axis=0),
+                     'p50': p50, 'p90': p90}
+    else:
+        stats = {name: np.full(len(METRICS), math.nan) for name in SUMMARY_STATS[1:]}
+    stats['runs'] = counts
+    return {metric: {stat: stats[stat][k].item() for stat in SUMMARY_STATS}
+            for k, metric in enumerate(METRICS)}
+
+
+def _cell(value):
+    if isinstance(value, float):
+        if math.isnan(value):
+            return '-'
+        return f"{value:.3f}" if abs(value) < 10 else f"{value:.1f}"
+    return str(value)
+
+
+def format_row(values, first_width=24, width=COLUMN_WIDTH):
+    """One fixed-width table line (rows can be printed as soon as they exist)"""
+    first, rest = values[0], values[1:]
+    return _cell(first).ljust(first_width) + ''.join(_cell(v).rjust(width) for v in rest)
+
+
+def summary_table(summary):
+    lines = [format_row(('metric',) + SUMMARY_STATS)]
+    lines += [format_row((m,) + tuple(summary[m][s] for s in SUMMARY_STATS)) for m in METRICS]
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Mission KPIs of recorded timelines and seeded batches")
+    parser.add_argument("files", nargs="*", help="Timeline / mission.json files (.json, .ndjson, .gz)")
+    parser.add_argument("--seeds", type=int, help="Also analyse offline runs for seeds 0..N-1")
+    parser.add_argument("--uav", type=int, help="UAV count")
+    parser.add_argument("--ugv", type=int, help="UGV count")
+    parser.add_argument("--targets", type=int, help="Scatter N random targets instead of T1..T3")
+    parser.add_argument("--csv", help="Also write the per-run table here")
+    parser.add_argument("--quiet", action="store_true", help="Only print the batch summary")
+    args = parser.parse_args()
+
+    overrides = {}
+    if args.uav is not None: overrides["uav_count"] = args.uav
+    if args.ugv is not None: overrides["ugv_count"] = args.ugv
+    if args.targets is not None: overrides["target_count"] = args.targets
+
+    def runs():
+        for path in args.files:
+            yield path, run_kpis(path, overrides)
+        for seed in range(args.seeds or 0):
+            yield f"seed {seed}", cached_run_kpis(seed, overrides)
+
+    header = ('run',) + METRICS
+    csv_file = open(args.csv, 'w', newline='', encoding='utf-8') if args.csv else None
+    writer = csv.writer(csv_file) if csv_file else None
+    rows = []
+    try:
+        if writer:
+            writer.writerow(header)
+        if not args.quiet:
+            print(format_row(header))
+        for name, row in runs():
+            # Each run is reported as soon as it is done; only its numbers are kept
+            rows.append(row)
+            values = (name,) + tuple(row[m] for m in METRICS)
+            if writer:
+                writer.writerow(values)
+            if not args.quiet:
+                print(format_row(values), flush=True)
+    finally:
+        if csv_file:
+            csv_file.close()
+
+    if rows:
+        print()
+        print(summary_table(summarize(rows)))
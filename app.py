@@ -1,524 +1,289 @@
+"""
+app.py
+
+Live simulation server: paces the shared engine at real time and serves the
+UI, Socket.IO frames and the timeline / event HTTP API.
+
+Importing this module has no side effects: the world, the simulation loop
+and its helpers (frame pipeline, broker link, telemetry ingest) start with
+the first viewer session (start_simulation), and shutdown() stops them.
+Production: python serve.py (eventlet, monkey-patched, graceful shutdown);
+python app.py runs the same app on Socket.IO's built-in runner.
+"""
 import json
+import logging
 import os
 import threading
 import time
-import math
-import socket
-import subprocess
-import sys
-import random
-from flask import Flask, jsonify, send_file, request
+import uuid
+from flask import Flask, jsonify, request
 from flask_cors import CORS
 from flask_socketio import SocketIO
 
+from engine import EventStore, frame_from_snapshot, make_config, make_world
+from engine.world import shared_planner
+from frame_pipeline import FramePipeline
+from run_cache import RunCache
+import broker
+import http_compression
+import mission_generator
+import structured_log
+import telemetry
+import timeline_http
+import timeline_lod
+
+# Per-category loggers (structured_log.py: queued writer, per-category levels, /debug/logs)
+LOG_SIM = logging.getLogger('nav.sim')
+LOG_SESSION = logging.getLogger('nav.session')
+LOG_BROKER = logging.getLogger('nav.broker')
+LOG_TELEMETRY = logging.getLogger('nav.telemetry')
+LOG_HTTP = logging.getLogger('nav.http')
+
 # 获取当前脚本所在的绝对路径，确保能找到 index.html
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
 app = Flask(__name__)
 CORS(app)
 socketio = SocketIO(app, cors_allowed_origins='*')
+http_compression.init_app(app) # gzip/brotli for JSON and HTML above the size threshold
+
+# Bind address (serve.py / python app.py; --host / --port override)
+SIM_HOST = os.environ.get('SIM_HOST', '0.0.0.0')
+SIM_PORT = int(os.environ.get('SIM_PORT', '5002'))
 
 # track connected clients
 CLIENTS_CONNECTED = 0
 
+# Lifecycle: the loop starts with the first session and stops on shutdown()
+STARTED = False
+STOPPING = False
+# Held while the world ticks or is replaced: with monkey-patched I/O a tick can yield
+# (shard pipes), and a reset or shutdown must not close the world under it
+WORLD_LOCK = threading.Lock()
+
 # Simulation mode: 'RUNNING' | 'PAUSED' | 'COMPLETE'
 SIM_MODE = 'PAUSED'
 
-# --- Global Event Buffer for Playback ---
-CURRENT_TICK_EVENTS = []
+# Cache for offline (seeded) timelines requested by the UI
+RUN_CACHE = RunCache()
+
+# --- Simulation (shared engine, paced here at real time) ---
+# SIM_SHARDS > 1 splits the map across that many worker processes (large maps)
+SIM_SHARDS = int(os.environ.get('SIM_SHARDS', '0'))
+# SIM_SCENARIO loads fleet, spawn points and targets from a scenario file (engine/scenario.py)
+SIM_CONFIG = {'scenario_file': os.environ.get('SIM_SCENARIO') or None}
+WORLD = None
+HISTORY = []
+HISTORY_LOD = (None, None) # (history list, LOD pyramid), built when a mission completes
+RUN_TOKEN = None # Identifies this run's HISTORY in cacheable timeline URLs
+
+# Pacing: seconds per simulation tick, and how often viewers get a state frame.
+# Frames carry velocities and a server timestamp, so the UI dead-reckons between
+# updates from when each tick ran (not when its frame arrived); every tick is still
+# recorded into HISTORY and every event is sent.
+TICK_INTERVAL = float(os.environ.get('SIM_TICK_INTERVAL', '0.2'))
+BROADCAST_HZ = float(os.environ.get('BROADCAST_HZ', str(1.0 / TICK_INTERVAL)))
+BROADCAST_EVERY = max(1, round(1.0 / (TICK_INTERVAL * BROADCAST_HZ)))
+
+# --- Scale-out (optional) ---
+# With FRAME_BROKER set, frames are also published to broker.py (one JSON encode per
+# frame for all gateways), and gateway.py processes fan them out to browsers (decoding
+# and re-emitting each frame once per gateway) and relay viewer controls back.
+FRAME_BROKER = os.environ.get('FRAME_BROKER')
+PUBLISHER = None
+
+# --- External telemetry (optional) ---
+# TELEMETRY_UDP / TELEMETRY_TCP ([host:]port) accept NDJSON position reports from real
+# vehicles, mirrored next to the simulated agents (telemetry.py)
+TELEMETRY_UDP = os.environ.get('TELEMETRY_UDP')
+TELEMETRY_TCP = os.environ.get('TELEMETRY_TCP')
+TELEMETRY = None
+
+def start_telemetry():
+    global TELEMETRY
+    TELEMETRY = telemetry.TelemetryIngest(
+        udp=telemetry.parse_address(TELEMETRY_UDP) if TELEMETRY_UDP else None,
+        tcp=telemetry.parse_address(TELEMETRY_TCP) if TELEMETRY_TCP else None)
+    socketio.start_background_task(TELEMETRY.serve, socketio.sleep)
+    LOG_TELEMETRY.info("Telemetry ingest listening", extra={'udp': TELEMETRY_UDP, 'tcp': TELEMETRY_TCP})
+
+def connect_broker():
+    global PUBLISHER
+    try:
+        PUBLISHER = broker.BrokerClient(FRAME_BROKER)
+        PUBLISHER.subscribe(broker.CONTROL_TOPIC)
+        LOG_BROKER.info("Publishing frames to broker", extra={'broker': FRAME_BROKER})
+    except OSError as e:
+        PUBLISHER = None
+        LOG_BROKER.warning("Broker unavailable, serving local clients only", extra={'error': str(e)})
+
+def broadcast(name, payload):
+    """Emit to this process' clients and, if configured, to every gateway"""
+    global PUBLISHER
+    socketio.emit(name, payload)
+    if PUBLISHER is not None:
+        try:
+            PUBLISHER.publish(broker.VIEWER_TOPIC, json.dumps([name, payload], ensure_ascii=False))
+        except OSError as e:
+            LOG_BROKER.error("Broker connection lost", extra={'error': str(e)})
+            PUBLISHER = None
+
+# --- Frame output (off the simulation loop) ---
+# The loop expands each tick's snapshot and records it into HISTORY itself, so a
+# frame the queue drops is only missing on the wire; encoding and emitting happen
+# on the pipeline worker. FRAME_QUEUE_POLICY: drop_oldest | drop_newest | block
+def publish_frame(state, events=True, send=True):
+    """Pipeline worker: push a recorded frame to clients"""
+    if events:
+        for evt in state["events"]:
+            broadcast('event', evt)
+    if send:
+        broadcast('state', state)
+
+PIPELINE = FramePipeline(
+    publish_frame,
+    maxsize=int(os.environ.get('FRAME_QUEUE_SIZE', '64')),
+    policy=os.environ.get('FRAME_QUEUE_POLICY', 'drop_oldest'),
+    make_queue=socketio.server.eio.create_queue,
+    queue_empty=socketio.server.eio.get_queue_empty_exception(),
+    sleep=socketio.sleep,
+)
+
+def submit_frame(history=None, events=True, send=True):
+    """Record the current tick in `history` (if given) and queue it for clients"""
+    global HISTORY_LOD
+    if WORLD is None:
+        return
+    snap = WORLD.snapshot()
+    state = frame_from_snapshot(snap)
+    state["sim_mode"] = SIM_MODE
+    state["server_time"] = int(time.time() * 1000) # ms, taken at the tick (not when encoded)
+    state["tick_interval"] = TICK_INTERVAL
+    if history is not None:
+        history.append(state)
+        if snap["mission_phase"] == "COMPLETE":
+            HISTORY_LOD = (history, timeline_lod.build_pyramid(history))
+    PIPELINE.submit(state, events=events, send=send)
 
 def emit_event(event_type, msg):
     """Helper to emit event to socket AND record it for history"""
-    evt_data = {'type': event_type, 'msg': msg}
-    socketio.emit('event', evt_data)
-    CURRENT_TICK_EVENTS.append(evt_data)
-
-# --- 1. Locations & Config ---
-LOCATIONS = {
-    "A": {"x": -50, "y": 0, "z": 50},   # Base
-    "B": {"x": 0, "y": 0, "z": 0},      # Search Center
-    "C": {"x": 60, "y": 0, "z": -60},   # Patrol Point (Extended to cover T3)
-    "T1": {"x": -20, "y": 0, "z": 20},
-    "T2": {"x": 0, "y": 0, "z": 0},      # Center of B
-    "T3": {"x": 60, "y": 0, "z": -60}    # Outer edge of C
-}
-
-# --- 2. Classes ---
-
-class Human:
-    def __init__(self, t_id, pos):
-        self.id = t_id
-        self.position = pos
-        self.state = 'UNSEEN' # UNSEEN, DETECTED, CONFIRMED, RESCUED
-        self.detected_by = [] # List of UAV IDs
-        self.first_detected_time = None # Tick when first detected
-        self.detected_since_tick = None # Alias for logic consistency
-
-class UAV:
-    def __init__(self, uav_id, start_pos):
-        self.id = uav_id
-        self.type = 'UAV'
-        self.velocity = {'x': 0, 'y': 0, 'z': 0} # Add velocity for smoothing
-        self.state = 'IDLE' # IDLE, TAKEOFF, PATROL, REPORTING, RETURN, LANDING
-        self.position = start_pos.copy()
-        self.target_pos = None
-        self.role = 'LEADER' if uav_id == 'UAV1' else 'FOLLOWER'
-        self.hover_start_tick = None
-        
-        # Patrol Route: A -> B -> C -> A
-        self.patrol_route = ['B', 'C', 'A']
-        self.current_route_index = 0
-
-    def update(self):
-        if self.state == 'IDLE':
-            pass
-        elif self.state == 'TAKEOFF':
-            # Takeoff to height 10 (per spec)
-            target_h = 10
-            if self.position['y'] < target_h:
-                self.position['y'] += 1
-            else:
-                self.state = 'PATROL'
-                
-        elif self.state == 'PATROL':
-            # Route Logic: Fly to current route point
-            target_key = self.patrol_route[self.current_route_index]
-            base_target = LOCATIONS[target_key]
-            
-            self.target_pos = {
-                'x': base_target['x'] + random.uniform(-2, 2), 
-                'y': 10, 
-                'z': base_target['z'] + random.uniform(-2, 2)
-            }
-            
-            self.move_to(self.target_pos)
-            
-            # Check if reached route point
-            if self.distance_to(self.target_pos) < 5:
-                # Move to next point
-                self.current_route_index = (self.current_route_index + 1) % len(self.patrol_route)
-
-            # Detection Logic (Perception Layer)
-            for t in TARGETS:
-                # Use 2D distance (ignore altitude) for detection
-                dist_2d = self.distance_to_2d(t.position)
-                if t.state == 'UNSEEN' and dist_2d < 10:
-                    # 1. Trigger HUMAN_DETECTED event
-                    t.state = 'DETECTED'
-                    t.detected_since_tick = TICK
-                    t.first_detected_time = TICK
-                    if self.id not in t.detected_by:
-                        t.detected_by.append(self.id)
-                    
-                    # 2. UAV State Change
-                    self.state = 'REPORTING'
-                    self.target_pos = {'x': t.position['x'], 'y': 10, 'z': t.position['z']} # Hover above
-                    self.hover_start_tick = TICK
-                    
-                    emit_event('HUMAN_DETECTED', f'{self.id} 发现目标 {t.id} (UNSEEN -> DETECTED)')
-                    break
-                elif t.state == 'DETECTED' and dist_2d < 5:
-                     # Already detected, just add self to detected_by if not present (Collaborative Sensing)
-                    if self.id not in t.detected_by:
-                        t.detected_by.append(self.id)
-
-        elif self.state == 'REPORTING':
-            # Hover above target for 60 ticks
-            if self.target_pos:
-                self.move_to(self.target_pos)
-                
-                if TICK - self.hover_start_tick > 60: 
-                    # Finished reporting. 
-                    # Spec: "Return to PATROL or execute RETURN (if strategy so)"
-                    # Strategy: Continue PATROL to maintain coverage unless Mission Complete.
-                    self.state = 'PATROL'
-                    # Note: UAV does NOT decide confirmation. It just reports and moves on.
-        
-        elif self.state == 'RETURN':
-            # Return to Base A (Hover Point)
-            base_a = LOCATIONS['A']
-            self.target_pos = {'x': base_a['x'], 'y': 10, 'z': base_a['z']}
-            self.move_to(self.target_pos)
-            
-            if self.distance_to(self.target_pos) < 5:
-                self.state = 'LANDING'
-
-        elif self.state == 'LANDING':
-            # Descend to Ground
-            base_a = LOCATIONS['A']
-            self.target_pos = {'x': base_a['x'], 'y': 0, 'z': base_a['z']}
-            self.move_to(self.target_pos)
-            
-            if self.position['y'] < 0.5:
-                self.state = 'IDLE'
-
-    def move_to(self, target):
-        # Steering Behavior: Seek + Arrive
-        dest = target
-        curr = self.position
-        
-        # Desired velocity
-        dx = dest['x'] - curr['x']
-        dy = dest['y'] - curr['y']
-        dz = dest['z'] - curr['z']
-        dist = math.sqrt(dx*dx + dy*dy + dz*dz)
-        
-        max_speed = 1.0
-        steering_factor = 0.05 # Inertia factor (lower = more inertia/smoothness)
-        
-        if dist < 0.1:
-            self.position = dest.copy()
-            self.velocity = {'x': 0, 'y': 0, 'z': 0}
-            return
-
-        # Arrive: Slow down when close
-        target_speed = max_speed
-        slow_radius = 10.0
-        if dist < slow_radius:
-            target_speed = max_speed * (dist / slow_radius)
-            
-        # Normalize desired
-        desired_vx = (dx / dist) * target_speed
-        desired_vy = (dy / dist) * target_speed
-        desired_vz = (dz / dist) * target_speed
-        
-        # Steering force = desired - velocity
-        steer_x = desired_vx - self.velocity['x']
-        steer_y = desired_vy - self.velocity['y']
-        steer_z = desired_vz - self.velocity['z']
-
-        # Separation: Avoid crowding
-        sep_x, sep_y, sep_z = 0, 0, 0
-        count = 0
-        
-        # Only apply separation if far from target
-        if dist > 5.0:
-            for other in AGENTS.values():
-                if other.id != self.id:
-                    d = self.distance_to(other.position)
-                    if d > 0 and d < 2.0: # Separation radius
-                        # Push away
-                        diff_x = self.position['x'] - other.position['x']
-                        diff_y = self.position['y'] - other.position['y']
-                        diff_z = self.position['z'] - other.position['z']
-                        # Weight by distance
-                        sep_x += diff_x / d
-                        sep_y += diff_y / d
-                        sep_z += diff_z / d
-                        count += 1
-        
-        if count > 0:
-            sep_x /= count
-            sep_y /= count
-            sep_z /= count
-            # Normalize and scale
-            sep_len = math.sqrt(sep_x**2 + sep_y**2 + sep_z**2)
-            if sep_len > 0:
-                sep_x = (sep_x / sep_len) * max_speed
-                sep_y = (sep_y / sep_len) * max_speed
-                sep_z = (sep_z / sep_len) * max_speed
-                # Steering for separation
-                sep_x -= self.velocity['x']
-                sep_y -= self.velocity['y']
-                sep_z -= self.velocity['z']
-                
-                # Add to total steering (weight separation higher)
-                steer_x += sep_x * 2.0
-                steer_y += sep_y * 2.0
-                steer_z += sep_z * 2.0
-        
-        # Apply steering to velocity
-        self.velocity['x'] += steer_x * steering_factor
-        self.velocity['y'] += steer_y * steering_factor
-        self.velocity['z'] += steer_z * steering_factor
-        
-        # Update position
-        self.position['x'] += self.velocity['x']
-        self.position['y'] += self.velocity['y']
-        self.position['z'] += self.velocity['z']
-
-    def distance_to_2d(self, target_pos):
-        return math.sqrt((self.position['x'] - target_pos['x'])**2 + 
-                         (self.position['z'] - target_pos['z'])**2)
-
-    def distance_to(self, target_pos):
-        return math.sqrt((self.position['x'] - target_pos['x'])**2 + 
-                         (self.position['y'] - target_pos['y'])**2 + 
-                         (self.position['z'] - target_pos['z'])**2)
-
-class UGV:
-    def __init__(self, ugv_id, start_pos):
-        self.id = ugv_id
-        self.type = 'UGV'
-        self.velocity = {'x': 0, 'y': 0, 'z': 0}
-        self.state = 'STANDBY' # STANDBY, DISPATCH, RESCUING, RETURNING
-        self.position = start_pos.copy()
-        self.target_human_id = None
-        self.target_pos = None
-        self.rescue_timer = 0
-
-    def update(self):
-        if self.state == 'STANDBY':
-            pass # Wait for system dispatch
-
-        elif self.state == 'DISPATCH':
-            if self.target_pos:
-                self.move_to(self.target_pos)
-                if self.distance_to(self.target_pos) < 5: # Increased arrival threshold (was 2)
-                    self.state = 'RESCUING'
-                    self.rescue_timer = 0
-                    emit_event('RESCUE_START', f'{self.id} 到达位置，开始救援 {self.target_human_id}')
-
-        elif self.state == 'RESCUING':
-            self.rescue_timer += 1
-            if self.rescue_timer >= 40: # 40 ticks duration
-                # Mark target as rescued
-                for t in TARGETS:
-                    if t.id == self.target_human_id:
-                        t.state = 'RESCUED'
-                        emit_event('TARGET_RESCUED', f'{self.id} 成功救援 {t.id} (CONFIRMED -> RESCUED)')
-                        break
-                
-                self.state = 'RETURNING'
-                self.target_human_id = None
-                self.target_pos = LOCATIONS['A'] # Return to base
-
-        elif self.state == 'RETURNING':
-            self.move_to(LOCATIONS['A'])
-            if self.distance_to(LOCATIONS['A']) < 5: # Increased standby threshold (was 2)
-                self.state = 'STANDBY'
-
-    def move_to(self, target):
-        # Steering Behavior: Seek + Arrive (2D for UGV)
-        dest = target
-        curr = self.position
-        
-        dx = dest['x'] - curr['x']
-        dz = dest['z'] - curr['z']
-        dist = math.sqrt(dx*dx + dz*dz)
-        
-        max_speed = 0.5
-        steering_factor = 0.05
-        
-        if dist < 0.1:
-            self.position['x'] = dest['x']
-            self.position['z'] = dest['z']
-            self.velocity = {'x': 0, 'y': 0, 'z': 0}
-            return
-
-        target_speed = max_speed
-        slow_radius = 5.0
-        if dist < slow_radius:
-            target_speed = max_speed * (dist / slow_radius)
-            
-        desired_vx = (dx / dist) * target_speed
-        desired_vz = (dz / dist) * target_speed
-        
-        steer_x = desired_vx - self.velocity['x']
-        steer_z = desired_vz - self.velocity['z']
-        
-        self.velocity['x'] += steer_x * steering_factor
-        self.velocity['z'] += steer_z * steering_factor
-        
-        self.position['x'] += self.velocity['x']
-        self.position['z'] += self.velocity['z']
-
-    def distance_to(self, target_pos):
-        return math.sqrt((self.position['x'] - target_pos['x'])**2 + 
-                         (self.position['z'] - target_pos['z'])**2)
-
-# --- 3. Initialization ---
-def init_simulation():
-    global AGENTS, TICK, MISSION_PHASE, HISTORY, CURRENT_TICK_EVENTS, TARGETS, SIM_MODE
-    AGENTS = {}
-    TICK = 0
-    MISSION_PHASE = "READY"
+    return WORLD.emit(event_type, msg)
+
+# --- Initialization ---
+def init_simulation(seed=None):
+    global WORLD, HISTORY, SIM_MODE, RUN_TOKEN
+    if STOPPING:
+        return
+    with WORLD_LOCK:
+        if WORLD is not None and hasattr(WORLD, 'close'):
+            WORLD.close() # Stop the previous run's shard workers
+        WORLD = make_world(SIM_CONFIG, seed, SIM_SHARDS)
     SIM_MODE = "PAUSED" # Force pause on init
     HISTORY = []
-    CURRENT_TICK_EVENTS = []
-    
-    # Reset Targets
-    TARGETS = [
-        Human("T1", LOCATIONS["T1"]),
-        Human("T2", LOCATIONS["T2"]),
-        Human("T3", LOCATIONS["T3"])
-    ]
-
-    # Create Agents
-    # UAVs at Base A
-    AGENTS["UAV1"] = UAV("UAV1", LOCATIONS["A"])
-    AGENTS["UAV2"] = UAV("UAV2", {"x": LOCATIONS["A"]["x"] + 2, "y": 0, "z": LOCATIONS["A"]["z"] + 2})
-    AGENTS["UAV3"] = UAV("UAV3", {"x": LOCATIONS["A"]["x"] - 2, "y": 0, "z": LOCATIONS["A"]["z"] - 2})
-    
-    # UGVs at Base A
-    AGENTS["UGV1"] = UGV("UGV1", {"x": LOCATIONS["A"]["x"] + 5, "y": 0, "z": LOCATIONS["A"]["z"]})
-    AGENTS["UGV2"] = UGV("UGV2", {"x": LOCATIONS["A"]["x"] - 5, "y": 0, "z": LOCATIONS["A"]["z"]})
-
-    print("Simulation Initialized.")
-
-init_simulation()
-
-def build_state():
-    agent_states = []
-    for agent in AGENTS.values():
-        agent_states.append({
-            "id": agent.id,
-            "type": agent.type,
-            "state": agent.state,
-            "x": agent.position["x"],
-            "y": agent.position["y"],
-            "z": agent.position["z"],
-            "role": getattr(agent, 'role', '')
-        })
-    
-    target_states = []
-    for t in TARGETS:
-        target_states.append({
-            "id": t.id,
-            "state": t.state,
-            "x": t.position["x"],
-            "y": t.position["y"],
-            "z": t.position["z"],
-            "detected_by": t.detected_by # Include for UI Collaborative Task view
-        })
-
-    # Include events in the state snapshot for playback consistency
-    state_events = list(CURRENT_TICK_EVENTS) 
-    
-    return {
-        "tick": TICK,
-        "mission_phase": MISSION_PHASE,
-        "sim_mode": SIM_MODE,
-        "agents": agent_states,
-        "targets": target_states,
-        "events": state_events
-    }
+    RUN_TOKEN = 'live-' + uuid.uuid4().hex[:12]
+
+    LOG_SIM.info("Simulation initialized", extra={'seed': WORLD.seed, 'shards': SIM_SHARDS})
+
+def start_simulation():
+    """Start the simulation loop and its helpers (once; the world itself is built per session)"""
+    global STARTED
+    if STARTED or STOPPING:
+        return
+    STARTED = True
+    if FRAME_BROKER:
+        connect_broker()
+    if TELEMETRY_UDP or TELEMETRY_TCP:
+        start_telemetry()
+    socketio.start_background_task(PIPELINE.run)
+    socketio.start_background_task(background_simulator)
+
+def shutdown():
+    """Stop ticking, flush queued frames and release shard workers and sockets"""
+    global STOPPING
+    if STOPPING:
+        return
+    STOPPING = True
+    with WORLD_LOCK: # Waits for a tick in progress
+        if WORLD is not None and hasattr(WORLD, 'close'):
+            WORLD.close()
+    if STARTED:
+        PIPELINE.close()
+    if TELEMETRY is not None:
+        TELEMETRY.close()
+    if PUBLISHER is not None:
+        PUBLISHER.close()
+    LOG_SIM.info("Simulation stopped")
+
+def drain_control():
+    """Apply viewer controls relayed by gateways (checked once per tick)"""
+    global PUBLISHER
+    if PUBLISHER is None:
+        return
+    try:
+        messages = PUBLISHER.poll()
+    except OSError as e:
+        LOG_BROKER.error("Broker connection lost", extra={'error': str(e)})
+        PUBLISHER = None
+        return
+    for _, payload in messages:
+        msg = json.loads(payload)
+        event = msg.get('event')
+        if event == 'join':
+            viewer_joined()
+        elif event == 'set_sim_mode':
+            set_sim_mode(msg.get('data'))
+        elif event == 'reset_simulation':
+            reset_simulation(msg.get('data'))
 
 def background_simulator():
-    global TICK, SIM_MODE, MISSION_PHASE, CURRENT_TICK_EVENTS
-    print("Background simulator started.")
-    while True:
-        time.sleep(0.2) # 5 TPS (Slower)
-        
+    global SIM_MODE
+    LOG_SIM.info("Background simulator started")
+    while not STOPPING:
+        socketio.sleep(TICK_INTERVAL) # 5 TPS by default; yields to the server while waiting
+        drain_control()
+        if WORLD is None or STOPPING:
+            continue # Broker mode: no viewer session yet
+
         # --- DEBUG LOG ---
-        if TICK % 20 == 0:
-             print(f"[Heartbeat] Mode: {SIM_MODE}, Tick: {TICK}, Phase: {MISSION_PHASE}")
+        if WORLD.tick % 20 == 0 and LOG_SIM.isEnabledFor(logging.DEBUG):
+            stats = PIPELINE.stats()
+            LOG_SIM.debug("Heartbeat", extra={'mode': SIM_MODE, 'tick': WORLD.tick, 'phase': WORLD.phase,
+                                              'queued': stats['depth'], 'dropped': stats['dropped']})
+            if TELEMETRY is not None:
+                LOG_TELEMETRY.debug("Heartbeat", extra=dict(TELEMETRY.stats(), mirrored=len(WORLD.mirrors)))
         # -----------------
 
         try:
             if SIM_MODE == 'RUNNING':
-                TICK += 1
-                CURRENT_TICK_EVENTS = [] # Clear events for this tick
-                
-                # Mission Logic Transition
-                if MISSION_PHASE == "READY" and TICK > 0:
-                    MISSION_PHASE = "PATROL"
-                    # Trigger UAV Takeoff
-                    for agent in AGENTS.values():
-                        if agent.type == 'UAV' and agent.state == 'IDLE':
-                            agent.state = 'TAKEOFF'
-
-                # Update Agents
-                for agent in AGENTS.values():
-                    agent.update()
-
-                # --- Decision Layer (System Logic) ---
-                
-                # 1. Target Confirmation Logic
-                for t in TARGETS:
-                    if t.state == 'DETECTED':
-                        # Condition A: Time threshold (> 40 ticks)
-                        time_condition = (TICK - t.first_detected_time) > 40
-                        # Condition B: Multi-UAV confirmation (>= 2 UAVs)
-                        multi_uav_condition = len(t.detected_by) >= 2
-                        
-                        if time_condition or multi_uav_condition:
-                            t.state = 'CONFIRMED'
-                            reason = "超时确认" if time_condition else "多机确认"
-                            emit_event('TARGET_CONFIRMED', f'系统确认目标 {t.id} ({reason})')
-                            
-                            # Update Phase if needed
-                            if MISSION_PHASE == "PATROL":
-                                MISSION_PHASE = "RESCUE"
-
-                # 2. UGV Dispatch Logic (Priority: Earliest Discovery First)
-                # Filter confirmed targets that are not yet assigned/rescued
-                confirmed_targets = [t for t in TARGETS if t.state == 'CONFIRMED']
-                
-                # Sort by first_detected_time (Earliest First)
-                confirmed_targets.sort(key=lambda x: x.first_detected_time)
-
-                for t in confirmed_targets:
-                    # Check if already assigned
-                    is_assigned = False
-                    for agent in AGENTS.values():
-                        if agent.type == 'UGV' and agent.target_human_id == t.id:
-                            is_assigned = True
-                            break
-                    
-                    if not is_assigned:
-                        # Find free UGV
-                        free_ugv = None
-                        for agent in AGENTS.values():
-                            if agent.type == 'UGV' and agent.state == 'STANDBY':
-                                free_ugv = agent
-                                break
-                        
-                        if free_ugv:
-                            free_ugv.state = 'DISPATCH'
-                            free_ugv.target_human_id = t.id
-                            free_ugv.target_pos = t.position
-                            emit_event('UGV_DISPATCHED', f'系统调度 {free_ugv.id} 前往救援 {t.id} (最早发现优先)')
-
-                # -------------------------------------
-                
-                # Check Mission Progress
-                all_rescued = all(t.state == 'RESCUED' for t in TARGETS)
-                # Tightened check: Must be closer to base (< 5)
-                all_ugvs_home = all((a.state == 'STANDBY' or (a.state == 'RETURNING' and a.distance_to(LOCATIONS["A"]) < 5)) for a in AGENTS.values() if a.type == 'UGV')
-                
-                if all_rescued:
-                    # If all humans are rescued, recall UAVs
-                    for agent in AGENTS.values():
-                        if agent.type == 'UAV' and agent.state not in ['RETURN', 'IDLE', 'LANDING']:
-                            agent.state = 'RETURN'
-                            emit_event('UAV_RETURN', f"{agent.id} 任务结束，正在返航")
-
-                # Check if UAVs are home (Tightened distance < 5)
-                all_uavs_home = all(a.state == 'IDLE' for a in AGENTS.values() if a.type == 'UAV')
-
-                # Stop UAVs if they are home
-                if all_rescued:
-                    for agent in AGENTS.values():
-                        if agent.type == 'UAV' and agent.state == 'RETURN' and agent.distance_to(LOCATIONS["A"]) < 2:
-                            agent.state = 'IDLE'
-
-                if all_rescued and all_ugvs_home and all_uavs_home and MISSION_PHASE != "COMPLETE":
-                    MISSION_PHASE = "COMPLETE"
-                    SIM_MODE = "COMPLETE" # Stop simulation
-                    emit_event('MISSION_COMPLETE', "所有目标已救援，全员返航，任务完成！")
-
-                # Broadcast State
-                state = build_state()
-                HISTORY.append(state)
-                # print(f"Emitting state tick {TICK}") # Optional verbose log
-                socketio.emit('state', state)
+                with WORLD_LOCK:
+                    if STOPPING:
+                        break
+                    if TELEMETRY is not None:
+                        WORLD.mirror(TELEMETRY.take()) # Latest report per real vehicle
+                    WORLD.step()
+                    if WORLD.complete:
+                        SIM_MODE = "COMPLETE" # Stop simulation
+
+                    # Record into this run's HISTORY and broadcast;
+                    # in-between ticks are skipped on the wire unless something happened
+                    send = WORLD.tick % BROADCAST_EVERY == 0 or bool(WORLD.events) or WORLD.complete
+                    submit_frame(history=HISTORY, send=send)
         except Exception as e:
-            print(f"Error in simulation loop: {e}")
-            import traceback
-            traceback.print_exc()
+            LOG_SIM.exception("Error in simulation loop", extra={'tick': WORLD.tick})
             try:
-                socketio.emit('event', {'type': 'ERROR', 'msg': f"后端错误: {str(e)}"})
+                broadcast('event', {'type': 'ERROR', 'msg': f"后端错误: {str(e)}"})
             except:
                 pass
 
-# Start Background Task
-socketio.start_background_task(background_simulator)
-
 # --- Routes ---
 @app.route('/')
 def index():
-    return send_file(os.path.join(BASE_DIR, 'index.html'))
+    return http_compression.static_file_response(os.path.join(BASE_DIR, 'index.html'))
+
+@app.route('/terrain')
+def terrain():
+    # Obstacle / cost-zone layout so the UI can draw what the UGVs route around
+    return jsonify(shared_planner(make_config(SIM_CONFIG)['terrain_file']).grid.spec)
 
 @app.route('/favicon.ico')
 def favicon():
@@ -527,54 +292,134 @@ def favicon():
 @app.route('/export_timeline')
 def export_timeline():
     try:
-        # Return the recorded history
-        return jsonify(HISTORY)
+        seed = request.args.get('seed', type=int)
+        # Optional LOD: at most `budget` frames, optionally only [from_tick, to_tick]
+        budget = request.args.get('budget', type=int)
+        from_tick = request.args.get('from_tick', type=int)
+        to_tick = request.args.get('to_tick', type=int)
+        if seed is not None:
+            # Seeded request: offline run, computed once per (config, seed, code version)
+            config = timeline_http.seeded_config(request.args)
+            run = timeline_http.seeded_run_token(seed, config)
+            # Finished offline run: compressed once and kept on disk
+            return http_compression.precompressed_response(
+                f"export:{run}:{budget}:{from_tick}:{to_tick}",
+                lambda: json.dumps(mission_generator.timeline_view(seed, config, RUN_CACHE, budget, from_tick, to_tick),
+                                   ensure_ascii=False),
+                persist=True)
+        # Return the recorded history (pyramid only once the mission has completed)
+        history, pyramid = HISTORY_LOD
+        if history is HISTORY:
+            return http_compression.precompressed_response(
+                f"export:{RUN_TOKEN}:{budget}:{from_tick}:{to_tick}",
+                lambda: json.dumps(timeline_lod.select(history, budget, from_tick, to_tick, pyramid), ensure_ascii=False))
+        return jsonify(timeline_lod.select(list(HISTORY), budget, from_tick, to_tick))
     except Exception as e:
-        print(f"Export error: {e}")
+        LOG_HTTP.exception("Export error")
         return jsonify({"error": str(e)}), 500
 
+def timeline_source():
+    """(frames, pyramid, run token, complete) for a seeded run or the live HISTORY"""
+    seed = request.args.get('seed', type=int)
+    if seed is not None:
+        frames, pyramid, run = timeline_http.seeded_run(seed, timeline_http.seeded_config(request.args), RUN_CACHE)
+        return frames, pyramid, run, True
+    history, pyramid = HISTORY_LOD
+    complete = history is HISTORY
+    return HISTORY, pyramid if complete else None, RUN_TOKEN, complete
+
+@app.route('/timeline/meta')
+def timeline_meta():
+    frames, _, run, complete = timeline_source()
+    return timeline_http.meta_response(frames, run, complete)
+
+@app.route('/timeline/range')
+def timeline_range():
+    frames, pyramid, run, complete = timeline_source()
+    return timeline_http.range_response(frames, run, complete, pyramid)
+
+@app.route('/events')
+def query_events():
+    # Structured event queries (after-action review) without scanning frames
+    seed = request.args.get('seed', type=int)
+    if seed is not None:
+        store = mission_generator.cached_events(seed, timeline_http.seeded_config(request.args), RUN_CACHE)
+    else:
+        store = WORLD.event_store if WORLD is not None else EventStore()
+    return timeline_http.events_response(store)
+
+@app.route('/debug/logs')
+def debug_logs():
+    # Recent log records from the in-memory ring buffer: ?n=200&level=WARNING&cat=sim
+    try:
+        records = structured_log.recent(request.args.get('n', 200, type=int),
+                                        request.args.get('level'), request.args.get('cat'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"count": len(records), "records": records})
+
+# --- Viewer controls (from local sockets or relayed by gateways) ---
+def viewer_connected():
+    # Reset simulation on new connection (Refresh = Reset)
+    start_simulation()
+    init_simulation()
+    # Send initial state immediately
+    submit_frame()
+
+def viewer_joined():
+    # Gateway viewers share one mission: start a session if there is none, never reset it
+    start_simulation()
+    if WORLD is None:
+        init_simulation()
+    submit_frame(events=False)
+
+def set_sim_mode(mode):
+    global SIM_MODE
+    if WORLD is None:
+        return # No session yet
+    LOG_SESSION.info("Setting SIM_MODE", extra={'mode': mode})
+    SIM_MODE = mode
+    submit_frame(events=False)
+
+def reset_simulation(data=None):
+    LOG_SESSION.info("Resetting simulation")
+    start_simulation()
+    seed = data.get('seed') if isinstance(data, dict) else None
+    init_simulation(seed)
+    emit_event('RESET', f"仿真已重置 (seed={WORLD.seed})")
+    submit_frame()
+
 @socketio.on('connect')
 def handle_connect():
     global CLIENTS_CONNECTED
     CLIENTS_CONNECTED += 1
-    print(f"Client connected. Total: {CLIENTS_CONNECTED}")
-    # Reset simulation on new connection (Refresh = Reset)
-    init_simulation()
-    # Send initial state immediately
-    socketio.emit('state', build_state())
+    LOG_SESSION.info("Client connected", extra={'clients': CLIENTS_CONNECTED})
+    viewer_connected()
 
 @socketio.on('disconnect')
 def handle_disconnect():
     global CLIENTS_CONNECTED
     CLIENTS_CONNECTED -= 1
-    print(f"Client disconnected. Total: {CLIENTS_CONNECTED}")
+    LOG_SESSION.info("Client disconnected", extra={'clients': CLIENTS_CONNECTED})
 
 @socketio.on('set_sim_mode')
 def handle_set_mode(mode):
-    global SIM_MODE
-    print(f"[socket] Setting SIM_MODE to {mode}")
-    SIM_MODE = mode
-    socketio.emit('state', build_state())
+    set_sim_mode(mode)
 
 @socketio.on('reset_simulation')
-def handle_reset():
-    print("[socket] Resetting simulation...")
-    init_simulation()
-    emit_event('RESET', "仿真已重置")
-    socketio.emit('state', build_state())
+def handle_reset(data=None):
+    reset_simulation(data)
 
 if __name__ == '__main__':
-    # Try port 5002 to avoid conflicts
-    port = 5002
-    try:
-        # Kill existing process on port 5002 (Windows)
-        subprocess.run(f"netstat -ano | findstr :{port}", shell=True)
-        pass
-    except:
-        pass
-
+    # Development runner; production: python serve.py
+    structured_log.setup()
+    if FRAME_BROKER:
+        start_simulation() # Gateway sessions arrive through the broker
+    LOG_HTTP.info("Starting server", extra={'host': SIM_HOST, 'port': SIM_PORT})
     try:
-        print(f"Starting server on port {port}...")
-        socketio.run(app, host='0.0.0.0', port=port, debug=False, allow_unsafe_werkzeug=True)
-    except OSError:
-        print(f"Port {port} failed to bind.")
+        socketio.run(app, host=SIM_HOST, port=SIM_PORT, debug=False, allow_unsafe_werkzeug=True)
+    except OSError as e:
+        LOG_HTTP.error("Port failed to bind", extra={'port': SIM_PORT, 'error': str(e)})
+    finally:
+        shutdown()
+        structured_log.shutdown()
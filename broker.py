@@ -0,0 +1,203 @@
+"""
+broker.py
+
+Minimal pub/sub broker over a Unix socket (an in-repo stand-in for Redis
+pub/sub), used to scale viewers out across gateway processes:
+
+    simulation (app.py) --frames--> broker --frames--> gateway.py x N --> browsers
+                        <-control--        <-control--
+
+Wire format: every message is a 4-byte big-endian length followed by the
+body. The first byte of a body is the command:
+
+    S<topic>              subscribe this connection to <topic>
+    P<topic>\\0<payload>   publish <payload> to every subscriber of <topic>
+
+Subscribers receive the P message byte-for-byte: the broker only copies
+frames, it never decodes them (each gateway decodes a frame once and
+Socket.IO re-encodes it for its clients). Like Redis' output buffer
+limit, a subscriber that falls more than MAX_PENDING bytes behind is
+disconnected instead of stalling everyone else.
+
+Run:  python broker.py [--path /tmp/nav-demo-broker.sock]
+"""
+import argparse
+import logging
+import os
+import select
+import selectors
+import socket
+import struct
+
+import structured_log
+
+DEFAULT_PATH = os.environ.get('FRAME_BROKER', '/tmp/nav-demo-broker.sock')
+MAX_PENDING = 8 * 1024 * 1024
+
+# Topics
+VIEWER_TOPIC = 'viewer'   # sim -> gateways: JSON [socket event name, payload]
+CONTROL_TOPIC = 'control' # gateways -> sim: JSON {'event': ..., 'data': ...}
+
+HEADER = struct.Struct('>I')
+
+LOG = logging.getLogger('nav.broker')
+
+
+def encode(command, topic, payload=b''):
+    if isinstance(payload, str):
+        payload = payload.encode('utf-8')
+    body = command + topic.encode('utf-8') + (b'\0' + payload if command == b'P' else b'')
+    return HEADER.pack(len(body)) + body
+
+
+def split_messages(buf):
+    """Pop complete message bodies off the front of a bytearray"""
+    out = []
+    while len(buf) >= 4:
+        (n,) = HEADER.unpack_from(buf)
+        if len(buf) < 4 + n:
+            break
+        out.append(bytes(buf[4:4 + n]))
+        del buf[:4 + n]
+    return out
+
+
+def parse_publish(body):
+    topic, _, payload = body[1:].partition(b'\0')
+    return topic.decode('utf-8'), payload
+
+
+class BrokerClient:
+    """Connection to a running broker (publisher, subscriber or both)"""
+
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(path)
+        self._buf = bytearray()
+
+    def subscribe(self, topic):
+        self.sock.sendall(encode(b'S', topic))
+
+    def publish(self, topic, payload):
+        self.sock.sendall(encode(b'P', topic, payload))
+
+    def poll(self):
+        """Return every (topic, payload) that has already arrived, without blocking"""
+        # select() instead of a non-blocking socket: publish() may run concurrently
+        while select.select([self.sock], [], [], 0)[0]:
+            chunk = self.sock.recv(65536)
+            if not chunk:
+                raise ConnectionError('broker closed the connection')
+            self._buf += chunk
+        return [parse_publish(body) for body in split_messages(self._buf) if body[:1] == b'P']
+
+    def close(self):
+        self.sock.close()
+
+
+class Broker:
+    def __init__(self, path=DEFAULT_PATH, max_pending=MAX_PENDING):
+        self.path = path
+        self.max_pending = max_pending
+        self.selector = selectors.DefaultSelector()
+        self.subscribers = {} # topic -> set of connections
+        self.inbox = {}       # connection -> partial input
+        self.outbox = {}      # connection -> pending output
+
+    def serve_forever(self):
+        if os.path.exists(self.path):
+            os.remove(self.path) # Stale socket from a previous run
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(self.path)
+        server.listen(128)
+        server.setblocking(False)
+        self.selector.register(server, selectors.EVENT_READ)
+        LOG.info("Broker listening", extra={'path': self.path})
+        try:
+            while True:
+                for key, mask in self.selector.select():
+                    if key.fileobj is server:
+                        conn, _ = server.accept()
+                        conn.setblocking(False)
+                        self.inbox[conn] = bytearray()
+                        self.outbox[conn] = bytearray()
+                        self.selector.register(conn, selectors.EVENT_READ)
+                        continue
+                    conn = key.fileobj
+                    if mask & selectors.EVENT_READ:
+                        self._read(conn)
+                    if mask & selectors.EVENT_WRITE and conn in self.outbox:
+                        self._flush(conn)
+        finally:
+            server.close()
+            os.remove(self.path)
+
+    def _read(self, conn):
+        try:
+            chunk = conn.recv(65536)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            chunk = b''
+        if not chunk:
+            self._drop(conn)
+            return
+        buf = self.inbox[conn]
+        buf += chunk
+        for body in split_messages(buf):
+            command = body[:1]
+            if command == b'S':
+                self.subscribers.setdefault(body[1:].decode('utf-8'), set()).add(conn)
+            elif command == b'P':
+                topic, _ = parse_publish(body)
+                framed = HEADER.pack(len(body)) + body
+                for sub in list(self.subscribers.get(topic, ())):
+                    self._send(sub, framed)
+
+    def _send(self, conn, data):
+        out = self.outbox[conn]
+        was_empty = not out
+        out += data
+        if len(out) > self.max_pending:
+            LOG.warning("Dropping slow subscriber", extra={'pending': len(out)})
+            self._drop(conn)
+            return
+        if was_empty:
+            self._flush(conn)
+
+    def _flush(self, conn):
+        out = self.outbox[conn]
+        try:
+            sent = conn.send(out)
+            del out[:sent]
+        except (BlockingIOError, InterruptedError):
+            pass
+        except OSError:
+            self._drop(conn)
+            return
+        events = selectors.EVENT_READ | (selectors.EVENT_WRITE if out else 0)
+        self.selector.modify(conn, events)
+
+    def _drop(self, conn):
+        if conn not in self.inbox:
+            return
+        self.selector.unregister(conn)
+        for subs in self.subscribers.values():
+            subs.discard(conn)
+        del self.inbox[conn]
+        del self.outbox[conn]
+        conn.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Frame/control broker for app.py and gateway.py")
+    parser.add_argument("--path", default=DEFAULT_PATH, help="Unix socket path")
+    args = parser.parse_args()
+    structured_log.setup()
+    try:
+        Broker(args.path).serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        structured_log.shutdown()
@@ -0,0 +1,21 @@
+"""
+Shared simulation core for the live server (app.py) and the offline
+generator (mission_generator.py).
+"""
+from .agents import UAV, UGV
+from .event_store import EventStore
+from .env import MissionEnv, VectorEnv
+from .entities import TargetState, TargetTable, UAVState, UGVState
+from .config import DEFAULT_CONFIG, LOCATIONS, SEARCH_AREA, make_config
+from .runner import iter_frames, run_batch
+from .scenario import generate_clustered, load_scenario
+from .sharding import ShardedWorld, make_world
+from .world import World, frame_from_snapshot
+
+__all__ = [
+    'DEFAULT_CONFIG', 'LOCATIONS', 'SEARCH_AREA', 'make_config',
+    'World', 'ShardedWorld', 'make_world', 'frame_from_snapshot',
+    'UAV', 'UGV', 'TargetTable', 'TargetState', 'UAVState', 'UGVState',
+    'EventStore', 'iter_frames', 'run_batch', 'load_scenario', 'generate_clustered',
+    'MissionEnv', 'VectorEnv',
+]
@@ -0,0 +1,375 @@
+"""
+engine/agents.py
+
+Simulated vehicles: UAV (search) and UGV (rescue).
+
+Agents use __slots__ and keep position/velocity in fixed 3-element
+array('d') vectors (x, y, z), so thousands of them stay small. They hold a
+reference to the World they live in for the shared tick, config, RNG,
+target table, route planner and event sink. Targets live in the World's
+TargetTable (see entities.py) and are referred to by index.
+"""
+import math
+from array import array
+
+from . import events
+from .config import LOCATIONS
+from .entities import TargetState, UAVState, UGVState
+
+BASE = (LOCATIONS['A']['x'], LOCATIONS['A']['y'], LOCATIONS['A']['z'])
+
+
+class UAV:
+    __slots__ = ('world', 'id', 'index', 'bit', 'type', 'velocity', 'state', 'position', 'target_pos',
+                 'role', 'hover_start_tick', 'max_speed', 'route', 'route_index', 'route_step',
+                 'patrol_target')
+
+    def __init__(self, world, uav_id, index, start_pos, route):
+        self.world = world
+        self.id = uav_id
+        self.index = index # Bit position in target detected_by bitsets
+        self.bit = 1 << index
+        self.type = 'UAV'
+        self.velocity = array('d', (0.0, 0.0, 0.0)) # Add velocity for smoothing
+        self.state = UAVState.IDLE
+        self.position = array('d', start_pos)
+        self.target_pos = None
+        self.role = 'LEADER' if index == 0 else 'FOLLOWER'
+        self.hover_start_tick = None
+        self.max_speed = world.config['uav_speed']
+
+        # Coverage Route: flat [x0, z0, x1, z1, ...] array shared from the route library
+        self.route = route
+        self.route_index = 0
+        self.route_step = 1 # Ping-pong along the sweep instead of a long transit back
+        self.patrol_target = None
+
+    def next_patrol_target(self):
+        # Only called when a waypoint is reached: per-tick patrol work is an index check
+        i = 2 * self.route_index
+        rng = self.world.rng
+        self.patrol_target = (self.route[i] + rng.uniform(-2, 2), 10.0, self.route[i + 1] + rng.uniform(-2, 2))
+
+    def update(self):
+        world = self.world
+        cfg = world.config
+        state = self.state
+
+        if state == UAVState.IDLE:
+            pass
+        elif state == UAVState.TAKEOFF:
+            # Takeoff to height 10 (per spec)
+            target_h = 10
+            if self.position[1] < target_h:
+                self.position[1] += 1
+            else:
+                self.state = UAVState.PATROL
+
+        elif state == UAVState.PATROL:
+            # Route Logic: Fly along the precomputed coverage route
+            if self.patrol_target is None:
+                self.next_patrol_target()
+            self.target_pos = self.patrol_target
+
+            self.move_to(self.target_pos)
+
+            # Check if reached route point
+            if self.distance_to(self.target_pos) < 5:
+                # Move to next point (reverse direction at either end of the route)
+                n_points = len(self.route) // 2
+                if n_points > 1:
+                    if not 0 <= self.route_index + self.route_step < n_points:
+                        self.route_step = -self.route_step
+                    self.route_index += self.route_step
+                self.next_patrol_target()
+
+            # Detection Logic (Perception Layer): batched with the other UAVs' scans
+            # once every agent has moved; a detection calls start_report()
+            world.queue_scan(self)
+
+        elif state == UAVState.REPORTING:
+            # Hover above target for hover_ticks
+            if self.target_pos:
+                self.move_to(self.target_pos)
+
+                if world.tick - self.hover_start_tick > cfg['hover_ticks']:
+                    # Finished reporting.
+                    # Spec: "Return to PATROL or execute RETURN (if strategy so)"
+                    # Strategy: Continue PATROL to maintain coverage unless Mission Complete.
+                    self.state = UAVState.PATROL
+                    # Note: UAV does NOT decide confirmation. It just reports and moves on.
+                elif world.sensor.hover_watch:
+                    world.queue_scan(self) # Keep watching for collaborative sensing
+
+        elif state == UAVState.RETURN:
+            # Return to Base A (Hover Point)
+            self.target_pos = (BASE[0], 10.0, BASE[2])
+            self.move_to(self.target_pos)
+
+            if self.distance_to(self.target_pos) < 5:
+                self.state = UAVState.LANDING
+
+        elif state == UAVState.LANDING:
+            # Descend to Ground
+            self.target_pos = (BASE[0], 0.0, BASE[2])
+            self.move_to(self.target_pos)
+
+            if self.position[1] < 0.5:
+                self.state = UAVState.IDLE
+
+    def start_report(self, i):
+        # UAV State Change: hover above the newly detected target and report it
+        x, _, z = self.world.target_position(i)
+        self.state = UAVState.REPORTING
+        self.target_pos = (x, 10.0, z)
+        self.hover_start_tick = self.world.tick
+
+    def move_to(self, target):
+        # Steering Behavior: Seek + Arrive
+        pos = self.position
+        vel = self.velocity
+
+        # Desired velocity
+        dx = target[0] - pos[0]
+        dy = target[1] - pos[1]
+        dz = target[2] - pos[2]
+        dist = math.sqrt(dx*dx + dy*dy + dz*dz)
+
+        max_speed = self.max_speed
+        steering_factor = 0.05 # Inertia factor (lower = more inertia/smoothness)
+
+        if dist < 0.1:
+            pos[0], pos[1], pos[2] = target
+            vel[0] = vel[1] = vel[2] = 0.0
+            return
+
+        # Arrive: Slow down when close
+        target_speed = max_speed
+        slow_radius = 10.0
+        if dist < slow_radius:
+            target_speed = max_speed * (dist / slow_radius)
+
+        # Steering force = desired - velocity
+        steer_x = (dx / dist) * target_speed - vel[0]
+        steer_y = (dy / dist) * target_speed - vel[1]
+        steer_z = (dz / dist) * target_speed - vel[2]
+
+        # Separation: Avoid crowding
+        sep_x, sep_y, sep_z = 0, 0, 0
+        count = 0
+
+        # Only apply separation if far from target
+        if dist > 5.0:
+            for other in self.world.agents.values():
+                if other is not self:
+                    o = other.position
+                    diff_x = pos[0] - o[0]
+                    diff_y = pos[1] - o[1]
+                    diff_z = pos[2] - o[2]
+                    d = math.sqrt(diff_x*diff_x + diff_y*diff_y + diff_z*diff_z)
+                    if d > 0 and d < 2.0: # Separation radius
+                        # Push away, weighted by distance
+                        sep_x += diff_x / d
+                        sep_y += diff_y / d
+                        sep_z += diff_z / d
+                        count += 1
+
+        if count > 0:
+            sep_x /= count
+            sep_y /= count
+            sep_z /= count
+            # Normalize and scale
+            sep_len = math.sqrt(sep_x**2 + sep_y**2 + sep_z**2)
+            if sep_len > 0:
+                # Steering for separation (weight separation higher)
+                steer_x += ((sep_x / sep_len) * max_speed - vel[0]) * 2.0
+                steer_y += ((sep_y / sep_len) * max_speed - vel[1]) * 2.0
+                steer_z += ((sep_z / sep_len) * max_speed - vel[2]) * 2.0
+
+        # Apply steering to velocity
+        vel[0] += steer_x * steering_factor
+        vel[1] += steer_y * steering_factor
+        vel[2] += steer_z * steering_factor
+
+        # Update position
+        pos[0] += vel[0]
+        pos[1] += vel[1]
+        pos[2] += vel[2]
+
+    def distance_to_2d(self, target_pos):
+        return math.sqrt((self.position[0] - target_pos[0])**2 +
+                         (self.position[2] - target_pos[2])**2)
+
+    def distance_to(self, target_pos):
+        return math.sqrt((self.position[0] - target_pos[0])**2 +
+                         (self.position[1] - target_pos[1])**2 +
+                         (self.position[2] - target_pos[2])**2)
+
+
+class UGV:
+    __slots__ = ('world', 'id', 'index', 'type', 'velocity', 'state', 'position', 'target_index',
+                 'target_pos', 'rescue_timer', 'path', 'path_index', 'reachable', 'max_speed')
+
+    def __init__(self, world, ugv_id, index, start_pos):
+        self.world = world
+        self.id = ugv_id
+        self.index = index
+        self.type = 'UGV'
+        self.velocity = array('d', (0.0, 0.0, 0.0))
+        self.state = UGVState.STANDBY
+        self.position = array('d', start_pos)
+        self.target_index = None # Row in the world's TargetTable
+        self.target_pos = None
+        self.rescue_timer = 0
+        self.path = [] # Planned (x, z) waypoints towards target_pos
+        self.path_index = 0
+        self.reachable = True # False while following a partial path (goal walled off)
+        self.max_speed = world.config['ugv_speed']
+
+    @property
+    def target_human_id(self):
+        return None if self.target_index is None else self.world.targets.ids[self.target_index]
+
+    def set_destination(self, pos):
+        """Plan a route around obstacles to pos (cached per start/goal cell)"""
+        self.target_pos = pos
+        self.path, self.reachable = self.world.planner.plan(self.position, pos)
+        self.path_index = 0
+        if not self.reachable:
+            # Stop at the closest reachable point instead of driving through obstacles
+            wx, wz = self.path[-1]
+            t_id = self.target_human_id
+            self.world.emit(events.PLANNER_WARNING,
+                            f'{self.id} 无法到达 ({pos[0]:.1f}, {pos[2]:.1f})，停在最近可达点 ({wx:.1f}, {wz:.1f})',
+                            agent=self.id, target=t_id)
+
+    def at_path_end(self):
+        wx, wz = self.path[-1]
+        return self.path_index == len(self.path) - 1 and (self.position[0] - wx) ** 2 + (self.position[2] - wz) ** 2 < 0.25
+
+    def follow_path(self):
+        # Pass through intermediate waypoints at speed, only "arrive" at the last one
+        wx, wz = self.path[self.path_index]
+        if self.path_index < len(self.path) - 1:
+            waypoint = (wx, 0.0, wz)
+            self.move_to(waypoint, arrive=False)
+            if self.distance_to(waypoint) < 2.0:
+                self.path_index += 1
+        else:
+            self.move_to((wx, 0.0, wz)) # The goal itself, or the closest reachable point
+
+    def update(self):
+        world = self.world
+        state = self.state
+
+        if state == UGVState.STANDBY:
+            pass # Wait for system dispatch
+
+        elif state == UGVState.DISPATCH:
+            if self.target_pos:
+                # Moving target: replan once it has drifted away from the planned goal
+                goal = world.targets.position(self.target_index)
+                drift_sq = (goal[0] - self.target_pos[0]) ** 2 + (goal[2] - self.target_pos[2]) ** 2
+                if drift_sq > world.config['retarget_distance'] ** 2:
+                    self.set_destination(goal)
+                    t_id = self.target_human_id
+                    world.emit(events.UGV_RETARGETED, f'{self.id} 目标 {t_id} 已移动，重新规划路线',
+                               agent=self.id, target=t_id)
+                self.follow_path()
+                if self.distance_to(self.target_pos) < 5: # Increased arrival threshold (was 2)
+                    self.state = UGVState.RESCUING
+                    self.rescue_timer = 0
+                    t_id = self.target_human_id
+                    world.emit(events.RESCUE_START, f'{self.id} 到达位置，开始救援 {t_id}',
+                               agent=self.id, target=t_id)
+                elif not self.reachable and self.at_path_end():
+                    # Closest reachable point is still out of reach: give the target up
+                    # (it stays CONFIRMED, is not dispatched again and no longer holds up
+                    # mission completion) and head home
+                    t_id = self.target_human_id
+                    world.unreachable.add(self.target_index)
+                    world.emit(events.PLANNER_WARNING, f'{self.id} 无法接近 {t_id}，放弃救援并返回基地',
+                               agent=self.id, target=t_id)
+                    self.state = UGVState.RETURNING
+                    self.target_index = None
+                    self.set_destination(BASE)
+
+        elif state == UGVState.RESCUING:
+            self.rescue_timer += 1
+            if self.rescue_timer >= world.config['rescue_ticks']:
+                # Mark target as rescued
+                t_id = self.target_human_id
+                world.targets.set_state(self.target_index, TargetState.RESCUED)
+                world.emit(events.TARGET_RESCUED, f'{self.id} 成功救援 {t_id} (CONFIRMED -> RESCUED)',
+                           agent=self.id, target=t_id)
+
+                self.state = UGVState.RETURNING
+                self.target_index = None
+                self.set_destination(BASE) # Return to base
+
+        elif state == UGVState.RETURNING:
+            self.follow_path()
+            if self.distance_to(BASE) < 5: # Increased standby threshold (was 2)
+                self.state = UGVState.STANDBY
+
+    def move_to(self, target, arrive=True):
+        # Steering Behavior: Seek + Arrive (2D for UGV)
+        pos = self.position
+        vel = self.velocity
+
+        dx = target[0] - pos[0]
+        dz = target[2] - pos[2]
+        dist = math.sqrt(dx*dx + dz*dz)
+
+        max_speed = self.max_speed
+        steering_factor = 0.05
+
+        if dist < 0.1:
+            pos[0] = target[0]
+            pos[2] = target[2]
+            vel[0] = vel[1] = vel[2] = 0.0
+            return
+
+        target_speed = max_speed
+        slow_radius = 5.0
+        if arrive and dist < slow_radius:
+            target_speed = max_speed * (dist / slow_radius)
+
+        vel[0] += ((dx / dist) * target_speed - vel[0]) * steering_factor
+        vel[2] += ((dz / dist) * target_speed - vel[2]) * steering_factor
+
+        pos[0] += vel[0]
+        pos[2] += vel[2]
+
+    def distance_to(self, target_pos):
+        return math.sqrt((self.position[0] - target_pos[0])**2 +
+                         (self.position[2] - target_pos[2])**2)
+
+
+class Mirror:
+    """
+    A real vehicle reported over telemetry (see telemetry.py). It is drawn,
+    recorded and avoided like the simulated agents, but takes no part in
+    search or rescue: it only moves to its latest report.
+    """
+    __slots__ = ('world', 'id', 'type', 'state', 'position', 'role', 'report')
+
+    def __init__(self, world, agent_id, agent_type, start_pos):
+        self.world = world
+        self.id = agent_id
+        self.type = agent_type
+        self.state = UAVState.IDLE if agent_type == 'UAV' else UGVState.STANDBY
+        self.position = array('d', start_pos)
+        self.role = 'MIRROR'
+        self.report = None # Latest report not applied yet
+
+    def update(self):
+        report = self.report
+        if report is None:
+            return
+        self.report = None
+        pos = self.position
+        pos[0], pos[1], pos[2] = report['x'], report['y'], report['z']
+        states = UAVState if self.type == 'UAV' else UGVState
+        if report.get('state') in states.__members__:
+            self.state = states[report['state']]
@@ -0,0 +1,112 @@
+"""
+engine/belief.py
+
+Belief map: where unconfirmed casualties probably are.
+
+A log-odds occupancy grid (NumPy float32, belief_cell world units per cell,
+over the terrain map) fuses every UAV observation each tick:
+
+- every cell of a sensing UAV's footprint (sensor_radius) is observed;
+- a cell holding a target the UAV can see reads positive with probability
+  PD, any other cell with the false-alarm probability PFA;
+- a positive reading adds log(PD / PFA), a negative one
+  log((1 - PD) / (1 - PFA)), and the result is clamped so the map can
+  still change its mind.
+
+All footprints of a tick are stamped with one np.add.at, so thousands of
+observations cost a handful of array operations. With confirm_mode='belief'
+a DETECTED target is confirmed once the posterior of its cell reaches
+confirm_posterior (confirm_timeout still applies as a fallback).
+
+heatmap() is the UI's coverage picture: log-odds downsampled by
+HEATMAP_BLOCK (block max) and scaled to one byte per cell, so searched-and-
+clear cells fall below the prior's byte and likely casualties rise above it.
+"""
+import math
+
+import numpy as np
+
+PD = 0.6 # P(positive reading | casualty visible in the cell)
+PFA = 0.05 # P(positive reading | empty cell)
+PRIOR = 0.02
+L_HIT = math.log(PD / PFA)
+L_MISS = math.log((1 - PD) / (1 - PFA))
+L_MIN, L_MAX = -6.0, 6.0
+BELIEF_STREAM = 0x62656c66 # Separate RNG stream, so other draws are unchanged
+HEATMAP_BLOCK = 4
+HEATMAP_EVERY = 5 # Ticks between heatmap frames
+
+
+def logit(p):
+    return math.log(p / (1 - p))
+
+
+class BeliefMap:
+    def __init__(self, config, grid, seed):
+        """Cover the planner grid's extent (grid: a pathfinding.CostGrid)"""
+        self.cell = float(config['belief_cell'])
+        self.origin_x = grid.origin_x
+        self.origin_z = grid.origin_z
+        self.width = int(math.ceil(grid.width * grid.cell_size / self.cell))
+        self.height = int(math.ceil(grid.height * grid.cell_size / self.cell))
+        self.log_odds = np.full((self.height, self.width), logit(PRIOR), dtype=np.float32)
+        self.rng = np.random.default_rng([seed, BELIEF_STREAM])
+
+        # Footprint stencil: cell offsets whose centres lie within the sensor radius
+        reach = int(math.ceil(config['sensor_radius'] / self.cell))
+        dz, dx = np.mgrid[-reach:reach + 1, -reach:reach + 1]
+        inside = (dx * dx + dz * dz) * self.cell ** 2 <= config['sensor_radius'] ** 2
+        self.stencil_x = dx[inside]
+        self.stencil_z = dz[inside]
+
+    def cells_of(self, x, z):
+        """(cz, cx) integer arrays for X/Z arrays (may fall outside the map)"""
+        cx = np.floor((np.asarray(x) - self.origin_x) / self.cell).astype(np.int64)
+        cz = np.floor((np.asarray(z) - self.origin_z) / self.cell).astype(np.int64)
+        return cz, cx
+
+    def observe(self, origins, hits, hit_owner):
+        """
+        Fuse one tick of observations. origins: [U, 2] X/Z of the sensing UAVs;
+        hits: [H, 2] X/Z of the targets they can see; hit_owner: [H] which UAV
+        sees each of them.
+        """
+        if not len(origins):
+            return
+        n_cells = self.width * self.height
+        cz, cx = self.cells_of(origins[:, 0], origins[:, 1])
+        fz = (cz[:, None] + self.stencil_z[None, :]).ravel()
+        fx = (cx[:, None] + self.stencil_x[None, :]).ravel()
+        owner = np.repeat(np.arange(len(origins)), len(self.stencil_x))
+        valid = (fx >= 0) & (fx < self.width) & (fz >= 0) & (fz < self.height)
+        flat = fz[valid] * self.width + fx[valid]
+        owner = owner[valid]
+
+        # (UAV, cell) keys holding a visible target
+        hz, hx = self.cells_of(hits[:, 0], hits[:, 1])
+        seen = np.isin(owner * n_cells + flat, np.unique(hit_owner * n_cells + hz * self.width + hx))
+
+        positive = self.rng.random(len(flat)) < np.where(seen, PD, PFA)
+        flat_odds = self.log_odds.reshape(-1)
+        np.add.at(flat_odds, flat, np.where(positive, L_HIT, L_MISS).astype(np.float32))
+        np.clip(flat_odds, L_MIN, L_MAX, out=flat_odds)
+
+    def posterior(self, x, z):
+        """Posterior occupancy at X/Z arrays (prior outside the map)"""
+        cz, cx = self.cells_of(x, z)
+        inside = (cx >= 0) & (cx < self.width) & (cz >= 0) & (cz < self.height)
+        odds = np.full(cx.shape, logit(PRIOR))
+        odds[inside] = self.log_odds[cz[inside], cx[inside]]
+        return 1.0 / (1.0 + np.exp(-odds))
+
+    def heatmap(self):
+        """{'x0', 'z0', 'cell', 'w', 'h', 'prior', 'data'}: one log-odds byte per cell, rows by Z"""
+        b = HEATMAP_BLOCK
+        h, w = -(-self.height // b), -(-self.width // b)
+        padded = np.full((h * b, w * b), L_MIN, dtype=np.float32)
+        padded[:self.height, :self.width] = self.log_odds
+        peak = padded.reshape(h, b, w, b).max(axis=(1, 3))
+        scale = 255 / (L_MAX - L_MIN)
+        return {'x0': self.origin_x, 'z0': self.origin_z, 'cell': self.cell * b, 'w': w, 'h': h,
+                'prior': int((logit(PRIOR) - L_MIN) * scale),
+                'data': ((peak - L_MIN) * scale).astype(np.uint8).tobytes()}
@@ -0,0 +1,88 @@
+"""
+engine/config.py
+
+Scenario constants and the tunable simulation parameters.
+
+Everything a run depends on lives in one plain dict (see DEFAULT_CONFIG), so
+the same config can drive the live server, the offline generator and the run
+cache key.
+"""
+import os
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# --- Locations ---
+LOCATIONS = {
+    "A": {"x": -50, "y": 0, "z": 50},   # Base
+    "B": {"x": 0, "y": 0, "z": 0},      # Search Center
+    "C": {"x": 60, "y": 0, "z": -60},   # Patrol Point (Extended to cover T3)
+    "T1": {"x": -20, "y": 0, "z": 20},
+    "T2": {"x": 0, "y": 0, "z": 0},      # Center of B
+    "T3": {"x": 60, "y": 0, "z": -60}    # Outer edge of C
+}
+
+# Search polygon swept by the UAVs (X/Z vertices), covers B and the C zone
+SEARCH_AREA = ((-35, 35), (15, 35), (75, -25), (75, -75), (25, -75), (-35, -15))
+
+# Relative paths are resolved against the repo root (keeps config/cache keys portable)
+TERRAIN_FILE = 'scenarios/terrain.json'
+
+
+def resolve_path(path):
+    return os.path.join(ROOT_DIR, path)
+
+
+DEFAULT_CONFIG = {
+    # Fleet
+    "uav_count": 3,
+    "ugv_count": 2,
+    # Targets: None = the fixed T1..T3 scenario, N = N targets scattered around B
+    "target_count": None,
+    # Scenario file (see scenario.py): targets, spawn points and config defaults.
+    # Replaces target_count when set.
+    "scenario_file": None,
+    # Moving targets (see motion.py): None, 'random_walk' or 'shelter'
+    "target_motion": None,
+    "target_mobile_fraction": 0.3,  # Share of targets able to walk
+    "target_speed": 0.1,         # While walking (world units per tick)
+    "shelters": [[-50, 50]],     # X/Z points 'shelter' walkers head for (Base A)
+    # Perception
+    "sensor_radius": 10,         # UNSEEN -> DETECTED (2D distance)
+    "collab_radius": 5,          # Extra UAVs joining detected_by
+    "sensor_model": "disc",      # or 'camera': FOV cone + terrain line of sight (sensor.py)
+    "sensor_fov": 90,            # Camera cone, full angle around nadir (degrees)
+    "coverage_pattern": "boustrophedon",  # or 'spiral'
+    # Decision layer
+    "confirm_count": 2,          # Multi-UAV confirmation
+    "confirm_timeout": 40,       # Ticks after first detection
+    "confirm_mode": "rule",      # or 'belief': posterior of the fused belief map (belief.py)
+    "confirm_posterior": 0.95,   # Belief mode: confirm once the target's cell reaches this
+    "belief_cell": 2.0,          # Belief map resolution (world units)
+    "auto_dispatch": True,       # False: UGVs wait for an external controller (env.py)
+    # Timings (ticks)
+    "hover_ticks": 60,
+    "rescue_ticks": 40,
+    # Motion
+    "uav_speed": 1.0,
+    "ugv_speed": 0.5,
+    "retarget_distance": 3.0,    # Dispatched UGVs replan once their target drifts this far
+    # Terrain for ground vehicles
+    "terrain_file": TERRAIN_FILE,
+    # Batch runs stop here even if the mission is not complete
+    "max_ticks": 5000,
+}
+
+
+def make_config(overrides=None):
+    """DEFAULT_CONFIG with `overrides` applied (unknown keys are rejected)"""
+    cfg = dict(DEFAULT_CONFIG)
+    overrides = overrides or {}
+    if overrides.get('scenario_file'):
+        # Scenario defaults sit between DEFAULT_CONFIG and explicit overrides
+        from .scenario import scenario_config
+        cfg.update(scenario_config(overrides['scenario_file']))
+    for key, value in overrides.items():
+        if key not in cfg:
+            raise KeyError(f"Unknown config key: {key}")
+        cfg[key] = value
+    return cfg
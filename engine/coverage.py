@@ -0,0 +1,122 @@
+"""
+coverage.py
+
+Precomputed coverage (sweep) routes for UAV swarms.
+
+Given a search polygon on the X/Z plane, a swarm size and a sensor radius,
+the area is cut into parallel sweep lines spaced so that neighbouring sensor
+footprints overlap slightly. The lines are divided into one contiguous band
+per UAV and each band is flown as a boustrophedon ("lawnmower") or as an
+inward spiral.
+
+Each route is a flat array('d') of [x0, z0, x1, z1, ...], so a UAV only has to
+advance an index when it reaches a waypoint. Routes are cached per
+(area, swarm size, sensor radius, pattern); callers must treat them as
+read-only because they are shared between UAVs and simulation resets.
+"""
+import math
+from array import array
+from functools import lru_cache
+
+# Fraction of the sensor footprint shared by adjacent sweep lines
+DEFAULT_OVERLAP = 0.2
+
+
+def sweep_segments(polygon, spacing):
+    """
+    Intersect the polygon with horizontal lines (constant z) every `spacing`
+    units. Returns a list of (z, [(x_in, x_out), ...]) from low z to high z.
+    """
+    zs = [p[1] for p in polygon]
+    z_min, z_max = min(zs), max(zs)
+    n_lines = max(1, int(math.ceil((z_max - z_min) / spacing)))
+    # Centre the lines inside the polygon's z-extent
+    offset = ((z_max - z_min) - (n_lines - 1) * spacing) / 2.0
+
+    lines = []
+    n = len(polygon)
+    for k in range(n_lines):
+        z = z_min + offset + k * spacing
+        xs = []
+        for i in range(n):
+            x0, z0 = polygon[i]
+            x1, z1 = polygon[(i + 1) % n]
+            if (z0 > z) != (z1 > z):
+                xs.append(x0 + (z - z0) * (x1 - x0) / (z1 - z0))
+        xs.sort()
+        spans = [(xs[i], xs[i + 1]) for i in range(0, len(xs) - 1, 2)]
+        if spans:
+            lines.append((z, spans))
+    return lines
+
+
+def boustrophedon(lines):
+    """Alternate sweep direction on every line so the path never doubles back"""
+    route = array('d')
+    forward = True
+    for z, spans in lines:
+        ordered = spans if forward else [(b, a) for a, b in reversed(spans)]
+        for x_in, x_out in ordered:
+            route.extend((x_in, z, x_out, z))
+        forward = not forward
+    return route
+
+
+def spiral(lines):
+    """
+    Inward spiral over a band: ring k runs along sweep lines k and -1-k, with
+    both ends pulled in by k line spacings so it follows the polygon outline.
+    """
+    route = array('d')
+    if not lines:
+        return route
+    spacing = lines[1][0] - lines[0][0] if len(lines) > 1 else 0.0
+    for k in range((len(lines) + 1) // 2):
+        z_lo, spans_lo = lines[k]
+        z_hi, spans_hi = lines[-1 - k]
+        inset = k * spacing
+        lo_a, lo_b = spans_lo[0][0] + inset, spans_lo[-1][1] - inset
+        hi_a, hi_b = spans_hi[0][0] + inset, spans_hi[-1][1] - inset
+        if lo_a > lo_b or hi_a > hi_b:
+            break
+        route.extend((lo_a, z_lo, lo_b, z_lo))
+        if z_hi != z_lo:
+            route.extend((hi_b, z_hi, hi_a, z_hi))
+    return route
+
+
+@lru_cache(maxsize=64)
+def coverage_routes(area, swarm_size, sensor_radius, pattern='boustrophedon', overlap=DEFAULT_OVERLAP):
+    """
+    One waypoint array per UAV covering `area` (a tuple of (x, z) vertices).
+    Sweep lines are split into `swarm_size` contiguous bands of near-equal size.
+    An area no sweep line crosses (zero-area, or thinner than the line
+    spacing) gets a single waypoint at its centre.
+    """
+    if len(area) < 3:
+        raise ValueError(f"Search area needs at least 3 vertices, got {len(area)}")
+    spacing = 2.0 * sensor_radius * (1.0 - overlap)
+    lines = sweep_segments(area, spacing)
+    swarm_size = max(1, swarm_size)
+
+    routes = []
+    per_uav, extra = divmod(len(lines), swarm_size)
+    start = 0
+    for i in range(swarm_size):
+        count = per_uav + (1 if i < extra else 0)
+        band = lines[start:start + count]
+        start += count
+        if not band:
+            # More UAVs than sweep lines: share the last band
+            band = lines[-1:]
+        route = spiral(band) if pattern == 'spiral' else boustrophedon(band)
+        if not route:
+            # UAV.next_patrol_target needs at least one waypoint
+            route = array('d', centre(area))
+        routes.append(route)
+    return tuple(routes)
+
+
+def centre(polygon):
+    """Mean of the vertices (defined for degenerate polygons too)"""
+    return (sum(p[0] for p in polygon) / len(polygon), sum(p[1] for p in polygon) / len(polygon))
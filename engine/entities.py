@@ -0,0 +1,177 @@
+"""
+engine/entities.py
+
+Compact state model: small-int state enums and the struct-of-arrays target
+table.
+
+Targets are not objects. A TargetTable keeps one flat typed column per field
+(interleaved x/y/z doubles, one byte of state, ...), so 100k targets cost a
+few MB and copying the whole table for a snapshot is a handful of memcpys.
+`detected_by` is a bitset over UAV indices (bit i = UAV with index i).
+"""
+from array import array
+from enum import IntEnum
+
+
+class TargetState(IntEnum):
+    UNSEEN = 0
+    DETECTED = 1
+    CONFIRMED = 2
+    RESCUED = 3
+
+
+class UAVState(IntEnum):
+    IDLE = 0
+    TAKEOFF = 1
+    PATROL = 2
+    REPORTING = 3
+    RETURN = 4
+    LANDING = 5
+
+
+class UGVState(IntEnum):
+    STANDBY = 0
+    DISPATCH = 1
+    RESCUING = 2
+    RETURNING = 3
+
+
+# Wire names indexed by enum value (frames keep the string states the UI expects)
+TARGET_STATE_NAMES = tuple(s.name for s in TargetState)
+UAV_STATE_NAMES = tuple(s.name for s in UAVState)
+UGV_STATE_NAMES = tuple(s.name for s in UGVState)
+
+NOT_DETECTED = -1
+
+
+def bit_ids(mask, ids):
+    """Expand a bitset into the list of ids it selects (ids[i] for each set bit i)"""
+    out = []
+    i = 0
+    while mask:
+        if mask & 1:
+            out.append(ids[i])
+        mask >>= 1
+        i += 1
+    return out
+
+
+class TargetTable:
+    __slots__ = ('ids', 'pos', 'state', 'first_detected', 'detected_by', 'counts')
+
+    def __init__(self):
+        self.ids = []                     # Target ids ('T1', ...)
+        self.pos = array('d')             # x0, y0, z0, x1, y1, z1, ...
+        self.state = bytearray()          # TargetState values
+        self.first_detected = array('q')  # Tick of first detection, NOT_DETECTED if never
+        self.detected_by = []             # Bitset over UAV indices (0 for most targets)
+        self.counts = [0] * len(TargetState)
+
+    def __len__(self):
+        return len(self.state)
+
+    def add(self, t_id, x, y, z):
+        self.ids.append(t_id)
+        self.pos.extend((x, y, z))
+        self.state.append(TargetState.UNSEEN)
+        self.first_detected.append(NOT_DETECTED)
+        self.detected_by.append(0)
+        self.counts[TargetState.UNSEEN] += 1
+        return len(self.state) - 1
+
+    def extend(self, ids, pos):
+        """Bulk add: ids plus their flat x, y, z positions (scenario loading)"""
+        n = len(ids)
+        if len(pos) != 3 * n:
+            raise ValueError(f"{n} target ids but {len(pos) // 3} positions")
+        self.ids.extend(ids)
+        self.pos.extend(pos)
+        self.state.extend(bytes((TargetState.UNSEEN,)) * n)
+        self.first_detected.extend(array('q', (NOT_DETECTED,)) * n)
+        self.detected_by.extend([0] * n)
+        self.counts[TargetState.UNSEEN] += n
+
+    def position(self, i):
+        j = 3 * i
+        return (self.pos[j], self.pos[j + 1], self.pos[j + 2])
+
+    def set_state(self, i, state):
+        self.counts[self.state[i]] -= 1
+        self.counts[state] += 1
+        self.state[i] = state
+
+    def snapshot(self):
+        """Immutable copy of the mutable columns (ids are append-only and shared)"""
+        return {
+            'ids': self.ids,
+            'pos': self.pos.tobytes(),
+            'state': bytes(self.state),
+            'detected_by': tuple(self.detected_by),
+        }
+
+
+class GridIndex:
+    """
+    Uniform grid over target X/Z positions: cell -> target indices.
+    A radius query visits only the cells it overlaps, and returns candidates in
+    table order so scans stay deterministic. Moving targets are re-bucketed in
+    O(1) (swap-remove through a per-target slot), so the index tracks the
+    targets that moved rather than the whole table.
+    """
+    __slots__ = ('cell', 'cells', 'keep', 'slot')
+
+    def __init__(self, pos, cell, keep=None):
+        self.cell = cell = float(cell)
+        self.keep = keep
+        self.slot = slot = array('q', [-1]) * (len(pos) // 3) # Position in its bucket, -1 if not kept
+        cells = {}
+        for i in range(len(pos) // 3):
+            x = pos[3 * i]
+            if keep is not None and not keep(x):
+                continue
+            key = (int(x // cell), int(pos[3 * i + 2] // cell))
+            bucket = cells.get(key)
+            if bucket is None:
+                bucket = cells[key] = array('q')
+            slot[i] = len(bucket)
+            bucket.append(i)
+        self.cells = cells
+
+    def near(self, x, z, r):
+        """Sorted indices of the targets in cells within r of (x, z) (a superset of the disc)"""
+        cell = self.cell
+        cx0, cx1 = int((x - r) // cell), int((x + r) // cell)
+        cz0, cz1 = int((z - r) // cell), int((z + r) // cell)
+        cells = self.cells
+        out = []
+        for cx in range(cx0, cx1 + 1):
+            for cz in range(cz0, cz1 + 1):
+                bucket = cells.get((cx, cz))
+                if bucket is not None:
+                    out.extend(bucket)
+        out.sort()
+        return out
+
+    def move(self, i, x0, z0, x1, z1):
+        """Re-bucket target i after it moved from (x0, z0) to (x1, z1)"""
+        cell = self.cell
+        old = (int(x0 // cell), int(z0 // cell))
+        new = (int(x1 // cell), int(z1 // cell))
+        keep = self.keep
+        now = keep is None or keep(x1)
+        slot = self.slot
+        if old == new and now == (slot[i] >= 0):
+            return
+        if slot[i] >= 0:
+            bucket = self.cells[old]
+            last = bucket.pop()
+            if last != i:
+                bucket[slot[i]] = last
+                slot[last] = slot[i]
+            slot[i] = -1
+        if now:
+            bucket = self.cells.get(new)
+            if bucket is None:
+                bucket = self.cells[new] = array('q')
+            slot[i] = len(bucket)
+            bucket.append(i)
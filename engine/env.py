@@ -0,0 +1,274 @@
+"""
+engine/env.py
+
+Programmatic stepping API, for training and evaluating controllers.
+
+MissionEnv wraps one serial World: reset(seed) starts a run, step(actions)
+applies a controller's actions, advances one tick and returns
+(observation, events). Observations are NumPy arrays read straight from the
+kernel's flat buffers (no JSON frames are built), so an env steps at kernel
+speed. Actions are a dict, every key optional:
+
+- 'uav_waypoints': float [n_uav, 2], an X/Z waypoint per UAV (NaN rows keep
+                   the coverage route). Only patrolling UAVs follow it.
+- 'dispatch':      int [n_ugv], a target index per UGV (-1 for none). Only
+                   STANDBY UGVs take it, and only for a confirmed target no
+                   UGV has been sent to yet.
+
+With config auto_dispatch=False the built-in earliest-first rule is off and
+dispatch is left entirely to the controller. Target positions are ground
+truth: a search controller should mask UNSEEN targets out itself.
+
+VectorEnv steps K independent worlds per call and stacks their observations
+into [K, ...] arrays (so all K must share one config). The worlds run
+in-process, or split into contiguous slices across `processes` worker
+processes that are stepped in parallel, one pipe message each way per call.
+A world that finished is reset by the next step() call: its actions are
+ignored and it reports the new run's first tick.
+"""
+import atexit
+import math
+import multiprocessing as mp
+import os
+import random
+import traceback
+
+import numpy as np
+
+from .config import make_config
+from .entities import UAVState
+from .world import World
+
+PHASES = ('READY', 'PATROL', 'RESCUE', 'COMPLETE') # obs['phase'] indexes this
+PATROL_ALTITUDE = 10.0 # See UAV.next_patrol_target
+NO_TARGET = -1
+PATROL = UAVState.PATROL
+
+
+class MissionEnv:
+    def __init__(self, config=None):
+        self.config = make_config(config)
+        self.world = None
+
+    @property
+    def done(self):
+        world = self.world
+        return world is not None and (world.complete or world.tick >= self.config['max_ticks'])
+
+    def reset(self, seed=None):
+        """Start a fresh run; returns its first observation (tick 0)"""
+        self.world = World(self.config, seed)
+        return self.observe()
+
+    def step(self, actions=None):
+        """Apply `actions`, advance one tick. Returns (observation, events of the tick)."""
+        if self.world is None:
+            raise RuntimeError("reset() must be called before step()")
+        if actions:
+            self.apply(actions)
+        events = self.world.step()
+        return self.observe(), events
+
+    def apply(self, actions):
+        world = self.world
+        waypoints = actions.get('uav_waypoints')
+        if waypoints is not None:
+            for uav, (x, z) in zip(world.uavs, np.asarray(waypoints, dtype=np.float64).tolist()):
+                if uav.state == PATROL and not (math.isnan(x) or math.isnan(z)):
+                    uav.patrol_target = (x, PATROL_ALTITUDE, z)
+        dispatch = actions.get('dispatch')
+        if dispatch is not None:
+            for ugv, i in zip(world.ugvs, np.asarray(dispatch, dtype=np.int64).tolist()):
+                if i != NO_TARGET:
+                    world.assign(ugv, i)
+
+    def observe(self):
+        world = self.world
+        n_uav = len(world.uavs)
+        agent_pos = np.frombuffer(world.agent_positions(), dtype=np.float64).reshape(-1, 3)
+        obs = {
+            'tick': world.tick,
+            'phase': PHASES.index(world.phase),
+            'done': self.done,
+            'uav_pos': agent_pos[:n_uav],
+            'uav_state': np.array([uav.state for uav in world.uavs], dtype=np.uint8),
+            'ugv_pos': agent_pos[n_uav:n_uav + len(world.ugvs)],
+            'ugv_state': np.array([ugv.state for ugv in world.ugvs], dtype=np.uint8),
+            'ugv_target': np.array([NO_TARGET if ugv.target_index is None else ugv.target_index
+                                    for ugv in world.ugvs], dtype=np.int64),
+            'target_pos': np.frombuffer(world.targets.pos, dtype=np.float64).reshape(-1, 3).copy(),
+            'target_state': np.frombuffer(world.targets.state, dtype=np.uint8).copy(),
+        }
+        if world.belief is not None:
+            obs['belief'] = world.belief.log_odds.copy()
+        return obs
+
+
+def stack(observations):
+    """Per-world observation dicts -> one dict of [K, ...] arrays"""
+    return {key: np.stack([np.asarray(obs[key]) for obs in observations]) for key in observations[0]}
+
+
+def _concat(parts):
+    """Worker slices of stacked observations -> one stacked dict"""
+    if len(parts) == 1:
+        return parts[0]
+    return {key: np.concatenate([part[key] for part in parts]) for key in parts[0]}
+
+
+def _slice_actions(actions, lo, hi):
+    if not actions:
+        return None
+    return {key: value[lo:hi] for key, value in actions.items() if value is not None}
+
+
+class _EnvSlice:
+    """K worlds stepped in lockstep (in-process, or inside one worker process)"""
+
+    def __init__(self, config, n):
+        self.envs = [MissionEnv(config) for _ in range(n)]
+
+    def reset(self, seeds):
+        return stack([env.reset(seed) for env, seed in zip(self.envs, seeds)])
+
+    def step(self, actions):
+        observations = []
+        events = []
+        for k, env in enumerate(self.envs):
+            if env.done:
+                # Finished on the previous call: start the next run (seeded from this one)
+                observations.append(env.reset(env.world.rng.randrange(2**32)))
+                events.append([])
+                continue
+            obs, evts = env.step({key: value[k] for key, value in actions.items() if value is not None}
+                                 if actions else None)
+            observations.append(obs)
+            events.append(evts)
+        return stack(observations), events
+
+
+def _worker_main(config, n, conn):
+    # A coordinator under eventlet (serve.py) creates the pipe from a green socketpair,
+    # which leaves this end non-blocking
+    os.set_blocking(conn.fileno(), True)
+    try:
+        envs = _EnvSlice(config, n)
+        conn.send(('ready',))
+        while True:
+            msg = conn.recv()
+            if msg[0] == 'step':
+                conn.send(('done', envs.step(msg[1])))
+            elif msg[0] == 'reset':
+                conn.send(('done', envs.reset(msg[1])))
+            elif msg[0] == 'stop':
+                break
+    except Exception:
+        conn.send(('error', traceback.format_exc()))
+    finally:
+        conn.close()
+
+
+class VectorEnv:
+    """n independent MissionEnvs stepped together (across `processes` workers if > 1)"""
+
+    def __init__(self, n, config=None, processes=0):
+        self.n = n
+        self.config = make_config(config)
+        self.closed = False
+        self.workers = []
+        self.conns = []
+        self.local = None
+        if not processes or processes <= 1:
+            self.local = _EnvSlice(self.config, n)
+            return
+
+        processes = min(processes, n)
+        bounds = np.linspace(0, n, processes + 1).astype(int).tolist()
+        self.slices = list(zip(bounds[:-1], bounds[1:]))
+        ctx = mp.get_context('spawn')
+        atexit.register(self.close)
+        try:
+            for lo, hi in self.slices:
+                parent, child = ctx.Pipe()
+                proc = ctx.Process(target=_worker_main, args=(self.config, hi - lo, child), daemon=True)
+                proc.start()
+                child.close()
+                self.workers.append(proc)
+                self.conns.append(parent)
+            for conn in self.conns:
+                self._expect(conn, 'ready')
+        except BaseException:
+            self.close()
+            raise
+
+    def _expect(self, conn, kind):
+        try:
+            msg = conn.recv()
+        except EOFError:
+            msg = ('error', 'worker process exited')
+        if msg[0] == 'error':
+            self.close()
+            raise RuntimeError(f"Env worker failed:\n{msg[1]}")
+        if msg[0] != kind:
+            raise RuntimeError(f"Unexpected env worker message: {msg!r}")
+        return msg
+
+    def _gather(self):
+        return [self._expect(conn, 'done')[1] for conn in self.conns]
+
+    def reset(self, seed=None):
+        """
+        Start a fresh run in every world. `seed` is a list of per-world seeds,
+        one int (world k gets seed + k) or None (random seeds).
+        """
+        if seed is None:
+            seeds = [random.randrange(2**32) for _ in range(self.n)]
+        elif isinstance(seed, int):
+            seeds = [seed + k for k in range(self.n)]
+        else:
+            seeds = list(seed)
+            if len(seeds) != self.n:
+                raise ValueError(f"{len(seeds)} seeds for {self.n} worlds")
+        if self.local is not None:
+            return self.local.reset(seeds)
+        for conn, (lo, hi) in zip(self.conns, self.slices):
+            conn.send(('reset', seeds[lo:hi]))
+        return _concat(self._gather())
+
+    def step(self, actions=None):
+        """
+        Step every world. `actions` maps action keys to [K, ...] arrays (see
+        MissionEnv). Returns (stacked observations, list of K event lists).
+        """
+        if self.local is not None:
+            return self.local.step(actions)
+        for conn, (lo, hi) in zip(self.conns, self.slices):
+            conn.send(('step', _slice_actions(actions, lo, hi)))
+        parts = self._gather()
+        events = []
+        for _, evts in parts:
+            events.extend(evts)
+        return _concat([obs for obs, _ in parts]), events
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        if not self.workers:
+            return
+        atexit.unregister(self.close)
+        for conn in self.conns:
+            try:
+                conn.send(('stop',))
+            except (OSError, EOFError):
+                pass
+        for proc in self.workers:
+            proc.join(timeout=5)
+            if proc.is_alive():
+                proc.terminate()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,78 @@
+"""
+engine/event_store.py
+
+Append-only, indexed log of one run's events (see events.py for the schema).
+
+Every World records its events here as they are emitted. Besides the event
+list the store keeps, per type / agent / target, the ascending sequence
+numbers of matching events. Ticks never decrease within a run, so a tick
+window is two binary searches on any of those lists, and a query touches only
+the events it returns instead of every frame of the history.
+"""
+from array import array
+from bisect import bisect_left, bisect_right
+
+
+class EventStore:
+    __slots__ = ('events', 'ticks', 'by_type', 'by_agent', 'by_target')
+
+    def __init__(self, events=()):
+        self.events = []
+        self.ticks = array('q')
+        self.by_type = {}
+        self.by_agent = {}
+        self.by_target = {}
+        for evt in events:
+            self.append(evt)
+
+    def __len__(self):
+        return len(self.events)
+
+    @classmethod
+    def from_frames(cls, frames):
+        """Rebuild the store of a recorded timeline"""
+        return cls(evt for frame in frames for evt in frame.get('events', ()))
+
+    def append(self, evt):
+        seq = len(self.events)
+        self.events.append(evt)
+        self.ticks.append(evt.get('tick', 0))
+        self.by_type.setdefault(evt['type'], array('l')).append(seq)
+        if 'agent' in evt:
+            self.by_agent.setdefault(evt['agent'], array('l')).append(seq)
+        if 'target' in evt:
+            self.by_target.setdefault(evt['target'], array('l')).append(seq)
+
+    def query(self, event_type=None, agent=None, target=None, from_tick=None, to_tick=None, limit=None):
+        """Events matching every given filter, in emission order"""
+        lists = []
+        for index, key in ((self.by_type, event_type), (self.by_agent, agent), (self.by_target, target)):
+            if key is not None:
+                lists.append(index.get(key, ()))
+        if not lists:
+            lists.append(range(len(self.events)))
+        # Walk the most selective index, binary-search the others for each of its seqs
+        lists.sort(key=len)
+        seqs = lists[0]
+
+        ticks = self.ticks
+        lo = 0 if from_tick is None else bisect_left(seqs, from_tick, key=ticks.__getitem__)
+        hi = len(seqs) if to_tick is None else bisect_right(seqs, to_tick, key=ticks.__getitem__)
+        others = lists[1:]
+        cursors = [0] * len(others) # Seqs only grow, so each cursor only moves forward
+
+        out = []
+        for k in range(lo, hi):
+            seq = seqs[k]
+            for j, other in enumerate(others):
+                c = cursors[j] = bisect_left(other, seq, cursors[j])
+                if c == len(other) or other[c] != seq:
+                    break
+            else:
+                out.append(self.events[seq])
+                if limit is not None and len(out) >= limit:
+                    break
+        return out
+
+    def counts(self):
+        return {event_type: len(seqs) for event_type, seqs in self.by_type.items()}
@@ -0,0 +1,31 @@
+"""
+engine/events.py
+
+Mission event schema shared by the live server and offline runs.
+
+Every event is a flat dict:
+    {'type': 'TARGET_CONFIRMED', 'tick': 57, 'msg': '...', 'agent': 'UAV2', 'target': 'T1'}
+'agent' / 'target' are only present when the event concerns one.
+"""
+
+# Event types
+HUMAN_DETECTED = 'HUMAN_DETECTED'
+TARGET_CONFIRMED = 'TARGET_CONFIRMED'
+UGV_DISPATCHED = 'UGV_DISPATCHED'
+UGV_RETARGETED = 'UGV_RETARGETED'
+PLANNER_WARNING = 'PLANNER_WARNING'
+RESCUE_START = 'RESCUE_START'
+TARGET_RESCUED = 'TARGET_RESCUED'
+UAV_RETURN = 'UAV_RETURN'
+MISSION_COMPLETE = 'MISSION_COMPLETE'
+RESET = 'RESET'
+ERROR = 'ERROR'
+
+
+def make_event(event_type, msg, tick, agent=None, target=None):
+    evt = {'type': event_type, 'tick': tick, 'msg': msg}
+    if agent is not None:
+        evt['agent'] = agent
+    if target is not None:
+        evt['target'] = target
+    return evt
@@ -0,0 +1,145 @@
+"""
+engine/motion.py
+
+Moving targets: casualties and survivors who walk.
+
+A share of the targets (target_mobile_fraction) can move. Each mobile target
+alternates between resting and walking a leg of a few ticks. Resting targets
+sit in a heap keyed by wake-up tick and cost nothing; the targets currently
+walking are advanced together as one NumPy step, so a tick costs in proportion
+to the targets that actually move. Models (config 'target_motion'):
+
+- 'random_walk': every leg heads in a random direction.
+- 'shelter':     every leg heads for the nearest shelter (with some heading
+                 noise); a target that reaches one stays there.
+
+Targets never walk into blocked terrain or off the map, and hold still once
+RESCUED or while a UGV is rescuing them. Only targets that cross a cell
+boundary are re-bucketed in the World's GridIndex.
+"""
+import heapq
+import math
+
+import numpy as np
+
+from .entities import TargetState, UGVState
+
+MOTION_MODELS = ('random_walk', 'shelter')
+MOTION_STREAM = 0x6d6f7665 # Separate RNG stream, so UAV patrol jitter is unchanged
+LEG_TICKS = (10, 40) # Walking leg length (ticks, inclusive range)
+REST_TICKS = (20, 120)
+HEADING_NOISE = 0.5 # Radians of spread around the heading to a shelter
+SHELTER_RADIUS = 2.0
+
+RESCUED = TargetState.RESCUED
+
+
+class TargetMotion:
+    def __init__(self, world):
+        cfg = world.config
+        self.kind = cfg['target_motion']
+        if self.kind not in MOTION_MODELS:
+            raise ValueError(f"Unknown target_motion: {self.kind}")
+        self.speed = cfg['target_speed']
+        self.shelters = np.array(cfg['shelters'], dtype=np.float64).reshape(-1, 2)
+        self.rng = np.random.default_rng([world.seed, MOTION_STREAM])
+
+        grid = world.planner.grid
+        self.grid = grid
+        self.blocked = np.isinf(np.array(grid.costs)).reshape(grid.height, grid.width)
+
+        mobile = np.flatnonzero(self.rng.random(len(world.targets)) < cfg['target_mobile_fraction'])
+        wake = self.rng.integers(1, REST_TICKS[1] + 1, len(mobile))
+        self.resting = list(zip(wake.tolist(), mobile.tolist()))
+        heapq.heapify(self.resting)
+        # Walking targets: index, heading (per-tick X/Z step) and last tick of the leg
+        self.walkers = np.zeros(0, dtype=np.int64)
+        self.step_xz = np.zeros((0, 2))
+        self.leg_end = np.zeros(0, dtype=np.int64)
+        self.moved_step = self.step_xz # X/Z displacement of the targets the last step() moved
+
+    def _rest(self, tick, indices):
+        wake = tick + self.rng.integers(REST_TICKS[0], REST_TICKS[1] + 1, len(indices))
+        for entry in zip(wake.tolist(), indices.tolist()):
+            heapq.heappush(self.resting, entry)
+
+    def _start_legs(self, tick, pos, starters):
+        xz = pos[starters][:, [0, 2]]
+        if self.kind == 'shelter':
+            d = xz[:, None, :] - self.shelters[None, :, :]
+            nearest = self.shelters[np.argmin((d ** 2).sum(axis=2), axis=1)]
+            delta = nearest - xz
+            heading = np.arctan2(delta[:, 1], delta[:, 0]) + self.rng.normal(0.0, HEADING_NOISE, len(starters))
+        else:
+            heading = self.rng.uniform(-math.pi, math.pi, len(starters))
+        step = self.speed * np.column_stack((np.cos(heading), np.sin(heading)))
+        legs = self.rng.integers(LEG_TICKS[0], LEG_TICKS[1] + 1, len(starters))
+        self.walkers = np.concatenate((self.walkers, starters))
+        self.step_xz = np.concatenate((self.step_xz, step))
+        self.leg_end = np.concatenate((self.leg_end, tick + legs))
+
+    def _free(self, xz):
+        """Mask of X/Z points on the map and off blocked terrain"""
+        grid = self.grid
+        cx = np.floor((xz[:, 0] - grid.origin_x) / grid.cell_size).astype(np.int64)
+        cz = np.floor((xz[:, 1] - grid.origin_z) / grid.cell_size).astype(np.int64)
+        free = (cx >= 0) & (cx < grid.width) & (cz >= 0) & (cz < grid.height)
+        free[free] = ~self.blocked[cz[free], cx[free]]
+        return free
+
+    def step(self, world):
+        """Advance the walking targets one tick. Returns the indices that moved (steps in moved_step)."""
+        tick = world.tick
+        targets = world.targets
+        pos = np.frombuffer(targets.pos, dtype=np.float64).reshape(-1, 3)
+        t_state = np.frombuffer(targets.state, dtype=np.uint8)
+        held = [ugv.target_index for ugv in world.ugvs if ugv.state == UGVState.RESCUING]
+
+        starters = []
+        while self.resting and self.resting[0][0] <= tick:
+            starters.append(heapq.heappop(self.resting)[1])
+        if starters:
+            starters = np.array(starters, dtype=np.int64)
+            starters = starters[t_state[starters] != RESCUED] # Rescued targets drop out for good
+            if self.kind == 'shelter':
+                xz = pos[starters][:, [0, 2]]
+                d_sq = ((xz[:, None, :] - self.shelters[None, :, :]) ** 2).sum(axis=2).min(axis=1)
+                starters = starters[d_sq > SHELTER_RADIUS ** 2] # Arrived targets stay put
+            rescuing = np.isin(starters, held)
+            self._rest(tick, starters[rescuing])
+            self._start_legs(tick, pos, starters[~rescuing])
+        if not len(self.walkers):
+            self.moved_step = self.step_xz
+            return self.walkers
+
+        walkers = self.walkers
+        old = pos[walkers][:, [0, 2]]
+        new = old + self.step_xz
+        ok = self._free(new) & (t_state[walkers] != RESCUED) & ~np.isin(walkers, held)
+        if self.kind == 'shelter':
+            d_sq = ((new[:, None, :] - self.shelters[None, :, :]) ** 2).sum(axis=2).min(axis=1)
+            arrived = ok & (d_sq <= SHELTER_RADIUS ** 2)
+        else:
+            arrived = np.zeros(len(walkers), dtype=bool)
+        moved = walkers[ok]
+        self.moved_step = self.step_xz[ok]
+        old, new = old[ok], new[ok]
+        pos[moved, 0] = new[:, 0]
+        pos[moved, 2] = new[:, 1]
+
+        # Re-bucket only the targets that changed grid cell
+        index = world.target_index
+        crossed = np.flatnonzero((np.floor(old / index.cell) != np.floor(new / index.cell)).any(axis=1))
+        for k in crossed.tolist():
+            index.move(int(moved[k]), old[k, 0], old[k, 1], new[k, 0], new[k, 1])
+
+        # Legs end on schedule, on a blocked step, or on arrival; rescued / arrived targets stop for good
+        done = ~ok | arrived | (self.leg_end <= tick)
+        if done.any():
+            rest = done & ~arrived & (t_state[walkers] != RESCUED)
+            self._rest(tick, walkers[rest])
+            keep = ~done
+            self.walkers = walkers[keep]
+            self.step_xz = self.step_xz[keep]
+            self.leg_end = self.leg_end[keep]
+        return moved
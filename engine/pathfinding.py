@@ -0,0 +1,248 @@
+"""
+pathfinding.py
+
+Occupancy/cost grid + A* planner for ground vehicles.
+
+The terrain is a regular grid over the X/Z plane loaded from a scenario file
+(see scenarios/terrain.json). Each cell holds a traversal cost multiplier;
+blocked cells (buildings, collapsed structures) have infinite cost.
+
+Plans are cached per (start cell, goal cell) in an LRU, so repeated trips
+between the base and the same rescue zones cost a dict lookup after the first
+query. Returned paths are line-of-sight smoothed and stored as tuples of
+(x, z) waypoints, which makes them safe to share between vehicles.
+
+A goal that cannot be reached (blocked, or walled off) gets the path to the
+reachable cell closest to it, flagged as partial, so a vehicle never drives
+through an obstacle to get there.
+"""
+import heapq
+import json
+import math
+from collections import OrderedDict
+
+BLOCKED = math.inf
+
+# 8-connected neighbourhood: (dx, dz, step length)
+NEIGHBOURS = [
+    (1, 0, 1.0), (-1, 0, 1.0), (0, 1, 1.0), (0, -1, 1.0),
+    (1, 1, math.sqrt(2)), (1, -1, math.sqrt(2)), (-1, 1, math.sqrt(2)), (-1, -1, math.sqrt(2)),
+]
+
+
+class CostGrid:
+    def __init__(self, origin_x, origin_z, cell_size, width, height, default_cost=1.0):
+        self.origin_x = origin_x
+        self.origin_z = origin_z
+        self.cell_size = cell_size
+        self.width = width
+        self.height = height
+        self.costs = [default_cost] * (width * height)
+        self.spec = None # Raw scenario spec (for clients that want to draw it)
+
+    def in_bounds(self, cx, cz):
+        return 0 <= cx < self.width and 0 <= cz < self.height
+
+    def cost(self, cx, cz):
+        return self.costs[cz * self.width + cx]
+
+    def is_blocked(self, cx, cz):
+        return self.costs[cz * self.width + cx] == BLOCKED
+
+    def world_to_cell(self, x, z):
+        cx = int((x - self.origin_x) // self.cell_size)
+        cz = int((z - self.origin_z) // self.cell_size)
+        # Clamp so positions slightly outside the map still resolve
+        return (min(max(cx, 0), self.width - 1), min(max(cz, 0), self.height - 1))
+
+    def cell_to_world(self, cx, cz):
+        return (self.origin_x + (cx + 0.5) * self.cell_size,
+                self.origin_z + (cz + 0.5) * self.cell_size)
+
+    def fill_rect(self, x0, z0, x1, z1, cost):
+        """Set the cost of every cell overlapping the world-space rectangle"""
+        cx0, cz0 = self.world_to_cell(min(x0, x1), min(z0, z1))
+        cx1, cz1 = self.world_to_cell(max(x0, x1), max(z0, z1))
+        for cz in range(cz0, cz1 + 1):
+            row = cz * self.width
+            for cx in range(cx0, cx1 + 1):
+                self.costs[row + cx] = cost
+
+    def line_of_sight(self, a, b):
+        """
+        True if the straight segment between two cell centres crosses no
+        blocked cell. Every cell the segment passes through is checked (not
+        only one per step, as Bresenham would), and a segment through a cell
+        corner must clear both cells beside it, like A*'s diagonal moves.
+        """
+        (x0, z0), (x1, z1) = a, b
+        nx, nz = abs(x1 - x0), abs(z1 - z0)
+        sx = 1 if x1 > x0 else -1
+        sz = 1 if z1 > z0 else -1
+        base = self.cost(x0, z0)
+
+        def clear(cx, cz):
+            # Do not shortcut across blocked or more expensive terrain
+            c = self.cost(cx, cz)
+            return c != BLOCKED and c <= base
+
+        ix = iz = 0
+        while ix < nx or iz < nz:
+            # Which cell border the segment crosses next: x (< 0), z (> 0) or a corner (0)
+            side = (1 + 2 * ix) * nz - (1 + 2 * iz) * nx
+            if side == 0:
+                if not (clear(x0 + sx, z0) and clear(x0, z0 + sz)):
+                    return False
+                x0 += sx
+                z0 += sz
+                ix += 1
+                iz += 1
+            elif side < 0:
+                x0 += sx
+                ix += 1
+            else:
+                z0 += sz
+                iz += 1
+            if not clear(x0, z0):
+                return False
+        return True
+
+
+def load_grid(path):
+    """Build a CostGrid from a JSON scenario file"""
+    with open(path, 'r', encoding='utf-8') as f:
+        spec = json.load(f)
+
+    origin = spec.get('origin', {'x': -100, 'z': -100})
+    grid = CostGrid(origin['x'], origin['z'], spec.get('cell_size', 2.0),
+                    spec.get('width', 100), spec.get('height', 100),
+                    spec.get('default_cost', 1.0))
+    for zone in spec.get('cost_zones', []):
+        grid.fill_rect(zone['x0'], zone['z0'], zone['x1'], zone['z1'], zone['cost'])
+    # Obstacles are inflated by the vehicle clearance so plans keep off the walls
+    pad = spec.get('clearance', 0.0)
+    for obs in spec.get('obstacles', []):
+        grid.fill_rect(min(obs['x0'], obs['x1']) - pad, min(obs['z0'], obs['z1']) - pad,
+                       max(obs['x0'], obs['x1']) + pad, max(obs['z0'], obs['z1']) + pad, BLOCKED)
+    grid.spec = spec
+    return grid
+
+
+def astar(grid, start, goal, partial=False):
+    """
+    A* over grid cells. Returns a list of cells from start to goal, or None.
+    With partial=True an unreachable goal gives the path to the reachable cell
+    closest to it instead (check the last cell against the goal).
+    """
+    if start == goal:
+        return [start]
+    if grid.is_blocked(*goal) and not partial:
+        return None
+
+    gx, gz = goal
+
+    def heuristic(cx, cz):
+        # Octile distance (admissible for 8-connected moves with cost >= 1)
+        dx, dz = abs(cx - gx), abs(cz - gz)
+        return (dx + dz) + (math.sqrt(2) - 2) * min(dx, dz)
+
+    open_heap = [(heuristic(*start), 0.0, start)]
+    g_score = {start: 0.0}
+    came_from = {}
+    closed = set()
+    closest = (heuristic(*start), 0.0, start) # (distance to goal, cost, cell) of the best cell so far
+
+    def walk_back(cell):
+        path = [cell]
+        while cell in came_from:
+            cell = came_from[cell]
+            path.append(cell)
+        path.reverse()
+        return path
+
+    while open_heap:
+        _, g, cell = heapq.heappop(open_heap)
+        if cell in closed:
+            continue
+        if cell == goal:
+            return walk_back(cell)
+        closed.add(cell)
+        h = heuristic(*cell)
+        if (h, g) < closest[:2]:
+            closest = (h, g, cell)
+
+        cx, cz = cell
+        for dx, dz, step in NEIGHBOURS:
+            nx, nz = cx + dx, cz + dz
+            if not grid.in_bounds(nx, nz):
+                continue
+            c = grid.cost(nx, nz)
+            if c == BLOCKED:
+                continue
+            # No corner cutting through blocked cells on diagonal moves
+            if dx and dz and (grid.is_blocked(cx + dx, cz) or grid.is_blocked(cx, cz + dz)):
+                continue
+            ng = g + step * c
+            nxt = (nx, nz)
+            if ng < g_score.get(nxt, math.inf):
+                g_score[nxt] = ng
+                came_from[nxt] = cell
+                heapq.heappush(open_heap, (ng + heuristic(nx, nz), ng, nxt))
+    return walk_back(closest[2]) if partial else None
+
+
+def smooth_path(grid, cells):
+    """Drop intermediate cells that are directly visible from the previous kept cell"""
+    if len(cells) <= 2:
+        return cells
+    kept = [cells[0]]
+    i = 0
+    while i < len(cells) - 1:
+        j = len(cells) - 1
+        while j > i + 1 and not grid.line_of_sight(cells[i], cells[j]):
+            j -= 1
+        kept.append(cells[j])
+        i = j
+    return kept
+
+
+class PathPlanner:
+    def __init__(self, grid, cache_size=256):
+        self.grid = grid
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def plan_cells(self, start_cell, goal_cell):
+        """(cell-centre path, reached): reached is False for a partial path towards an unreachable goal"""
+        key = (start_cell, goal_cell)
+        entry = self._cache.get(key)
+        if entry is not None:
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return entry
+
+        self.misses += 1
+        cells = astar(self.grid, start_cell, goal_cell, partial=True)
+        path = tuple(self.grid.cell_to_world(cx, cz) for cx, cz in smooth_path(self.grid, cells))
+        entry = self._cache[key] = (path, cells[-1] == goal_cell)
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return entry
+
+    def plan(self, start_pos, goal_pos):
+        """
+        Waypoints from start_pos to goal_pos (x, y, z sequences) as a list of
+        (x, z) tuples, and whether they reach it. The first cell centre is
+        skipped (we are already there) and the last one is replaced by the
+        exact goal position; a partial path ends at the closest reachable cell.
+        """
+        start_cell = self.grid.world_to_cell(start_pos[0], start_pos[2])
+        goal_cell = self.grid.world_to_cell(goal_pos[0], goal_pos[2])
+        path, reached = self.plan_cells(start_cell, goal_cell)
+        if not reached:
+            return list(path[1:]) or [path[0]], False
+        waypoints = list(path[1:-1]) if len(path) > 2 else []
+        waypoints.append((goal_pos[0], goal_pos[2]))
+        return waypoints, True
@@ -0,0 +1,27 @@
+"""
+engine/runner.py
+
+Batch driver: run a World at full speed (no real-time pacing).
+
+The live server paces the same World.step() from its background task, so
+batch output and live HISTORY share one kernel and one frame schema.
+"""
+from .sharding import make_world
+
+
+def iter_frames(world, max_ticks=None):
+    """Yield one state frame per tick until the mission completes or max_ticks"""
+    limit = max_ticks if max_ticks is not None else world.config['max_ticks']
+    while not world.complete and world.tick < limit:
+        world.step()
+        yield world.build_state()
+
+
+def run_batch(config=None, seed=None, max_ticks=None, shards=0):
+    """Run a fresh World (sharded across processes if shards > 1) to completion and return the full timeline"""
+    world = make_world(config, seed, shards)
+    try:
+        return list(iter_frames(world, max_ticks))
+    finally:
+        if hasattr(world, 'close'):
+            world.close()
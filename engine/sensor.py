@@ -0,0 +1,205 @@
+"""
+engine/sensor.py
+
+UAV perception, evaluated in batch once per tick.
+
+UAVs that sense during a tick only queue themselves (World.queue_scan); the
+world then gathers every (UAV, candidate target) pair from the target grid
+index and evaluates them together as NumPy arrays. Two models:
+
+- 'disc':   the original 2D distance check (sensor_radius to detect,
+            collab_radius to join a detection).
+- 'camera': a downward-looking camera. A target must also be inside the
+            field-of-view cone (sensor_fov, full angle around nadir) and in
+            line of sight: the UAV -> target ray is marched over a height
+            raster of the terrain obstacles, all pairs at once. Hovering UAVs
+            keep watching (collaborative sensing only) from their hover
+            station, so their result is computed once per report and reused
+            until they leave (unless targets move).
+
+The height raster comes from the terrain file: the same grid as the route
+planner, with each obstacle raised to its "height" (no vehicle clearance).
+"""
+import json
+import math
+from functools import lru_cache
+
+import numpy as np
+
+from .config import resolve_path
+from .entities import TargetState, UAVState
+
+DEFAULT_OBSTACLE_HEIGHT = 6.0
+TARGET_HEIGHT = 0.5 # Line of sight is traced to this height above the target
+SENSOR_MODELS = ('disc', 'camera')
+DETECTED = TargetState.DETECTED
+REPORTING = UAVState.REPORTING
+
+
+class Heightmap:
+    """Obstacle heights on a regular X/Z raster (0 outside the map)"""
+
+    def __init__(self, origin_x, origin_z, cell_size, heights):
+        self.origin_x = origin_x
+        self.origin_z = origin_z
+        self.cell_size = cell_size
+        self.heights = heights # float64 [height, width], row = z cell
+
+    def height_at(self, x, z):
+        """Raster height under arrays of X/Z points"""
+        h, w = self.heights.shape
+        cx = np.floor((x - self.origin_x) / self.cell_size).astype(np.int64)
+        cz = np.floor((z - self.origin_z) / self.cell_size).astype(np.int64)
+        inside = (cx >= 0) & (cx < w) & (cz >= 0) & (cz < h)
+        out = np.zeros(cx.shape)
+        out[inside] = self.heights[cz[inside], cx[inside]]
+        return out
+
+    def peak_near(self, x, z, r):
+        """Highest raster cell within the square of half-size r around (x, z)"""
+        h, w = self.heights.shape
+        cx0 = max(int((x - r - self.origin_x) // self.cell_size), 0)
+        cz0 = max(int((z - r - self.origin_z) // self.cell_size), 0)
+        cx1 = min(int((x + r - self.origin_x) // self.cell_size) + 1, w)
+        cz1 = min(int((z + r - self.origin_z) // self.cell_size) + 1, h)
+        if cx0 >= cx1 or cz0 >= cz1:
+            return 0.0
+        return float(self.heights[cz0:cz1, cx0:cx1].max())
+
+    def clear(self, src, dst):
+        """
+        Line of sight for P segments (src, dst: [P, 3]). Each ray is sampled
+        every half cell; it is blocked where the raster rises above it.
+        """
+        if not len(src):
+            return np.ones(0, dtype=bool)
+        delta = dst - src
+        span = np.sqrt(delta[:, 0] ** 2 + delta[:, 2] ** 2).max()
+        steps = max(2, int(math.ceil(span / (0.5 * self.cell_size))))
+        t = np.linspace(0.0, 1.0, steps + 1)[1:-1] # Interior samples, [K]
+        pts = src[:, None, :] + delta[:, None, :] * t[None, :, None] # [P, K, 3]
+        ground = self.height_at(pts[..., 0], pts[..., 2])
+        return ~(ground > pts[..., 1]).any(axis=1)
+
+
+def load_heightmap(path):
+    """Build a Heightmap from a terrain JSON file (see pathfinding.load_grid)"""
+    with open(path, 'r', encoding='utf-8') as f:
+        spec = json.load(f)
+    origin = spec.get('origin', {'x': -100, 'z': -100})
+    cell = spec.get('cell_size', 2.0)
+    w, h = spec.get('width', 100), spec.get('height', 100)
+    heights = np.zeros((h, w))
+    for obs in spec.get('obstacles', []):
+        cx0 = int((min(obs['x0'], obs['x1']) - origin['x']) // cell)
+        cx1 = int((max(obs['x0'], obs['x1']) - origin['x']) // cell)
+        cz0 = int((min(obs['z0'], obs['z1']) - origin['z']) // cell)
+        cz1 = int((max(obs['z0'], obs['z1']) - origin['z']) // cell)
+        block = heights[max(cz0, 0):max(cz1 + 1, 0), max(cx0, 0):max(cx1 + 1, 0)]
+        np.maximum(block, obs.get('height', DEFAULT_OBSTACLE_HEIGHT), out=block)
+    return Heightmap(origin['x'], origin['z'], cell, heights)
+
+
+def near_array(index, x, z, r):
+    """GridIndex.near as a NumPy array (buckets are viewed, not copied one by one)"""
+    cell = index.cell
+    cells = index.cells
+    parts = []
+    for cx in range(int((x - r) // cell), int((x + r) // cell) + 1):
+        for cz in range(int((z - r) // cell), int((z + r) // cell) + 1):
+            bucket = cells.get((cx, cz))
+            if bucket is not None:
+                parts.append(np.frombuffer(bucket, dtype=np.int64))
+    if not parts:
+        return np.zeros(0, dtype=np.int64)
+    return np.sort(np.concatenate(parts))
+
+
+@lru_cache(maxsize=8)
+def shared_heightmap(terrain_file):
+    """One read-only raster per terrain file"""
+    return load_heightmap(resolve_path(terrain_file))
+
+
+class SensorModel:
+    """Batch visibility tests for one run's config"""
+
+    def __init__(self, config):
+        self.kind = config['sensor_model']
+        if self.kind not in SENSOR_MODELS:
+            raise ValueError(f"Unknown sensor_model: {self.kind}")
+        self.detect_sq = config['sensor_radius'] ** 2
+        self.collab_sq = config['collab_radius'] ** 2
+        self.radius = max(config['sensor_radius'], config['collab_radius'])
+        self.camera = self.kind == 'camera'
+        # Hovering UAVs keep watching when that can matter: occlusion, or belief fusion
+        self.hover_watch = self.camera or config['confirm_mode'] == 'belief'
+        if self.camera:
+            self.heightmap = shared_heightmap(config['terrain_file'])
+            self.cone_tan = math.tan(math.radians(config['sensor_fov']) / 2)
+        self.cache_hover = self.camera and not config['target_motion']
+        self.hover_cache = {} # UAV index -> (hover station, candidates, can_detect, can_collab)
+
+    def scan(self, uavs, index, target_pos, target_state):
+        """
+        For each UAV, (candidates, can_detect, can_collab): the ascending
+        indices of the UNSEEN / DETECTED targets near it and boolean masks over
+        them. Which of those targets it actually detects or joins depends on
+        their states, which the caller resolves in UAV order. (States only move
+        forward, so a target dropped here never needs to come back and cached
+        results stay valid.)
+        """
+        results = [None] * len(uavs)
+        todo = []
+        origins = []
+        for k, uav in enumerate(uavs):
+            if self.camera and uav.state == REPORTING:
+                station = uav.target_pos
+                cached = self.hover_cache.get(uav.index) if self.cache_hover else None
+                if cached is not None and cached[0] == station:
+                    results[k] = cached[1:]
+                    continue
+                origins.append(station)
+            else:
+                origins.append(tuple(uav.position))
+            todo.append(k)
+        if not todo:
+            return results
+
+        cands = []
+        for x, _, z in origins:
+            c = near_array(index, x, z, self.radius)
+            cands.append(c[target_state[c] <= DETECTED])
+        counts = [len(c) for c in cands]
+        pair_t = np.concatenate(cands)
+        origin = np.array(origins)
+        pos = np.frombuffer(target_pos, dtype=np.float64).reshape(-1, 3)
+
+        dx = np.repeat(origin[:, 0], counts) - pos[pair_t, 0]
+        dz = np.repeat(origin[:, 2], counts) - pos[pair_t, 2]
+        d_sq = dx * dx + dz * dz
+        can_detect = d_sq < self.detect_sq
+        can_collab = d_sq < self.collab_sq
+        if self.camera:
+            # Inside the nadir cone, then not hidden behind the terrain. Rays are
+            # only marched for UAVs with an obstacle taller than the targets nearby.
+            owner = np.repeat(np.arange(len(origins)), counts)
+            reach = np.maximum(origin[owner, 1] - pos[pair_t, 1], 0.0) * self.cone_tan
+            seen = (d_sq <= reach * reach) & (can_detect | can_collab)
+            heightmap = self.heightmap
+            near_obstacle = np.array([heightmap.peak_near(x, z, self.radius) > TARGET_HEIGHT
+                                      for x, _, z in origins])
+            pending = np.flatnonzero(seen & near_obstacle[owner])
+            if len(pending):
+                eye = pos[pair_t[pending]]
+                eye[:, 1] += TARGET_HEIGHT
+                seen[pending] = heightmap.clear(origin[owner[pending]], eye)
+            can_detect &= seen
+            can_collab &= seen
+
+        bounds = np.cumsum(counts)[:-1]
+        for k, c, det, col in zip(todo, cands, np.split(can_detect, bounds), np.split(can_collab, bounds)):
+            results[k] = (c, det, col)
+            if self.cache_hover and uavs[k].state == REPORTING:
+                self.hover_cache[uavs[k].index] = (uavs[k].target_pos, c, det, col)
+        return results
@@ -0,0 +1,477 @@
+"""
+engine/sharding.py
+
+Spatially sharded execution of a World across worker processes.
+
+The map (the terrain grid's X extent) is cut into vertical strips, one per
+worker process. Each tick:
+
+  1. The coordinator (ShardedWorld, running in the server / batch process)
+     writes every UAV's full state into a shared-memory row table, tags each
+     row with the shard that owns its current position (a handoff is just a
+     change of that owner column), and publishes UGV positions, target
+     states and the positions of the targets that moved.
+  2. Each worker steps the UAVs it owns with the normal UAV.update kernel.
+     Separation reads "boundary agents" (rows owned by other shards within
+     the separation halo of the strip) from the start-of-tick table, and
+     perception runs against a local grid index of the strip's targets plus
+     a halo of one sensor radius. Workers never mutate targets; they write
+     detection / collaboration proposals into their shared proposal buffer,
+     and their stepped UAVs into a second row table (so no worker ever reads
+     a row another worker is writing).
+  3. The coordinator reads the stepped rows back, resolves proposals in UAV order
+     (first claim on an UNSEEN target wins, later claims fall back to
+     collaboration), then runs UGVs and the decision layer globally, so
+     confirmation and UGV dispatch remain a single global decision.
+
+Only pipe messages of a few bytes are exchanged per tick; all bulk data moves
+through shared memory. Results are deterministic for a given shard count but
+not bit-identical to the serial World (boundary agents are seen at their
+start-of-tick positions and patrol jitter is drawn per UAV). The proposal
+buffers are sized for COLLAB_SLOTS_PER_UAV collaborations per UAV; a tick
+with more sends the excess with the worker's 'done' message instead, so no
+proposal is ever lost. One limit does change behaviour: mirrored vehicles
+(telemetry) live on the coordinator only, so shard workers do not see them
+and UAVs stepped in a worker do not keep their separation from them.
+"""
+import atexit
+import multiprocessing as mp
+import os
+import random
+import traceback
+from array import array
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from .agents import UAV
+from .config import SEARCH_AREA, make_config
+from .coverage import coverage_routes
+from .entities import GridIndex, TargetState, UAVState
+from .sensor import SensorModel
+from .world import World
+
+# UAV row layout in the shared agent table (float64 columns)
+F_X, F_Y, F_Z, F_VX, F_VY, F_VZ = range(6)
+F_STATE = 6
+F_OWNER = 7
+F_ROUTE_INDEX = 8
+F_ROUTE_STEP = 9
+F_HOVER_START = 10
+F_HAS_TARGET = 11
+F_TX, F_TY, F_TZ = 12, 13, 14
+F_HAS_PATROL = 15
+F_PX, F_PY, F_PZ = 16, 17, 18
+UAV_FIELDS = 19
+
+# Proposal kinds (int64 triples: uav index, target index, kind)
+P_COLLAB = 0
+P_DETECT = 1
+COLLAB_SLOTS_PER_UAV = 8 # Shared-memory room per UAV; busier ticks overflow over the pipe
+
+SEPARATION_HALO = 2.0 # Must cover UAV.move_to's separation radius
+
+UAV_STATES = tuple(UAVState)
+UNSEEN = TargetState.UNSEEN
+DETECTED = TargetState.DETECTED
+PATROL = UAVState.PATROL
+REPORTING = UAVState.REPORTING
+
+
+def pack_uav(rows, uav, owner):
+    b = uav.index * UAV_FIELDS
+    p, v = uav.position, uav.velocity
+    rows[b + F_X], rows[b + F_Y], rows[b + F_Z] = p[0], p[1], p[2]
+    rows[b + F_VX], rows[b + F_VY], rows[b + F_VZ] = v[0], v[1], v[2]
+    rows[b + F_STATE] = uav.state
+    rows[b + F_OWNER] = owner
+    rows[b + F_ROUTE_INDEX] = uav.route_index
+    rows[b + F_ROUTE_STEP] = uav.route_step
+    rows[b + F_HOVER_START] = -1 if uav.hover_start_tick is None else uav.hover_start_tick
+    if uav.target_pos is None:
+        rows[b + F_HAS_TARGET] = 0
+    else:
+        rows[b + F_HAS_TARGET] = 1
+        rows[b + F_TX], rows[b + F_TY], rows[b + F_TZ] = uav.target_pos
+    if uav.patrol_target is None:
+        rows[b + F_HAS_PATROL] = 0
+    else:
+        rows[b + F_HAS_PATROL] = 1
+        rows[b + F_PX], rows[b + F_PY], rows[b + F_PZ] = uav.patrol_target
+
+
+def unpack_uav(rows, uav):
+    b = uav.index * UAV_FIELDS
+    p, v = uav.position, uav.velocity
+    p[0], p[1], p[2] = rows[b + F_X], rows[b + F_Y], rows[b + F_Z]
+    v[0], v[1], v[2] = rows[b + F_VX], rows[b + F_VY], rows[b + F_VZ]
+    uav.state = UAV_STATES[int(rows[b + F_STATE])]
+    uav.route_index = int(rows[b + F_ROUTE_INDEX])
+    uav.route_step = int(rows[b + F_ROUTE_STEP])
+    hover = int(rows[b + F_HOVER_START])
+    uav.hover_start_tick = None if hover < 0 else hover
+    target = (rows[b + F_TX], rows[b + F_TY], rows[b + F_TZ])
+    patrol = (rows[b + F_PX], rows[b + F_PY], rows[b + F_PZ])
+    uav.patrol_target = patrol if rows[b + F_HAS_PATROL] else None
+    # Keep the identity link PATROL relies on (target_pos is patrol_target)
+    if not rows[b + F_HAS_TARGET]:
+        uav.target_pos = None
+    elif uav.patrol_target is not None and target == patrol:
+        uav.target_pos = uav.patrol_target
+    else:
+        uav.target_pos = target
+
+
+class _Ghost:
+    """Read-only neighbour owned by another shard (or a coordinator-run UGV)"""
+    __slots__ = ('position',)
+
+    def __init__(self, x, y, z):
+        self.position = (x, y, z)
+
+
+class _JitterRng:
+    """Per-UAV, per-tick RNG so patrol jitter does not depend on which shard runs the UAV"""
+    __slots__ = ('key', '_rng')
+
+    def __init__(self, key):
+        self.key = key
+        self._rng = None
+
+    def uniform(self, a, b):
+        if self._rng is None:
+            self._rng = random.Random(self.key)
+        return self._rng.uniform(a, b)
+
+
+class _Strips:
+    def __init__(self, x_min, x_max, n):
+        self.x_min = x_min
+        self.width = (x_max - x_min) / n
+        self.n = n
+
+    def owner(self, x):
+        k = int((x - self.x_min) // self.width)
+        return min(max(k, 0), self.n - 1)
+
+    def bounds(self, k):
+        lo = self.x_min + k * self.width
+        return lo, lo + self.width
+
+
+class ShardWorker:
+    """World stand-in seen by UAV.update inside a worker process"""
+
+    def __init__(self, shard, strips, config, seed, n_uav, n_ugv, n_targets, prop_stride, blocks):
+        self.shard = shard
+        self.config = config
+        self.seed = seed
+        self.tick = 0
+        self.rng = None
+        self.agents = {}
+        self.blocks = [shared_memory.SharedMemory(name=name) for name in blocks]
+        uav_shm, out_shm, ugv_shm, tpos_shm, tstate_shm, prop_shm, moved_shm = self.blocks
+        self.rows = uav_shm.buf.cast('d')
+        self.rows_out = out_shm.buf.cast('d')
+        self.ugv_pos = ugv_shm.buf.cast('d')
+        self.target_state = tstate_shm.buf
+        self.proposals = prop_shm.buf.cast('q')
+        self.moved = moved_shm.buf.cast('q')
+        self.prop_stride = prop_stride
+        self.n_ugv = n_ugv
+        self.n_targets = n_targets
+        self.x_lo, self.x_hi = strips.bounds(shard)
+        self.strips = strips
+
+        routes = coverage_routes(SEARCH_AREA, n_uav, config['sensor_radius'], config['coverage_pattern'])
+        self.uavs = [UAV(self, f"UAV{i+1}", i, (0.0, 0.0, 0.0), routes[i]) for i in range(n_uav)]
+
+        # Local copy of the target positions; moved targets are re-read each tick
+        self.shared_pos = tpos_shm.buf.cast('d')
+        self.target_pos = array('d', self.shared_pos)
+        self.sensor = SensorModel(config)
+        lo, hi = self.x_lo - self.sensor.radius, self.x_hi + self.sensor.radius
+        self.grid = GridIndex(self.target_pos, self.sensor.radius, keep=lambda x: lo <= x < hi)
+        self.scan_queue = []
+        self._props = None
+
+    # --- World interface used by UAV.update ---
+    def target_position(self, i):
+        return (self.target_pos[3 * i], self.target_pos[3 * i + 1], self.target_pos[3 * i + 2])
+
+    def queue_scan(self, uav):
+        self.scan_queue.append(uav)
+
+    def scan(self):
+        """World.scan, but detections and joins become proposals for the coordinator"""
+        uavs = self.scan_queue
+        if not uavs:
+            return
+        self.scan_queue = []
+        # Local copy: targets claimed by an earlier UAV of this shard count as DETECTED
+        t_state = np.frombuffer(self.target_state, dtype=np.uint8, count=self.n_targets).copy()
+        for uav, (cand, can_detect, can_collab) in zip(uavs, self.sensor.scan(uavs, self.grid, self.target_pos, t_state)):
+            s = t_state[cand]
+            hits = np.flatnonzero(can_detect & (s == UNSEEN)) if uav.state == PATROL else ()
+            end = hits[0] if len(hits) else len(cand)
+            joins = cand[:end][(can_collab & (s == DETECTED))[:end]]
+            for i in joins.tolist():
+                self._props.extend((uav.index, i, P_COLLAB))
+            if len(hits):
+                i = int(cand[end])
+                t_state[i] = DETECTED
+                self._props.extend((uav.index, i, P_DETECT))
+                uav.start_report(i)
+
+    def move_targets(self):
+        """Pick up the targets the coordinator moved this tick (strip membership may change too)"""
+        pos = self.target_pos
+        shared = self.shared_pos
+        for k in range(self.moved[0]):
+            i = self.moved[1 + k]
+            b = 3 * i
+            x0, z0 = pos[b], pos[b + 2]
+            pos[b], pos[b + 1], pos[b + 2] = shared[b], shared[b + 1], shared[b + 2]
+            self.grid.move(i, x0, z0, pos[b], pos[b + 2])
+
+    # --- Tick ---
+    def step(self, tick):
+        self.tick = tick
+        self.move_targets()
+        rows = self.rows
+        shard = self.shard
+        lo, hi = self.x_lo - SEPARATION_HALO, self.x_hi + SEPARATION_HALO
+
+        owned = []
+        agents = {}
+        for uav in self.uavs:
+            b = uav.index * UAV_FIELDS
+            if rows[b + F_OWNER] == shard:
+                unpack_uav(rows, uav)
+                owned.append(uav)
+                agents[uav.id] = uav
+            elif lo <= rows[b + F_X] <= hi:
+                agents[uav.id] = _Ghost(rows[b + F_X], rows[b + F_Y], rows[b + F_Z])
+        for j in range(self.n_ugv):
+            x = self.ugv_pos[3 * j]
+            if lo <= x <= hi:
+                agents[('UGV', j)] = _Ghost(x, self.ugv_pos[3 * j + 1], self.ugv_pos[3 * j + 2])
+        self.agents = agents
+
+        self._props = array('q')
+        for uav in owned:
+            self.rng = _JitterRng(f"{self.seed}:{uav.index}:{tick}")
+            uav.update()
+        self.scan()
+        for uav in owned:
+            pack_uav(self.rows_out, uav, shard)
+
+        # Proposals that do not fit the shared buffer travel back with 'done'
+        out = self.proposals
+        base = shard * self.prop_stride
+        n = min(len(self._props), self.prop_stride - 1)
+        out[base] = n // 3
+        out[base + 1:base + 1 + n] = self._props[:n]
+        return self._props[n:]
+
+    def close(self):
+        self.rows.release()
+        self.rows_out.release()
+        self.ugv_pos.release()
+        self.proposals.release()
+        self.moved.release()
+        self.shared_pos.release()
+        self.target_state = None
+        for shm in self.blocks:
+            shm.close()
+
+
+def _worker_main(args, conn):
+    # A coordinator under eventlet (serve.py) creates the pipe from a green socketpair,
+    # which leaves this end non-blocking
+    os.set_blocking(conn.fileno(), True)
+    worker = None
+    try:
+        worker = ShardWorker(*args)
+        conn.send(('ready',))
+        while True:
+            msg = conn.recv()
+            if msg[0] == 'step':
+                conn.send(('done', worker.step(msg[1])))
+            elif msg[0] == 'stop':
+                break
+    except Exception:
+        conn.send(('error', traceback.format_exc()))
+    finally:
+        if worker is not None:
+            worker.close()
+        conn.close()
+
+
+class ShardedWorld(World):
+    """World whose UAV stepping and perception run in `shards` worker processes"""
+
+    def __init__(self, config=None, seed=None, shards=2):
+        super().__init__(config, seed)
+        grid = self.planner.grid
+        self.strips = _Strips(grid.origin_x, grid.origin_x + grid.width * grid.cell_size, shards)
+        n_uav, n_ugv, n_targets = len(self.uavs), len(self.ugvs), len(self.targets)
+        self.prop_stride = 1 + 3 * n_uav * (1 + COLLAB_SLOTS_PER_UAV)
+
+        # Registered before anything is allocated, so a failure below releases what exists
+        self.blocks = []
+        self.workers = []
+        self.conns = []
+        self.closed = False
+        atexit.register(self.close) # Never leave workers or shared memory behind
+        sizes = [
+            max(1, n_uav * UAV_FIELDS * 8),      # UAV rows (start of tick)
+            max(1, n_uav * UAV_FIELDS * 8),      # UAV rows (stepped by the workers)
+            max(1, n_ugv * 3 * 8),               # UGV positions
+            max(1, n_targets * 3 * 8),           # Target positions
+            max(1, n_targets),                   # Target states
+            shards * self.prop_stride * 8,       # Proposal buffers
+            (1 + n_targets) * 8,                 # Targets moved this tick (count, indices)
+        ]
+        try:
+            for size in sizes:
+                self.blocks.append(shared_memory.SharedMemory(create=True, size=size))
+            self.rows = self.blocks[0].buf.cast('d')
+            self.rows_out = self.blocks[1].buf.cast('d')
+            self.ugv_pos = self.blocks[2].buf.cast('d')
+            self.target_state_shm = self.blocks[4].buf
+            self.proposals = self.blocks[5].buf.cast('q')
+            self.target_pos_shm = self.blocks[3].buf.cast('d')
+            self.target_pos_shm[:len(self.targets.pos)] = self.targets.pos
+            self.moved_shm = self.blocks[6].buf.cast('q')
+            self.moved_shm[0] = 0
+
+            ctx = mp.get_context('spawn')
+            names = [shm.name for shm in self.blocks]
+            for k in range(shards):
+                parent, child = ctx.Pipe()
+                args = (k, self.strips, self.config, self.seed, n_uav, n_ugv, n_targets, self.prop_stride, names)
+                proc = ctx.Process(target=_worker_main, args=(args, child), daemon=True)
+                proc.start()
+                child.close()
+                self.workers.append(proc)
+                self.conns.append(parent)
+            for conn in self.conns:
+                self._expect(conn, 'ready')
+        except BaseException:
+            self.close()
+            raise
+
+    def _expect(self, conn, kind):
+        try:
+            msg = conn.recv()
+        except EOFError:
+            msg = ('error', 'worker process exited')
+        if msg[0] == 'error':
+            self.close()
+            raise RuntimeError(f"Shard worker failed:\n{msg[1]}")
+        if msg[0] != kind:
+            raise RuntimeError(f"Unexpected shard message: {msg!r}")
+        return msg
+
+    def update_agents(self):
+        rows = self.rows
+        strips = self.strips
+        targets = self.targets
+
+        # 1. Publish the tick's inputs
+        for uav in self.uavs:
+            pack_uav(rows, uav, strips.owner(uav.position[0]))
+        for ugv in self.ugvs:
+            b = ugv.index * 3
+            p = ugv.position
+            self.ugv_pos[b], self.ugv_pos[b + 1], self.ugv_pos[b + 2] = p[0], p[1], p[2]
+        self.target_state_shm[:len(targets)] = targets.state
+        moved = self.moved_targets
+        self.moved_shm[0] = len(moved)
+        if len(moved):
+            np.frombuffer(self.moved_shm, dtype=np.int64)[1:1 + len(moved)] = moved
+            np.frombuffer(self.target_pos_shm, dtype=np.float64).reshape(-1, 3)[moved] = \
+                np.frombuffer(targets.pos, dtype=np.float64).reshape(-1, 3)[moved]
+
+        # 2. Step all shards in parallel
+        for conn in self.conns:
+            conn.send(('step', self.tick))
+        overflow = [self._expect(conn, 'done')[1] for conn in self.conns]
+
+        # 3. Merge
+        for uav in self.uavs:
+            unpack_uav(self.rows_out, uav)
+
+        detects = []
+        collab_sq = self.config['collab_radius'] ** 2
+        for k in range(strips.n):
+            base = k * self.prop_stride
+            props = self.proposals[base + 1:base + 1 + 3 * self.proposals[base]].tolist() + overflow[k].tolist()
+            for o in range(0, len(props), 3):
+                u, i, kind = props[o], props[o + 1], props[o + 2]
+                if kind == P_DETECT:
+                    detects.append((u, i))
+                elif targets.state[i] == DETECTED:
+                    targets.detected_by[i] |= self.uavs[u].bit
+
+        for u, i in sorted(detects):
+            uav = self.uavs[u]
+            if targets.state[i] == UNSEEN:
+                self.mark_detected(i, uav)
+            else:
+                # Lost the race to a UAV in another shard: keep patrolling, join as collaborator
+                uav.state = UAVState.PATROL
+                uav.target_pos = uav.patrol_target
+                uav.hover_start_tick = None
+                x, _, z = targets.position(i)
+                if targets.state[i] == DETECTED and uav.distance_to_2d((x, 0.0, z)) ** 2 < collab_sq:
+                    targets.detected_by[i] |= uav.bit
+
+        # Belief fusion is global too: repeat the visibility pass here for the UAVs that sensed
+        if self.belief is not None:
+            observers = [u for u in self.uavs if u.state in (PATROL, REPORTING)]
+            if observers:
+                t_state = np.frombuffer(targets.state, dtype=np.uint8)
+                self.observe(observers, self.sensor.scan(observers, self.target_index, targets.pos, t_state))
+
+        # 4. Ground vehicles stay on the coordinator (dispatch is global), as do mirrored vehicles
+        for ugv in self.ugvs:
+            ugv.update()
+        for agent in self.mirrors.values():
+            agent.update()
+
+    def close(self):
+        if getattr(self, 'closed', True):
+            return
+        self.closed = True
+        atexit.unregister(self.close)
+        for conn in self.conns:
+            try:
+                conn.send(('stop',))
+            except (OSError, EOFError):
+                pass
+        for proc in self.workers:
+            proc.join(timeout=5)
+            if proc.is_alive():
+                proc.terminate()
+        for name in ('rows', 'rows_out', 'ugv_pos', 'proposals', 'target_state_shm', 'target_pos_shm', 'moved_shm'):
+            view = getattr(self, name, None)
+            if view is not None:
+                view.release()
+        for shm in self.blocks:
+            shm.close()
+            shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def make_world(config=None, seed=None, shards=0):
+    """Serial World for shards <= 1, otherwise a ShardedWorld with that many workers"""
+    if shards and shards > 1:
+        return ShardedWorld(make_config(config), seed, shards)
+    return World(config, seed)
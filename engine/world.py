@@ -0,0 +1,483 @@
+"""
+engine/world.py
+
+The simulation kernel: one World per run.
+
+World.step() advances exactly one tick (target motion, agent updates and the
+batched UAV scan, then the decision layer: target confirmation, UGV dispatch
+and mission completion). It never sleeps and never touches sockets, so the
+live server can pace it at real time while offline tools run it flat out.
+"""
+import base64
+import heapq
+import math
+import random
+from array import array
+from functools import lru_cache
+
+import numpy as np
+
+from . import events
+from .agents import BASE, UAV, UGV, Mirror
+from .belief import HEATMAP_EVERY, BeliefMap
+from .event_store import EventStore
+from .entities import (TARGET_STATE_NAMES, UAV_STATE_NAMES, UGV_STATE_NAMES, GridIndex, TargetState,
+                       TargetTable, UAVState, UGVState, bit_ids)
+from .config import LOCATIONS, SEARCH_AREA, make_config, resolve_path
+from .coverage import coverage_routes
+from .pathfinding import PathPlanner, load_grid
+from .motion import TargetMotion
+from .scenario import load_scenario
+from .sensor import SensorModel
+
+UNSEEN = TargetState.UNSEEN
+DETECTED = TargetState.DETECTED
+PATROL = UAVState.PATROL
+CONFIRM_MODES = ('rule', 'belief')
+MAX_MIRRORS = 10000 # Telemetry vehicles per run (new ids beyond this are ignored)
+
+
+@lru_cache(maxsize=8)
+def shared_planner(terrain_file):
+    """One planner (and route cache) per terrain file, shared across resets"""
+    return PathPlanner(load_grid(resolve_path(terrain_file)))
+
+
+def uav_spawn_offset(i):
+    # 0, +2, -2, +4, -4, ... along the base diagonal
+    step = 2 * ((i + 1) // 2)
+    return step if i % 2 else -step
+
+
+def ugv_spawn_offset(i):
+    # +5, -5, +7.5, -7.5, ... along X
+    step = 5 + 2.5 * (i // 2)
+    return step if i % 2 == 0 else -step
+
+
+class World:
+    def __init__(self, config=None, seed=None):
+        self.config = make_config(config)
+        # Without an explicit seed pick one, so the run can still be reproduced later
+        self.seed = seed if seed is not None else random.randrange(2**32)
+        self.rng = random.Random(self.seed)
+        self.tick = 0
+        self.phase = 'READY' # READY, PATROL, RESCUE, COMPLETE
+        self.events = [] # Events of the current tick
+        self.event_store = EventStore() # Every event of the run, indexed for queries
+        self.event_listeners = []
+        self.planner = shared_planner(self.config['terrain_file'])
+        self.agents = {}
+        self.uavs = []
+        self.ugvs = []
+        self.uav_ids = [] # uav_ids[i] <-> bit i of detected_by
+        self.prev_pos = None # Agent position bytes before this tick's update (frame velocities)
+        self.targets = TargetTable()
+        self.target_index = None # GridIndex over target positions, built once the targets are placed
+        self.sensor = SensorModel(self.config)
+        self.scan_queue = [] # UAVs sensing this tick, resolved together by scan()
+        self.motion = None # TargetMotion when targets walk (config 'target_motion')
+        self.belief = None # BeliefMap when confirmation is posterior-driven (config 'confirm_mode')
+        self.moved_targets = () # Indices of the targets that moved this tick
+        self.moved_step = None # Their X/Z displacement ([n, 2]; moving targets only)
+        self.mirrors = {} # Agent id -> Mirror, the real vehicles fed by telemetry
+        # Decision-layer work lists (so a tick never scans the whole target table)
+        self.detected = set() # Indices in DETECTED state
+        self.dispatch_queue = [] # Heap of (first_detected, index) for confirmed, unassigned targets
+        self.unreachable = set() # Confirmed targets a UGV gave up on (walled off terrain)
+        self.assignments = [] # (ugv, index) picks of an external controller, resolved by decide()
+        self._spawn()
+        if self.config['target_motion']:
+            self.motion = TargetMotion(self)
+        if self.config['confirm_mode'] not in CONFIRM_MODES:
+            raise ValueError(f"Unknown confirm_mode: {self.config['confirm_mode']}")
+        if self.config['confirm_mode'] == 'belief':
+            self.belief = BeliefMap(self.config, self.planner.grid, self.seed)
+
+    # --- Setup ---
+    def _spawn(self):
+        cfg = self.config
+        targets = self.targets
+        scenario = load_scenario(cfg['scenario_file']) if cfg['scenario_file'] else None
+        spawn = scenario['spawn'] if scenario else {}
+
+        # Targets
+        if scenario is not None:
+            targets.extend(scenario['target_ids'], scenario['target_pos'])
+        elif cfg['target_count'] is None:
+            for t_id in ('T1', 'T2', 'T3'):
+                loc = LOCATIONS[t_id]
+                targets.add(t_id, loc['x'], loc['y'], loc['z'])
+        else:
+            # Scattered around B
+            center = LOCATIONS['B']
+            n = cfg['target_count']
+            for i in range(n):
+                angle = (i / n) * 2 * math.pi
+                r = self.rng.uniform(10, 25)
+                targets.add(f"T{i+1}", center["x"] + math.cos(angle) * r, 0.0, center["z"] + math.sin(angle) * r)
+
+        # UAVs at Base A, each assigned one band of the (cached) coverage sweep
+        routes = coverage_routes(SEARCH_AREA, cfg['uav_count'], cfg['sensor_radius'], cfg['coverage_pattern'])
+        uav_spawns = spawn.get('uav')
+        for i in range(cfg['uav_count']):
+            if uav_spawns:
+                x, z = uav_spawns[i % len(uav_spawns)]
+            else:
+                off = uav_spawn_offset(i)
+                x, z = BASE[0] + off, BASE[2] + off
+            uav = UAV(self, f"UAV{i+1}", i, (x, 0.0, z), routes[i])
+            self.agents[uav.id] = uav
+            self.uavs.append(uav)
+            self.uav_ids.append(uav.id)
+
+        # UGVs at Base A
+        ugv_spawns = spawn.get('ugv')
+        for i in range(cfg['ugv_count']):
+            if ugv_spawns:
+                x, z = ugv_spawns[i % len(ugv_spawns)]
+            else:
+                x, z = BASE[0] + ugv_spawn_offset(i), BASE[2]
+            ugv = UGV(self, f"UGV{i+1}", i, (x, 0.0, z))
+            self.agents[ugv.id] = ugv
+            self.ugvs.append(ugv)
+
+        # Perception index over the targets: built once here, then updated
+        # incrementally by the motion step as targets move (motion.py)
+        self.target_index = GridIndex(targets.pos, max(cfg['sensor_radius'], cfg['collab_radius']))
+
+    # --- Events ---
+    def emit(self, event_type, msg, agent=None, target=None):
+        evt = events.make_event(event_type, msg, self.tick, agent, target)
+        self.events.append(evt)
+        self.event_store.append(evt)
+        for listener in self.event_listeners:
+            listener(evt)
+        return evt
+
+    # --- Telemetry ---
+    def mirror(self, reports):
+        """
+        Hand the latest report per external vehicle ({agent id: report with
+        type, x, y, z and optional state}, see telemetry.py) to its Mirror,
+        which applies it when the agents next update.
+        """
+        for a_id, report in reports.items():
+            agent = self.mirrors.get(a_id)
+            if agent is None:
+                if a_id in self.agents or len(self.mirrors) >= MAX_MIRRORS:
+                    continue # Never shadow a simulated agent
+                agent = Mirror(self, a_id, report['type'], (report['x'], report['y'], report['z']))
+                self.mirrors[a_id] = agent
+                self.agents[a_id] = agent
+            agent.report = report
+
+    # --- Perception ---
+    def target_position(self, i):
+        return self.targets.position(i)
+
+    def queue_scan(self, uav):
+        self.scan_queue.append(uav)
+
+    def scan(self):
+        """
+        Resolve this tick's queued scans (visibility is evaluated in one batch,
+        see sensor.py). In UAV order, each UAV joins the DETECTED targets it can
+        collaborate on and, if patrolling, marks the first UNSEEN target it can
+        detect as DETECTED and starts reporting it. Targets are taken in table
+        order, so later UAVs see earlier UAVs' detections.
+        """
+        uavs = self.scan_queue
+        if not uavs:
+            return
+        self.scan_queue = []
+        targets = self.targets
+        t_state = np.frombuffer(targets.state, dtype=np.uint8)
+        results = self.sensor.scan(uavs, self.target_index, targets.pos, t_state)
+        if self.belief is not None:
+            self.observe(uavs, results)
+        for uav, (cand, can_detect, can_collab) in zip(uavs, results):
+            s = t_state[cand]
+            hits = np.flatnonzero(can_detect & (s == UNSEEN)) if uav.state == PATROL else ()
+            end = hits[0] if len(hits) else len(cand)
+            # Already detected, just add self to detected_by (Collaborative Sensing)
+            for i in cand[:end][(can_collab & (s == DETECTED))[:end]].tolist():
+                targets.detected_by[i] |= uav.bit
+            if len(hits):
+                i = int(cand[end])
+                self.mark_detected(i, uav)
+                uav.start_report(i)
+
+    def observe(self, uavs, results):
+        """Fuse what the UAVs can see this tick (sensor.scan results) into the belief map"""
+        pos = np.frombuffer(self.targets.pos, dtype=np.float64).reshape(-1, 3)
+        origins = np.array([(uav.position[0], uav.position[2]) for uav in uavs])
+        seen = [cand[can_detect] for cand, can_detect, _ in results]
+        hits = pos[np.concatenate(seen)]
+        self.belief.observe(origins, hits[:, [0, 2]], np.repeat(np.arange(len(uavs)), [len(s) for s in seen]))
+
+    def mark_detected(self, i, uav):
+        # HUMAN_DETECTED: UNSEEN -> DETECTED, first reporter recorded
+        targets = self.targets
+        targets.set_state(i, DETECTED)
+        targets.first_detected[i] = self.tick
+        targets.detected_by[i] |= uav.bit
+        self.detected.add(i)
+        t_id = targets.ids[i]
+        self.emit(events.HUMAN_DETECTED, f'{uav.id} 发现目标 {t_id} (UNSEEN -> DETECTED)',
+                  agent=uav.id, target=t_id)
+
+    # --- Tick ---
+    @property
+    def complete(self):
+        return self.phase == 'COMPLETE'
+
+    def step(self):
+        """Advance one tick. Returns the events raised during it."""
+        self.tick += 1
+        self.events = [] # Clear events for this tick
+
+        # Mission Logic Transition
+        if self.phase == "READY" and self.tick > 0:
+            self.phase = "PATROL"
+            # Trigger UAV Takeoff
+            for uav in self.uavs:
+                if uav.state == UAVState.IDLE:
+                    uav.state = UAVState.TAKEOFF
+
+        self.prev_pos = self.agent_positions()
+        if self.motion is not None:
+            self.moved_targets = self.motion.step(self)
+            self.moved_step = self.motion.moved_step
+        self.update_agents()
+        self.decide()
+        return self.events
+
+    def update_agents(self):
+        # Update Agents
+        for agent in self.agents.values():
+            agent.update()
+        self.scan()
+
+    def decide(self):
+        # --- Decision Layer (System Logic) ---
+        cfg = self.config
+        targets = self.targets
+
+        # 1. Target Confirmation Logic (table order keeps event order deterministic)
+        detected = sorted(self.detected)
+        if self.belief is not None and detected:
+            t_pos = np.frombuffer(targets.pos, dtype=np.float64).reshape(-1, 3)[detected]
+            posterior_ok = (self.belief.posterior(t_pos[:, 0], t_pos[:, 2]) >= cfg['confirm_posterior']).tolist()
+        for k, i in enumerate(detected):
+            # Condition A: Time threshold
+            time_condition = (self.tick - targets.first_detected[i]) > cfg['confirm_timeout']
+            if self.belief is not None:
+                # Condition B: Fused belief at the target's cell
+                evidence_condition = posterior_ok[k]
+                evidence_reason = "置信度确认"
+            else:
+                # Condition B: Multi-UAV confirmation
+                evidence_condition = targets.detected_by[i].bit_count() >= cfg['confirm_count']
+                evidence_reason = "多机确认"
+
+            if time_condition or evidence_condition:
+                targets.set_state(i, TargetState.CONFIRMED)
+                self.detected.discard(i)
+                heapq.heappush(self.dispatch_queue, (targets.first_detected[i], i))
+                reason = "超时确认" if time_condition else evidence_reason
+                t_id = targets.ids[i]
+                self.emit(events.TARGET_CONFIRMED, f'系统确认目标 {t_id} ({reason})', target=t_id)
+
+                # Update Phase if needed
+                if self.phase == "PATROL":
+                    self.phase = "RESCUE"
+
+        # 2. UGV Dispatch Logic: external controller picks first (see env.py)
+        if self.assignments:
+            for ugv, i in self.assignments:
+                self.take_assignment(ugv, i)
+            self.assignments = []
+
+        # Built-in rule (Priority: Earliest Discovery First)
+        while cfg['auto_dispatch'] and self.dispatch_queue:
+            # Find free UGV
+            free_ugv = None
+            for ugv in self.ugvs:
+                if ugv.state == UGVState.STANDBY:
+                    free_ugv = ugv
+                    break
+            if free_ugv is None:
+                break
+
+            _, i = heapq.heappop(self.dispatch_queue)
+            self.dispatch(free_ugv, i, "最早发现优先")
+
+        # -------------------------------------
+
+        # Check Mission Progress (targets no UGV can reach do not hold the mission open)
+        all_rescued = targets.counts[TargetState.RESCUED] + len(self.unreachable) == len(targets)
+        # Tightened check: Must be closer to base (< 5)
+        all_ugvs_home = all((a.state == UGVState.STANDBY or (a.state == UGVState.RETURNING and a.distance_to(BASE) < 5)) for a in self.ugvs)
+
+        if all_rescued:
+            # If all humans are rescued, recall UAVs
+            for uav in self.uavs:
+                if uav.state not in (UAVState.RETURN, UAVState.IDLE, UAVState.LANDING):
+                    uav.state = UAVState.RETURN
+                    self.emit(events.UAV_RETURN, f"{uav.id} 任务结束，正在返航", agent=uav.id)
+
+        # Check if UAVs are home (Tightened distance < 5)
+        all_uavs_home = all(a.state == UAVState.IDLE for a in self.uavs)
+
+        # Stop UAVs if they are home
+        if all_rescued:
+            for uav in self.uavs:
+                if uav.state == UAVState.RETURN and uav.distance_to(BASE) < 2:
+                    uav.state = UAVState.IDLE
+
+        if all_rescued and all_ugvs_home and all_uavs_home and self.phase != "COMPLETE":
+            self.phase = "COMPLETE"
+            if self.unreachable:
+                self.emit(events.MISSION_COMPLETE,
+                          f"可达目标已全部救援（{len(self.unreachable)} 个无法到达），全员返航，任务完成！")
+            else:
+                self.emit(events.MISSION_COMPLETE, "所有目标已救援，全员返航，任务完成！")
+
+    # --- Dispatch ---
+    def dispatch(self, ugv, i, reason):
+        t_id = self.targets.ids[i]
+        ugv.state = UGVState.DISPATCH
+        ugv.target_index = i
+        self.emit(events.UGV_DISPATCHED, f'系统调度 {ugv.id} 前往救援 {t_id} ({reason})',
+                  agent=ugv.id, target=t_id)
+        ugv.set_destination(self.targets.position(i))
+
+    def assign(self, ugv, i):
+        """Controller pick: send `ugv` to target i during this tick's decision layer"""
+        self.assignments.append((ugv, i))
+
+    def take_assignment(self, ugv, i):
+        # Ignored unless the UGV is free and i is confirmed and still waiting for a UGV
+        if ugv.state != UGVState.STANDBY:
+            return
+        queue = self.dispatch_queue
+        for k, (_, j) in enumerate(queue):
+            if j == i:
+                break
+        else:
+            return
+        queue[k] = queue[-1]
+        queue.pop()
+        heapq.heapify(queue)
+        self.dispatch(ugv, i, "控制器指派")
+
+    # --- Output ---
+    def agent_positions(self):
+        return b''.join(a.position.tobytes() for a in self.agents.values())
+
+    def snapshot(self):
+        """
+        Cheap immutable copy of the world at this tick: flat position bytes and
+        state bytes for agents and targets, plus the tick's events. Turn it into
+        a wire frame with frame_from_snapshot() (possibly on another thread).
+        """
+        agents = list(self.agents.values())
+        return {
+            'tick': self.tick,
+            'seed': self.seed,
+            'mission_phase': self.phase,
+            'agent_ids': [a.id for a in agents],
+            'agent_types': [a.type for a in agents],
+            'agent_roles': [getattr(a, 'role', '') for a in agents],
+            'agent_pos': self.agent_positions(),
+            'agent_prev_pos': self.prev_pos,
+            'agent_state': bytes(a.state for a in agents),
+            'uav_ids': self.uav_ids,
+            'targets': self.targets.snapshot(),
+            # Fresh arrays every tick, never written afterwards: safe to share
+            'target_moved': None if self.moved_step is None else (self.moved_targets, self.moved_step),
+            'events': list(self.events),
+            # Coverage picture for the UI, every few ticks
+            'belief': self.belief.heatmap() if self.belief is not None and self.tick % HEATMAP_EVERY == 0 else None,
+        }
+
+    def build_state(self):
+        """JSON-ready frame for the current tick (same schema live and offline)"""
+        return frame_from_snapshot(self.snapshot())
+
+
+def frame_from_snapshot(snap):
+    """Expand a World.snapshot() into the JSON frame schema the UI and timelines use"""
+    pos = array('d')
+    pos.frombytes(snap['agent_pos'])
+    # Velocity = displacement over the last tick (world units per tick), for client dead reckoning
+    vel = array('d', bytes(len(snap['agent_pos'])))
+    prev_pos = snap.get('agent_prev_pos')
+    if prev_pos is not None and len(prev_pos) == len(snap['agent_pos']):
+        prev = array('d')
+        prev.frombytes(prev_pos)
+        for k in range(len(pos)):
+            vel[k] = pos[k] - prev[k]
+    agent_states = []
+    for k, a_id in enumerate(snap['agent_ids']):
+        a_type = snap['agent_types'][k]
+        names = UAV_STATE_NAMES if a_type == 'UAV' else UGV_STATE_NAMES
+        agent_states.append({
+            "id": a_id,
+            "type": a_type,
+            "state": names[snap['agent_state'][k]],
+            "x": pos[3 * k],
+            "y": pos[3 * k + 1],
+            "z": pos[3 * k + 2],
+            "vx": vel[3 * k],
+            "vy": vel[3 * k + 1],
+            "vz": vel[3 * k + 2],
+            "role": snap['agent_roles'][k]
+        })
+
+    targets = snap['targets']
+    t_pos = array('d')
+    t_pos.frombytes(targets['pos'])
+    t_state = targets['state']
+    # Moving targets also get a per-tick velocity (static ones keep the old frame schema);
+    # only the rows that moved this tick are non-zero
+    t_vx = t_vz = None
+    if snap.get('target_moved') is not None:
+        t_vx = [0.0] * len(t_state)
+        t_vz = [0.0] * len(t_state)
+        moved, step = snap['target_moved']
+        for i, (dx, dz) in zip(moved.tolist(), step.tolist()):
+            t_vx[i] = dx
+            t_vz[i] = dz
+    uav_ids = snap['uav_ids']
+    target_states = []
+    for i, t_id in enumerate(targets['ids'][:len(t_state)]):
+        target = {
+            "id": t_id,
+            "state": TARGET_STATE_NAMES[t_state[i]],
+            "x": t_pos[3 * i],
+            "y": t_pos[3 * i + 1],
+            "z": t_pos[3 * i + 2],
+            # Include for UI Collaborative Task view
+            "detected_by": bit_ids(targets['detected_by'][i], uav_ids)
+        }
+        if t_vx is not None:
+            target["vx"] = t_vx[i]
+            target["vy"] = 0.0
+            target["vz"] = t_vz[i]
+        target_states.append(target)
+
+    frame = {
+        "tick": snap['tick'],
+        "seed": snap['seed'],
+        "mission_phase": snap['mission_phase'],
+        "agents": agent_states,
+        "targets": target_states,
+        # Include events in the state snapshot for playback consistency
+        "events": snap['events']
+    }
+    belief = snap.get('belief')
+    if belief is not None:
+        frame["belief"] = dict(belief, data=base64.b64encode(belief['data']).decode('ascii'))
+    return frame
@@ -0,0 +1,527 @@
+#!/usr/bin/env python3
+"""
+engine_test.py
+
+Standalone checks for the deterministic parts of the engine package (no
+server needed):
+ - Route planner: paths never cross blocked terrain, unreachable goals give
+   partial paths, and a mission with walled-off targets still completes
+ - Planner cache: A* costs match Dijkstra, repeated queries are LRU hits
+   returning the shared plan, one planner per terrain file
+ - EventStore.query with several filters against a brute-force scan
+ - Coverage routes: every UAV gets waypoints, degenerate areas included
+ - timeline_lod.select: tick window and frame budget bounds
+ - Belief map: observations move only the footprint cells, the right way
+ - Scenarios: binary target tables round-trip, table and generator
+   scenarios load the same population, run cache keys follow file contents
+ - Camera sensor: terrain blocks line of sight, the FOV cone limits what a
+   low UAV sees, hovering UAVs reuse their scan until they move, and a
+   camera mission still completes
+ - Moving targets: GridIndex.move keeps the index equal to a fresh build,
+   walkers stay on free terrain, frame velocities match the displacement
+ - Envs: MissionEnv steps like a bare World, waypoint actions steer
+   patrolling UAVs, VectorEnv gives the same observations in-process and
+   across workers (missing action keys included) and resets finished worlds
+ - Sharded runs (2 worker processes) complete the mission like serial ones,
+   lose no proposal when the shared buffers overflow, and release their
+   shared memory when construction fails
+
+Usage: python engine_test.py   (or: python -m pytest engine_test.py)
+"""
+import heapq
+import math
+import os
+import random
+import sys
+import tempfile
+from array import array
+from types import SimpleNamespace
+
+import run_cache
+import timeline_lod
+import numpy as np
+
+from engine import SEARCH_AREA, EventStore, World, iter_frames, make_config, run_batch, sharding
+from engine.belief import L_MAX, L_MIN, PRIOR, BeliefMap, logit
+from engine.coverage import coverage_routes
+from engine.entities import GridIndex, TargetState, UAVState
+from engine.env import MissionEnv, VectorEnv
+from engine.pathfinding import BLOCKED, NEIGHBOURS, CostGrid, PathPlanner, astar
+from engine.scenario import generate_clustered, load_scenario, read_target_table, write_scenario, write_target_table
+from engine.sensor import Heightmap, SensorModel
+from engine.world import shared_planner
+
+
+def test_routes():
+    grid = shared_planner(make_config()['terrain_file']).grid
+    planner = PathPlanner(grid) # Own cache, so every query is planned here
+    assert BLOCKED in grid.costs
+    size = grid.cell_size
+    x0, z0 = grid.origin_x, grid.origin_z
+    x1, z1 = x0 + grid.width * size, z0 + grid.height * size
+
+    def crosses_blocked(a, b):
+        steps = max(1, int(math.hypot(b[0] - a[0], b[1] - a[1]) / (size * 0.1)))
+        for k in range(steps + 1):
+            x = a[0] + (b[0] - a[0]) * k / steps
+            z = a[1] + (b[1] - a[1]) * k / steps
+            if grid.is_blocked(*grid.world_to_cell(x, z)):
+                return True
+        return False
+
+    rng = random.Random(5)
+    partial = 0
+    for _ in range(300):
+        start = (rng.uniform(x0, x1), 0.0, rng.uniform(z0, z1))
+        if grid.is_blocked(*grid.world_to_cell(start[0], start[2])):
+            continue
+        goal = (rng.uniform(x0, x1), 0.0, rng.uniform(z0, z1))
+        waypoints, reached = planner.plan(start, goal)
+        assert waypoints
+        start_cell = grid.cell_to_world(*grid.world_to_cell(start[0], start[2]))
+        points = [start_cell] + waypoints
+        # The exact goal may sit off the last cell centre: check the cell-centre path
+        if reached:
+            assert waypoints[-1] == (goal[0], goal[2])
+            points[-1] = grid.cell_to_world(*grid.world_to_cell(goal[0], goal[2]))
+        else:
+            partial += 1
+        for a, b in zip(points, points[1:]):
+            assert not crosses_blocked(a, b), (start, goal, a, b)
+    assert partial, "no unreachable goal sampled"
+
+
+def test_planner_cache():
+    rng = random.Random(4)
+    grid = CostGrid(0.0, 0.0, 1.0, 24, 24)
+    for _ in range(40):
+        x, z = rng.randrange(24), rng.randrange(24)
+        grid.fill_rect(x, z, x + rng.randrange(4), z + rng.randrange(4), rng.choice((BLOCKED, 2.0, 5.0)))
+
+    def dijkstra(start):
+        dist = {start: 0.0}
+        heap = [(0.0, start)]
+        while heap:
+            d, (cx, cz) = heapq.heappop(heap)
+            if d > dist[(cx, cz)]:
+                continue
+            for dx, dz, step in NEIGHBOURS:
+                nx, nz = cx + dx, cz + dz
+                if not grid.in_bounds(nx, nz) or grid.is_blocked(nx, nz):
+                    continue
+                if dx and dz and (grid.is_blocked(cx + dx, cz) or grid.is_blocked(cx, cz + dz)):
+                    continue
+                nd = d + step * grid.cost(nx, nz)
+                if nd < dist.get((nx, nz), math.inf):
+                    dist[(nx, nz)] = nd
+                    heapq.heappush(heap, (nd, (nx, nz)))
+        return dist
+
+    def cost(cells):
+        return sum(math.hypot(b[0] - a[0], b[1] - a[1]) * grid.cost(*b) for a, b in zip(cells, cells[1:]))
+
+    free = [(x, z) for z in range(24) for x in range(24) if not grid.is_blocked(x, z)]
+    for _ in range(20):
+        start = rng.choice(free)
+        dist = dijkstra(start)
+        for goal in rng.sample(free, 10):
+            cells = astar(grid, start, goal)
+            assert (cells is None) == (goal not in dist), (start, goal)
+            if cells is not None:
+                assert abs(cost(cells) - dist[goal]) < 1e-9, (start, goal)
+
+    planner = PathPlanner(grid, cache_size=4)
+    pairs = [(rng.choice(free), rng.choice(free)) for _ in range(5)]
+    first = planner.plan_cells(*pairs[0])
+    assert planner.plan_cells(*pairs[0]) is first and (planner.hits, planner.misses) == (1, 1)
+    assert isinstance(first[0], tuple) # Shared between vehicles: immutable
+    for pair in pairs[1:]:
+        planner.plan_cells(*pair)
+    assert len(planner._cache) == 4
+    planner.plan_cells(*pairs[0]) # Evicted as least recently used
+    assert planner.misses == 6
+
+    terrain = make_config()['terrain_file']
+    assert shared_planner(terrain) is shared_planner(terrain)
+
+
+def test_unreachable_targets():
+    world = World({'target_count': 40}, 11) # T9 and T10 sit in walled-off pockets
+    frames = list(iter_frames(world, 20000))
+    assert world.complete and world.unreachable
+    given_up = {evt['target'] for f in frames for evt in f['events']
+                if evt['type'] == 'PLANNER_WARNING' and '放弃' in evt['msg']}
+    assert given_up == {world.targets.ids[i] for i in world.unreachable}
+    for t in frames[-1]['targets']:
+        assert t['state'] == ('CONFIRMED' if t['id'] in given_up else 'RESCUED'), t
+
+
+def test_event_query():
+    rng = random.Random(7)
+    events = []
+    tick = 0
+    for _ in range(3000):
+        tick += rng.randrange(3)
+        evt = {'tick': tick, 'type': rng.choice(('DETECT', 'CONFIRM', 'DISPATCH', 'ARRIVE'))}
+        if rng.random() < 0.8:
+            evt['agent'] = f"UAV-{rng.randrange(6)}"
+        if rng.random() < 0.6:
+            evt['target'] = rng.randrange(20)
+        events.append(evt)
+    store = EventStore(events)
+
+    def brute(event_type=None, agent=None, target=None, from_tick=None, to_tick=None, limit=None):
+        out = [evt for evt in events
+               if (event_type is None or evt['type'] == event_type)
+               and (agent is None or evt.get('agent') == agent)
+               and (target is None or evt.get('target') == target)
+               and (from_tick is None or evt['tick'] >= from_tick)
+               and (to_tick is None or evt['tick'] <= to_tick)]
+        return out if limit is None else out[:limit]
+
+    for _ in range(500):
+        q = {
+            'event_type': rng.choice((None, 'DETECT', 'CONFIRM', 'DISPATCH', 'ARRIVE', 'NONE')),
+            'agent': rng.choice((None, 'UAV-0', 'UAV-3', 'UAV-9')),
+            'target': rng.choice((None, 0, 5, 19, 42)),
+            'from_tick': rng.choice((None, rng.randrange(tick))),
+            'to_tick': rng.choice((None, rng.randrange(tick))),
+            'limit': rng.choice((None, 1, 10)),
+        }
+        assert store.query(**q) == brute(**q), q
+
+
+def test_coverage_routes():
+    xs = [p[0] for p in SEARCH_AREA]
+    zs = [p[1] for p in SEARCH_AREA]
+    for pattern in ('boustrophedon', 'spiral'):
+        for swarm in (1, 5, 200):
+            routes = coverage_routes(SEARCH_AREA, swarm, 8.0, pattern)
+            assert len(routes) == swarm
+            for route in routes:
+                assert len(route) >= 2 and len(route) % 2 == 0, (pattern, swarm)
+                for k in range(0, len(route), 2):
+                    assert min(xs) <= route[k] <= max(xs) and min(zs) <= route[k + 1] <= max(zs)
+
+    # Zero-area areas: a single waypoint at the centre
+    for area, centre in ((((0, 0), (10, 0), (20, 0)), [10.0, 0.0]), (((5, 5), (5, 5), (5, 5)), [5.0, 5.0])):
+        for pattern in ('boustrophedon', 'spiral'):
+            for route in coverage_routes(area, 3, 8.0, pattern):
+                assert list(route) == centre, (area, pattern, list(route))
+    # Thinner than one line spacing: still one sweep for every UAV
+    for route in coverage_routes(((0, 0), (10, 0.5), (20, 0)), 3, 8.0):
+        assert len(route) >= 2
+    try:
+        coverage_routes(((0, 0), (1, 1)), 3, 8.0)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("two-vertex area accepted")
+
+
+def test_lod_select():
+    frames = run_batch(seed=11, max_ticks=600)
+    pyramid = timeline_lod.build_pyramid(frames)
+    last = frames[-1]['tick']
+    assert timeline_lod.select(frames) == frames
+    rng = random.Random(3)
+    for _ in range(60):
+        from_tick = rng.choice((None, rng.randrange(last)))
+        to_tick = rng.choice((None, rng.randrange(last)))
+        budget = rng.choice((None, 8, 64, 300))
+        in_window = [i for i, f in enumerate(frames)
+                     if (from_tick is None or f['tick'] >= from_tick) and (to_tick is None or f['tick'] <= to_tick)]
+        keyframes = timeline_lod.keyframe_indices(frames, in_window) if in_window else set()
+        for pyr in (None, pyramid):
+            out = timeline_lod.select(frames, budget, from_tick, to_tick, pyr)
+            ticks = [f['tick'] for f in out]
+            assert ticks == sorted(set(ticks))
+            assert all((from_tick is None or t >= from_tick) and (to_tick is None or t <= to_tick) for t in ticks)
+            if budget is None or len(in_window) <= budget:
+                assert out == [frames[i] for i in in_window]
+            else:
+                # Keyframes always survive, so only they can push a selection over budget
+                assert len(out) <= max(budget, len(keyframes)), (budget, len(out), len(keyframes))
+
+
+def test_belief_update():
+    config = {'belief_cell': 2.0, 'sensor_radius': 6.0}
+    belief = BeliefMap(config, CostGrid(-50, -50, 2.0, 50, 50), seed=1)
+    prior = np.float32(logit(PRIOR))
+    origins = np.array([[-20.0, -20.0], [20.0, 20.0]])
+    target = np.array([[20.5, 20.5]]) # Seen by the second UAV only
+    for _ in range(60):
+        belief.observe(origins, target, np.array([1]))
+    odds = belief.log_odds
+    assert odds.min() >= L_MIN and odds.max() <= L_MAX
+
+    cz, cx = belief.cells_of(origins[:, 0], origins[:, 1])
+    tz, tx = belief.cells_of(target[:, 0], target[:, 1])
+    assert belief.posterior(target[:, 0], target[:, 1])[0] > 0.95
+    assert odds[cz[0], cx[0]] < prior # Searched and empty
+    # Cells no footprint covers keep the prior
+    touched = np.zeros(odds.shape, dtype=bool)
+    for z, x in zip(cz, cx):
+        touched[z + belief.stencil_z, x + belief.stencil_x] = True
+    assert (odds[~touched] == prior).all()
+    # Over the empty footprint cells, misses outweigh false alarms
+    empty = touched.copy()
+    empty[tz[0], tx[0]] = False
+    assert np.median(odds[empty]) < prior
+
+    # Same seed, same observations: same map
+    again = BeliefMap(config, CostGrid(-50, -50, 2.0, 50, 50), seed=1)
+    for _ in range(60):
+        again.observe(origins, target, np.array([1]))
+    assert (again.log_odds == odds).all()
+
+
+def test_scenarios():
+    tmp = tempfile.mkdtemp()
+    pos = generate_clustered(500, seed=2)
+    path = os.path.join(tmp, 'pop.targets')
+    write_target_table(path, pos)
+    assert read_target_table(path) == pos
+    with open(path, 'r+b') as f:
+        f.truncate(os.path.getsize(path) - 8)
+    try:
+        read_target_table(path)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("truncated table accepted")
+
+    table = os.path.join(tmp, 'table.json')
+    inline = os.path.join(tmp, 'inline.json')
+    write_scenario(table, 500, seed=2, config={'uav_count': 4})
+    write_scenario(inline, 500, seed=2, config={'uav_count': 4}, inline_generator=True)
+    a, b = load_scenario(table), load_scenario(inline)
+    assert a['target_pos'] == b['target_pos'] == pos and a['target_ids'] == b['target_ids']
+    assert a['target_ids'][:2] == ('T1', 'T2') and a['config'] == {'uav_count': 4}
+
+    world = World({'scenario_file': table}, 1)
+    assert world.targets.pos == pos and world.targets.ids == list(a['target_ids']) and len(world.uavs) == 4
+
+    # Same path, new population in the table: a new cache key
+    config = make_config({'scenario_file': table})
+    key = run_cache.run_key('timeline', config, 1)
+    assert run_cache.run_key('timeline', config, 1) == key
+    write_target_table(os.path.join(tmp, 'table.targets'), generate_clustered(500, seed=3))
+    os.utime(os.path.join(tmp, 'table.targets'), (1, 1)) # Distinct mtime even on coarse clocks
+    assert run_cache.run_key('timeline', config, 1) != key
+
+
+def test_camera_occlusion():
+    heights = np.zeros((20, 20))
+    heights[:, 6] = 8.0 # A wall along x in [-4, -3)
+    wall = Heightmap(-10.0, -10.0, 1.0, heights)
+    src = np.array([[0.0, 12.0, 0.0]] * 3)
+    dst = np.array([[-6.0, 0.5, 0.0], [-6.0, 0.5, 5.0], [3.0, 0.5, 0.0]])
+    assert wall.clear(src, dst).tolist() == [False, False, True]
+    assert wall.clear(np.array([[0.0, 40.0, 0.0]]), dst[:1]).tolist() == [True] # High enough to see over it
+
+    # Under the UAV, outside the cone, behind the wall, in the open, already confirmed
+    pos = array('d', [0, 0, 0, 9, 0, 0, -6, 0, 0, 3, 0, 0, 1, 0, 1])
+    state = np.array([0, 0, 1, 0, TargetState.CONFIRMED], dtype=np.uint8)
+    index = GridIndex(pos, 4.0)
+    uav = SimpleNamespace(index=0, state=UAVState.PATROL, position=[0.0, 12.0, 0.0], target_pos=None)
+    seen = {}
+    for model in ('disc', 'camera'):
+        sensor = SensorModel(make_config({'sensor_model': model, 'sensor_fov': 60}))
+        sensor.heightmap = wall
+        (cand, can_detect, can_collab), = sensor.scan([uav], index, pos, state)
+        assert cand.tolist() == [0, 1, 2, 3], model
+        seen[model] = can_detect.tolist()
+    assert seen['disc'] == [True, True, True, True]
+    assert seen['camera'] == [True, False, False, True]
+
+    # A hovering UAV scans from its station once, then reuses the result until it moves
+    sensor = SensorModel(make_config({'sensor_model': 'camera', 'sensor_fov': 60}))
+    sensor.heightmap = wall
+    uav.state, uav.target_pos = UAVState.REPORTING, (0.0, 12.0, 0.0)
+    first = sensor.scan([uav], index, pos, state)[0]
+    uav.position = [50.0, 12.0, 50.0] # Drifting around the station does not matter
+    assert all(a is b for a, b in zip(sensor.scan([uav], index, pos, state)[0], first))
+    uav.target_pos = (-6.0, 12.0, 0.0)
+    moved = sensor.scan([uav], index, pos, state)[0]
+    assert moved[0] is not first[0] and moved[1][moved[0].tolist().index(2)]
+
+    try:
+        SensorModel(make_config({'sensor_model': 'lidar'}))
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("unknown sensor model accepted")
+
+    frames = run_batch({'sensor_model': 'camera'}, seed=11)
+    assert frames[-1]['mission_phase'] == 'COMPLETE'
+    assert all(t['state'] == 'RESCUED' for t in frames[-1]['targets'])
+
+
+def test_target_motion():
+    def buckets(index):
+        return {key: sorted(bucket) for key, bucket in index.cells.items() if len(bucket)}
+
+    # Random moves, in and out of a strip filter
+    rng = random.Random(9)
+    pos = [rng.uniform(-50, 50) for _ in range(3 * 400)]
+    keep = lambda x: -10 <= x < 20
+    index = GridIndex(pos, 4.0, keep)
+    for _ in range(3000):
+        i = rng.randrange(400)
+        x0, z0 = pos[3 * i], pos[3 * i + 2]
+        pos[3 * i] += rng.uniform(-6, 6)
+        pos[3 * i + 2] += rng.uniform(-6, 6)
+        index.move(i, x0, z0, pos[3 * i], pos[3 * i + 2])
+    assert buckets(index) == buckets(GridIndex(pos, 4.0, keep))
+
+    for model in ('random_walk', 'shelter'):
+        world = World({'target_motion': model, 'target_mobile_fraction': 0.5}, 7)
+        grid = world.planner.grid
+        prev = world.build_state()
+        walked = 0
+        for _ in range(300):
+            world.step()
+            frame = world.build_state()
+            for a, b in zip(prev['targets'], frame['targets']):
+                assert abs(b['x'] - a['x'] - b['vx']) < 1e-9 and abs(b['z'] - a['z'] - b['vz']) < 1e-9
+                if b['vx'] or b['vz']:
+                    walked += 1
+                    assert not grid.is_blocked(*grid.world_to_cell(b['x'], b['z']))
+            prev = frame
+        assert walked, model
+        fresh = GridIndex(world.targets.pos, world.target_index.cell)
+        assert buckets(world.target_index) == buckets(fresh), model
+
+
+def test_envs():
+    env = MissionEnv()
+    try:
+        env.step()
+    except RuntimeError:
+        pass
+    else:
+        raise AssertionError("step() before reset() accepted")
+    obs = env.reset(5)
+    world = World(make_config(), 5)
+    assert obs['tick'] == 0 and not obs['done']
+    for _ in range(60):
+        obs, events = env.step()
+        assert events == world.step()
+    assert obs['tick'] == world.tick == 60
+    assert obs['target_state'].tolist() == list(world.targets.state)
+
+    n_uav = len(env.world.uavs)
+    waypoints = np.full((n_uav, 2), np.nan)
+    waypoints[:, 0], waypoints[:, 1] = 12.0, -7.0
+    env.apply({'uav_waypoints': waypoints})
+    for uav in env.world.uavs:
+        if uav.state == UAVState.PATROL:
+            assert uav.patrol_target == (12.0, 10.0, -7.0)
+
+    config = {'max_ticks': 25}
+    local = VectorEnv(3, config)
+    with VectorEnv(3, config, processes=2) as remote:
+        for env in (local, remote):
+            try:
+                env.reset([1, 2])
+            except ValueError:
+                pass
+            else:
+                raise AssertionError("wrong seed count accepted")
+        first = [local.reset(8), remote.reset(8)]
+        assert all(np.array_equal(first[0][key], first[1][key]) for key in first[0])
+        assert first[0]['tick'].tolist() == [0, 0, 0]
+        still = np.full((3, n_uav, 2), np.nan)
+        for tick in range(1, 27):
+            actions = {'uav_waypoints': still, 'dispatch': None}
+            (a, a_events), (b, b_events) = local.step(actions), remote.step(actions)
+            assert a_events == b_events, tick
+            for key in a:
+                assert np.array_equal(a[key], b[key]), (tick, key)
+            # Done at max_ticks; the next step starts a fresh run
+            assert a['tick'].tolist() == [tick if tick <= 25 else 0] * 3
+            assert a['done'].tolist() == [tick == 25] * 3
+        assert a_events == [[], [], []]
+    assert remote.closed and not any(proc.is_alive() for proc in remote.workers)
+
+
+def test_sharded_completion():
+    for config in (None, {'confirm_mode': 'belief'}):
+        serial = run_batch(config, seed=11)
+        sharded = run_batch(config, seed=11, shards=2)
+        for frames in (serial, sharded):
+            assert frames[-1]['mission_phase'] == 'COMPLETE', (config, len(frames))
+            assert all(t['state'] == 'RESCUED' for t in frames[-1]['targets'])
+        # Not bit-identical (see engine/sharding.py), but the same mission
+        assert [t['id'] for t in serial[-1]['targets']] == [t['id'] for t in sharded[-1]['targets']]
+
+
+def test_sharded_overflow():
+    roomy = run_batch(seed=11, max_ticks=400, shards=2)
+    slots = sharding.COLLAB_SLOTS_PER_UAV
+    sharding.COLLAB_SLOTS_PER_UAV = 0 # Every collaboration goes back over the pipe
+    try:
+        assert run_batch(seed=11, max_ticks=400, shards=2) == roomy
+    finally:
+        sharding.COLLAB_SLOTS_PER_UAV = slots
+
+    created = []
+    real = sharding.shared_memory.SharedMemory
+
+    def failing(*args, **kwargs):
+        if len(created) == 3:
+            raise OSError("no space left on device")
+        shm = real(*args, **kwargs)
+        created.append(shm.name)
+        return shm
+
+    sharding.shared_memory.SharedMemory = failing
+    try:
+        sharding.ShardedWorld(seed=1, shards=2)
+    except OSError:
+        pass
+    else:
+        raise AssertionError("allocation failure not raised")
+    finally:
+        sharding.shared_memory.SharedMemory = real
+    for name in created: # Unlinked again: attaching must fail
+        try:
+            real(name=name).close()
+        except FileNotFoundError:
+            continue
+        raise AssertionError(f"leaked shared memory block {name}")
+
+
+CHECKS = [
+    test_routes,
+    test_planner_cache,
+    test_unreachable_targets,
+    test_event_query,
+    test_coverage_routes,
+    test_lod_select,
+    test_belief_update,
+    test_scenarios,
+    test_camera_occlusion,
+    test_target_motion,
+    test_envs,
+    test_sharded_completion,
+    test_sharded_overflow,
+]
+
+
+def main():
+    failed = 0
+    for check in CHECKS:
+        try:
+            check()
+            print(f"[ok]   {check.__name__}")
+        except Exception as e:
+            failed += 1
+            print(f"[FAIL] {check.__name__}: {e!r}")
+    print(f"\n{len(CHECKS) - failed}/{len(CHECKS)} checks passed")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
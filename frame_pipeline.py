@@ -0,0 +1,113 @@
+"""
+frame_pipeline.py
+
+Hand-off stage between the simulation loop and frame I/O.
+
+The loop records each frame and submits it; a worker drains the bounded
+queue and does the I/O (JSON encoding, broker publishing, socket emission).
+A slow encoder or a blocked socket write therefore delays frames, never
+ticks. Frames must not be mutated once submitted.
+
+When the queue is full the configured policy decides:
+    'drop_oldest'  discard the oldest queued frame (default, live viewing
+                   wants the newest state); its events are carried into the
+                   next frame the worker handles, so no event is lost
+    'drop_newest'  discard the frame being submitted (events carried likewise)
+    'block'        wait for room (back-pressure: ticks slow down instead)
+"""
+import logging
+import queue
+import threading
+import time
+from collections import deque
+
+POLICIES = ('drop_oldest', 'drop_newest', 'block')
+LOG = logging.getLogger('nav.pipeline')
+STOP = (None, None) # Queued by close(): the worker exits once everything before it is handled
+
+
+class FramePipeline:
+    def __init__(self, handler, maxsize=64, policy='drop_oldest', make_queue=queue.Queue,
+                 queue_empty=queue.Empty, sleep=time.sleep):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown full-queue policy: {policy!r} (expected one of {POLICIES})")
+        self.handler = handler # handler(frame, **flags), runs on the worker
+        self.maxsize = maxsize
+        self.policy = policy
+        # Queue and sleep come from the server's async mode (threading / eventlet)
+        self.queue = make_queue()
+        self.queue_empty = queue_empty
+        self.sleep = sleep
+        self.carried = deque() # Events of dropped frames, waiting for the next handled frame
+        self.lock = threading.Lock()
+        self.submitted = 0
+        self.dropped = 0
+        self.handled = 0
+        self.max_depth = 0
+        self.stopped = False
+
+    def submit(self, frame, **flags):
+        """Queue an immutable frame for the worker; never blocks unless policy is 'block'"""
+        item = (frame, flags)
+        with self.lock:
+            self.submitted += 1
+            if self.queue.qsize() >= self.maxsize:
+                if self.policy == 'block':
+                    pass
+                elif self.policy == 'drop_newest':
+                    self._drop(item)
+                    return False
+                else:
+                    try:
+                        self._drop(self.queue.get_nowait())
+                    except self.queue_empty:
+                        pass
+        while self.policy == 'block' and self.queue.qsize() >= self.maxsize:
+            self.sleep(0.005)
+        self.queue.put(item)
+        self.max_depth = max(self.max_depth, self.queue.qsize())
+        return True
+
+    def _drop(self, item):
+        frame, flags = item
+        self.dropped += 1
+        if flags.get('events', True) and frame.get('events'):
+            self.carried.extend(frame['events'])
+
+    def run(self):
+        """Worker loop (start with socketio.start_background_task or a thread)"""
+        while True:
+            item = self.queue.get()
+            if item is STOP:
+                break
+            frame, flags = item
+            if self.carried and flags.get('events', True):
+                with self.lock:
+                    events = list(self.carried)
+                    self.carried.clear()
+                frame = dict(frame, events=events + frame['events'])
+            try:
+                self.handler(frame, **flags)
+            except Exception:
+                LOG.exception("Frame pipeline error")
+            self.handled += 1
+        self.stopped = True
+
+    def close(self, timeout=5.0):
+        """Let the worker finish the queued frames, then stop it (graceful shutdown)"""
+        self.queue.put(STOP)
+        deadline = time.monotonic() + timeout
+        while not self.stopped and time.monotonic() < deadline:
+            self.sleep(0.01)
+        return self.stopped
+
+    def stats(self):
+        return {
+            'policy': self.policy,
+            'maxsize': self.maxsize,
+            'depth': self.queue.qsize(),
+            'max_depth': self.max_depth,
+            'submitted': self.submitted,
+            'handled': self.handled,
+            'dropped': self.dropped,
+        }
@@ -0,0 +1,156 @@
+"""
+gateway.py
+
+Stateless viewer gateway. Serves the UI and Socket.IO to browsers, takes
+frames and events from broker.py and relays viewer controls (play / pause,
+reset) back to the simulation. A new viewer gets the latest frame and joins
+the running mission; only an explicit reset restarts it. Run as many as the
+viewer count needs:
+
+    python broker.py
+    FRAME_BROKER=/tmp/nav-demo-broker.sock python app.py
+    python gateway.py --port 5003
+    python gateway.py --port 5004
+
+Live history export is served by the simulation process (SIM_URL); seeded
+timelines come from the shared on-disk run cache.
+"""
+import argparse
+import json
+import logging
+import os
+
+from flask import Flask, jsonify, redirect, request
+from flask_cors import CORS
+from flask_socketio import SocketIO, emit
+
+import broker
+import http_compression
+import mission_generator
+import structured_log
+import timeline_http
+from engine import make_config
+from engine.world import shared_planner
+from run_cache import RunCache
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SIM_URL = os.environ.get('SIM_URL', 'http://127.0.0.1:5002')
+LOG = logging.getLogger('nav.gateway')
+
+app = Flask(__name__)
+CORS(app)
+socketio = SocketIO(app, cors_allowed_origins='*')
+http_compression.init_app(app)
+
+RUN_CACHE = RunCache()
+BROKER = None
+LAST_STATE = None # Latest frame, so a new viewer does not wait for the next tick
+
+
+def relay_control(event, data=None):
+    BROKER.publish(broker.CONTROL_TOPIC, json.dumps({'event': event, 'data': data}))
+
+
+def pump_frames():
+    """
+    Fan every frame published by the simulation out to this gateway's clients
+    (decoded once here; Socket.IO encodes it again for the wire)
+    """
+    global LAST_STATE
+    while True:
+        messages = BROKER.poll()
+        for _, payload in messages:
+            name, data = json.loads(payload)
+            if name == 'state':
+                LAST_STATE = data
+            socketio.emit(name, data)
+        if not messages:
+            socketio.sleep(0.02)
+
+
+# --- Routes ---
+@app.route('/')
+def index():
+    return http_compression.static_file_response(os.path.join(BASE_DIR, 'index.html'))
+
+@app.route('/terrain')
+def terrain():
+    return jsonify(shared_planner(make_config()['terrain_file']).grid.spec)
+
+@app.route('/favicon.ico')
+def favicon():
+    return '', 204
+
+@app.route('/export_timeline')
+def export_timeline():
+    seed = request.args.get('seed', type=int)
+    if seed is None:
+        # The recorded live history only exists in the simulation process
+        return redirect(f"{SIM_URL}/export_timeline?{request.query_string.decode()}", code=307)
+    config = timeline_http.seeded_config(request.args)
+    budget = request.args.get('budget', type=int)
+    from_tick = request.args.get('from_tick', type=int)
+    to_tick = request.args.get('to_tick', type=int)
+    run = timeline_http.seeded_run_token(seed, config)
+    return http_compression.precompressed_response(
+        f"export:{run}:{budget}:{from_tick}:{to_tick}",
+        lambda: json.dumps(mission_generator.timeline_view(seed, config, RUN_CACHE, budget, from_tick, to_tick),
+                           ensure_ascii=False),
+        persist=True)
+
+@app.route('/timeline/meta')
+def timeline_meta():
+    seed = request.args.get('seed', type=int)
+    if seed is None:
+        return redirect(f"{SIM_URL}/timeline/meta?{request.query_string.decode()}", code=307)
+    frames, _, run = timeline_http.seeded_run(seed, timeline_http.seeded_config(request.args), RUN_CACHE)
+    return timeline_http.meta_response(frames, run, True)
+
+@app.route('/timeline/range')
+def timeline_range():
+    seed = request.args.get('seed', type=int)
+    if seed is None:
+        return redirect(f"{SIM_URL}/timeline/range?{request.query_string.decode()}", code=307)
+    frames, pyramid, run = timeline_http.seeded_run(seed, timeline_http.seeded_config(request.args), RUN_CACHE)
+    return timeline_http.range_response(frames, run, True, pyramid)
+
+@app.route('/events')
+def query_events():
+    seed = request.args.get('seed', type=int)
+    if seed is None:
+        return redirect(f"{SIM_URL}/events?{request.query_string.decode()}", code=307)
+    store = mission_generator.cached_events(seed, timeline_http.seeded_config(request.args), RUN_CACHE)
+    return timeline_http.events_response(store)
+
+# --- Viewer controls (forwarded to the simulation) ---
+@socketio.on('connect')
+def handle_connect():
+    if LAST_STATE is not None:
+        emit('state', LAST_STATE)
+    else:
+        relay_control('join') # No frame seen yet: have the simulation start a session
+
+@socketio.on('set_sim_mode')
+def handle_set_mode(mode):
+    relay_control('set_sim_mode', mode)
+
+@socketio.on('reset_simulation')
+def handle_reset(data=None):
+    relay_control('reset_simulation', data)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Viewer gateway for a broker-connected simulation")
+    parser.add_argument("--port", type=int, default=5003)
+    parser.add_argument("--broker", default=broker.DEFAULT_PATH, help="Broker Unix socket path")
+    args = parser.parse_args()
+
+    structured_log.setup()
+    BROKER = broker.BrokerClient(args.broker)
+    BROKER.subscribe(broker.VIEWER_TOPIC)
+    socketio.start_background_task(pump_frames)
+    LOG.info("Gateway listening", extra={'port': args.port, 'broker': args.broker})
+    try:
+        socketio.run(app, host='0.0.0.0', port=args.port, debug=False, allow_unsafe_werkzeug=True)
+    finally:
+        structured_log.shutdown()
@@ -0,0 +1,206 @@
+"""
+http_compression.py
+
+Response compression and cache validators for app.py / gateway.py.
+
+* init_app(app) compresses any JSON / HTML / JS / CSS / text response above
+  MIN_SIZE bytes on the fly (brotli if the `brotli` package is installed and
+  the client accepts it, otherwise gzip).
+* precompressed_response() serves bodies that never change for a given key
+  (index.html per mtime, finished timelines, settled timeline ranges). They
+  are compressed once at maximum level, kept in an in-memory LRU bounded by
+  total body bytes (MEMORY_BYTES) and, for deterministic keys, on disk next
+  to the run cache, so no request pays for compression twice. These
+  responses carry an ETag (one variant per content encoding) and
+  Last-Modified, and answer conditional requests with 304.
+"""
+import gzip
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from flask import Response, request
+
+try:
+    import brotli
+except ImportError: # Optional: gzip only
+    brotli = None
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+STORE_DIR = os.environ.get('NAV_DEMO_COMPRESSED_DIR', os.path.join(BASE_DIR, '.cache', 'compressed'))
+
+MIN_SIZE = 1024 # Below this, compression costs more than it saves
+MEMORY_BYTES = int(os.environ.get('NAV_DEMO_COMPRESSED_MEMORY_MB', '64')) * 1024 * 1024
+COMPRESSIBLE = ('application/json', 'text/html', 'text/css', 'text/plain',
+                'application/javascript', 'text/javascript')
+ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+LOG = logging.getLogger('nav.http')
+
+
+def compress(data, encoding, best=False):
+    if encoding == 'br':
+        return brotli.compress(data, quality=11 if best else 4)
+    return gzip.compress(data, compresslevel=9 if best else 6)
+
+
+def accepted_encoding():
+    """Best encoding the current request accepts (None for identity)"""
+    for encoding in ENCODINGS:
+        if request.accept_encodings[encoding]:
+            return encoding
+    return None
+
+
+class CompressedStore:
+    """Bodies keyed by an immutable key, stored identity + every supported encoding"""
+
+    def __init__(self, root=STORE_DIR, memory_bytes=MEMORY_BYTES):
+        self.root = root
+        self.memory_bytes = memory_bytes
+        self._memory = OrderedDict() # key -> (entry, size in bytes)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def _path(self, key, encoding):
+        return os.path.join(self.root, key[:2], f"{key}.{encoding or 'identity'}")
+
+    def _load(self, key):
+        bodies = {}
+        try:
+            for encoding in (None,) + ENCODINGS:
+                with open(self._path(key, encoding), 'rb') as f:
+                    bodies[encoding] = f.read()
+            modified = os.path.getmtime(self._path(key, None))
+        except OSError:
+            return None
+        return bodies, modified
+
+    def _save(self, key, bodies):
+        directory = os.path.dirname(self._path(key, None))
+        os.makedirs(directory, exist_ok=True)
+        # Encodings first, identity last: a present identity file means a complete entry
+        for encoding in ENCODINGS + (None,):
+            fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(bodies[encoding])
+                os.replace(tmp, self._path(key, encoding))
+            except BaseException:
+                try:
+                    os.remove(tmp)
+                except OSError:
+                    pass
+                raise
+
+    def get(self, key, build, persist=False):
+        """(bodies by encoding, modified timestamp), building and compressing on first use"""
+        with self._lock:
+            cached = self._memory.get(key)
+            if cached is not None:
+                self._memory.move_to_end(key)
+                return cached[0]
+        entry = self._load(key) if persist else None
+        if entry is None:
+            data = build()
+            if isinstance(data, str):
+                data = data.encode('utf-8')
+            bodies = {None: data}
+            for encoding in ENCODINGS:
+                bodies[encoding] = compress(data, encoding, best=True)
+            if persist:
+                try:
+                    self._save(key, bodies)
+                except OSError as e:
+                    LOG.warning("Compressed store write failed", extra={'key': key, 'error': str(e)})
+            entry = (bodies, datetime.now(timezone.utc).timestamp())
+        size = sum(len(body) for body in entry[0].values())
+        if size > self.memory_bytes:
+            return entry # Served, but too large to keep in memory
+        with self._lock:
+            old = self._memory.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._memory[key] = (entry, size)
+            self._bytes += size
+            while self._bytes > self.memory_bytes:
+                _, (_, evicted) = self._memory.popitem(last=False)
+                self._bytes -= evicted
+        return entry
+
+
+STORE = CompressedStore()
+
+
+def etag_matches(etag):
+    """True if If-None-Match names this ETag or any of its encoding variants"""
+    return any(tag == etag or tag.startswith(etag + '-') for tag in request.if_none_match)
+
+
+def _not_modified(etag, modified):
+    if request.if_none_match:
+        return etag_matches(etag)
+    since = request.if_modified_since
+    return since is not None and int(modified) <= since.timestamp()
+
+
+def precompressed_response(key, build, mimetype='application/json', cache_control='no-cache', persist=False):
+    """
+    Serve an immutable body (build() is only called on a store miss). `key`
+    must change whenever the content does; it doubles as the ETag.
+    """
+    etag = hashlib.sha1(key.encode('utf-8')).hexdigest()
+    bodies, modified = STORE.get(etag, build, persist)
+    encoding = accepted_encoding() if len(bodies[None]) >= MIN_SIZE else None
+
+    headers = {
+        'ETag': f'"{etag}-{encoding}"' if encoding else f'"{etag}"',
+        'Cache-Control': cache_control,
+        'Vary': 'Accept-Encoding',
+    }
+    response = Response(status=304, headers=headers) if _not_modified(etag, modified) else \
+        Response(bodies[encoding], mimetype=mimetype, headers=headers)
+    response.last_modified = datetime.fromtimestamp(int(modified), timezone.utc)
+    if encoding and response.status_code == 200:
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+
+def static_file_response(path, mimetype='text/html'):
+    """A file served compressed from the store, revalidated by mtime"""
+    mtime = os.path.getmtime(path)
+
+    def read():
+        with open(path, 'rb') as f:
+            return f.read()
+
+    return precompressed_response(f"file:{path}:{mtime}", read, mimetype)
+
+
+def compress_response(response, min_size=MIN_SIZE):
+    """after_request hook: compress dynamic responses above min_size"""
+    if (response.status_code != 200 or response.direct_passthrough
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE):
+        return response
+    encoding = accepted_encoding()
+    if encoding is None:
+        return response
+    data = response.get_data()
+    if len(data) < min_size:
+        return response
+    response.set_data(compress(data, encoding))
+    response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    etag, weak = response.get_etag()
+    if etag:
+        response.set_etag(f"{etag}-{encoding}", weak)
+    return response
+
+
+def init_app(app, min_size=MIN_SIZE):
+    app.after_request(lambda response: compress_response(response, min_size))
@@ -0,0 +1,131 @@
+"""
+run_cache.py
+
+On-disk memo cache for deterministic simulation runs.
+
+A run is fully determined by (scenario config and files, seed, code
+version), so any result derived from it (a timeline, a KPI table, ...) can be
+computed once and served from disk afterwards. Entries are stored as JSON files named by the
+SHA-256 of that key; a small in-process LRU sits in front of the disk so hot
+configurations do not even pay for the JSON parse.
+
+Usage:
+    cache = RunCache()
+    timeline = cache.get_or_compute('timeline', config, seed,
+                                    lambda: generate_mission(seed, config))
+"""
+import glob
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+from engine.scenario import scenario_digest
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR = os.environ.get('NAV_DEMO_CACHE_DIR', os.path.join(BASE_DIR, '.cache', 'runs'))
+
+# Source files whose contents define the "code version" of a run.
+# Any edit to the simulator invalidates every cached result automatically.
+SOURCE_GLOBS = ['engine/*.py', 'scenarios/*.json', 'scenarios/*.yaml', 'scenarios/*.yml', 'scenarios/*.targets',
+                'mission_generator.py', 'analytics.py']
+
+_CODE_VERSION = None
+
+
+def code_version():
+    """Short hash of the simulator sources (computed once per process)"""
+    global _CODE_VERSION
+    if _CODE_VERSION is None:
+        h = hashlib.sha256()
+        paths = sorted(p for pattern in SOURCE_GLOBS for p in glob.glob(os.path.join(BASE_DIR, pattern)))
+        for path in paths:
+            h.update(os.path.relpath(path, BASE_DIR).encode('utf-8'))
+            try:
+                with open(path, 'rb') as f:
+                    h.update(f.read())
+            except OSError:
+                h.update(b'<missing>')
+        _CODE_VERSION = h.hexdigest()[:16]
+    return _CODE_VERSION
+
+
+def run_key(kind, config, seed, version=None):
+    """Stable cache key for one (kind, config, seed, code version) tuple"""
+    config = config or {}
+    payload = {
+        'kind': kind,
+        'config': config,
+        'seed': seed,
+        'version': version or code_version(),
+        # The scenario file may live anywhere (SOURCE_GLOBS only covers scenarios/)
+        'scenario': scenario_digest(config['scenario_file']) if config.get('scenario_file') else None,
+    }
+    raw = json.dumps(payload, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class RunCache:
+    def __init__(self, root=CACHE_DIR, version=None, memory_entries=16):
+        self.root = root
+        self.version = version
+        self.memory_entries = memory_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key):
+        return os.path.join(self.root, key[:2], key + '.json')
+
+    def _remember(self, key, value):
+        with self._lock:
+            self._memory[key] = value
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def get(self, kind, config, seed):
+        """Return the cached result or None"""
+        key = run_key(kind, config, seed, self.version)
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return self._memory[key]
+        try:
+            with open(self._path(key), 'r', encoding='utf-8') as f:
+                value = json.load(f)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._remember(key, value)
+        return value
+
+    def put(self, kind, config, seed, value):
+        key = run_key(kind, config, seed, self.version)
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temp file first so concurrent readers never see a partial entry
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(value, f, ensure_ascii=False, separators=(',', ':'))
+            os.replace(tmp, path)
+        except Exception:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise
+        self._remember(key, value)
+        return value
+
+    def get_or_compute(self, kind, config, seed, compute):
+        value = self.get(kind, config, seed)
+        if value is None:
+            value = self.put(kind, config, seed, compute())
+        return value
@@ -0,0 +1,74 @@
+"""
+serve.py
+
+Production launcher for the simulation server (app.py):
+
+    python serve.py [--host 0.0.0.0] [--port 5002]
+
+- The standard library is monkey-patched for eventlet before anything else
+  is imported, so sockets, sleeps and locks in every library yield to the
+  hub instead of blocking all sessions.
+- The app is served by eventlet's own WSGI server (green thread per
+  connection, WebSocket upgrade included), not the Werkzeug dev server.
+- Importing app has no side effects; the simulation starts with the first
+  viewer session (at launch when FRAME_BROKER is set: gateway sessions
+  arrive through the broker).
+- SIGINT / SIGTERM stop accepting connections, then app.shutdown() flushes
+  queued frames and releases shard workers and sockets.
+- Startup is timed: import, bind, and total to listening.
+- Logging goes through structured_log (queued, written off the hub).
+"""
+import time
+
+STARTED_AT = time.perf_counter()
+
+
+def main():
+    import argparse
+    import logging
+    import signal
+
+    import eventlet
+    import eventlet.wsgi
+
+    parser = argparse.ArgumentParser(description="Simulation server (eventlet, production)")
+    parser.add_argument('--host', help="Bind address (default SIM_HOST or 0.0.0.0)")
+    parser.add_argument('--port', type=int, help="Port (default SIM_PORT or 5002)")
+    parser.add_argument('--backlog', type=int, default=1024, help="Listen backlog")
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    import app
+    import structured_log
+    t_import = time.perf_counter() - t0
+    structured_log.setup()
+    log = logging.getLogger('nav.http')
+
+    host = args.host or app.SIM_HOST
+    port = args.port or app.SIM_PORT
+    t0 = time.perf_counter()
+    sock = eventlet.listen((host, port), backlog=args.backlog)
+    t_bind = time.perf_counter() - t0
+
+    def stop(signum, frame):
+        raise SystemExit(0) # eventlet.wsgi.server closes the listener and returns
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    if app.FRAME_BROKER:
+        app.start_simulation()
+    log.info("Listening", extra={'host': host, 'port': port, 'import_ms': round(t_import * 1000),
+                                 'bind_ms': round(t_bind * 1000),
+                                 'startup_ms': round((time.perf_counter() - STARTED_AT) * 1000)})
+    try:
+        eventlet.wsgi.server(sock, app.app, log_output=False)
+    finally:
+        app.shutdown()
+        structured_log.shutdown()
+
+
+if __name__ == '__main__':
+    # Shard workers re-import this file as __mp_main__: patch only in the real launcher
+    import eventlet
+    eventlet.monkey_patch()
+    main()
@@ -0,0 +1,524 @@
+#!/usr/bin/env python3
+"""
+server_test.py
+
+Standalone checks for the server-side modules (no running server needed):
+ - Frame pipeline: drop policies keep the right frames and carry every
+   event; a full queue never leaves a gap in the recorded HISTORY
+ - Broker: length-prefixed framing survives arbitrary splits, frames reach
+   subscribers byte-for-byte, a subscriber that stops reading is dropped;
+   a joining gateway viewer never resets the mission
+ - Timeline HTTP API (live run): stale run tokens get 409, settled ranges
+   are immutable and revalidate with 304, the open tail's ETag follows new
+   ticks, /events filters match the event store
+ - Compressed store: bodies round-trip through every encoding and the disk,
+   memory stays within its byte budget, failed writes leave no temp files;
+   precompressed responses revalidate with 304
+ - Streaming KPIs: JSON array / gzip / NDJSON files give the same row as
+   the frame list, the incremental array parser survives tiny reads, budget
+   exports keep the tick-weighted ratios, legacy tick-less files still parse
+ - Sweep: grids expand to every combination (unknown keys rejected), each
+   point's rows match a direct run, a repeated sweep is served from the run
+   cache and a widened grid only computes the new points
+ - Telemetry: NDJSON batches (arrays, bad lines, stale seqs) keep the latest
+   report per vehicle, TCP lines split across reads and UDP replays arrive
+   whole, mirrored vehicles never shadow simulated agents
+ - Structured log: the rate limit is per message template and reports what
+   it suppressed, per-category levels apply, the ring buffer and JSON file
+   carry the structured fields, recent() filters by level and category
+
+Usage: python server_test.py   (or: python -m pytest server_test.py)
+"""
+import gzip
+import io
+import json
+import logging
+import math
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+import analytics
+import broker
+import structured_log
+import sweep
+import telemetry
+import http_compression
+from flask import Flask
+from frame_pipeline import FramePipeline
+
+
+def frames_with_events(n):
+    return [{'tick': t, 'events': [{'tick': t, 'type': 'E'}]} for t in range(n)]
+
+
+def test_pipeline_policies():
+    for policy, kept in (('drop_oldest', [7, 8, 9]), ('drop_newest', [0, 1, 2])):
+        handled = []
+        pipeline = FramePipeline(lambda frame, **flags: handled.append(frame), maxsize=3, policy=policy)
+        for frame in frames_with_events(10): # No worker yet: the queue fills up
+            pipeline.submit(frame)
+        assert pipeline.dropped == 7 and pipeline.queue.qsize() == 3, policy
+        worker = threading.Thread(target=pipeline.run)
+        worker.start()
+        assert pipeline.close()
+        worker.join()
+        assert [f['tick'] for f in handled] == kept, policy
+        # Events of dropped frames ride along with the next handled frame
+        assert sorted(e['tick'] for f in handled for e in f['events']) == list(range(10)), policy
+
+    # Back-pressure: nothing is dropped, the producer waits for the worker
+    handled = []
+    pipeline = FramePipeline(lambda frame, **flags: (time.sleep(0.001), handled.append(frame)),
+                             maxsize=2, policy='block')
+    worker = threading.Thread(target=pipeline.run)
+    worker.start()
+    for frame in frames_with_events(50):
+        pipeline.submit(frame)
+    assert pipeline.close()
+    worker.join()
+    assert pipeline.dropped == 0 and pipeline.max_depth <= 3
+    assert [f['tick'] for f in handled] == list(range(50))
+
+    try:
+        FramePipeline(print, policy='drop_all')
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("unknown policy accepted")
+
+
+def test_history_survives_drops():
+    import app
+    app.init_simulation(seed=3)
+    app.SIM_MODE = 'RUNNING'
+    # A tiny queue nobody drains: almost every frame is dropped on the wire
+    app.PIPELINE = FramePipeline(app.publish_frame, maxsize=2)
+    first = app.WORLD.tick
+    for _ in range(40):
+        app.WORLD.step()
+        app.submit_frame(history=app.HISTORY)
+    assert app.PIPELINE.dropped == 38
+    assert [f['tick'] for f in app.HISTORY] == list(range(first + 1, first + 41))
+    recorded = [evt for f in app.HISTORY for evt in f['events']]
+    assert recorded == [evt for evt in app.WORLD.event_store.events if evt['tick'] > first]
+
+
+def test_broker_framing():
+    bodies = [b'S' + b'viewer', b'P' + b'viewer\0' + b'x' * 70000, b'P' + b'control\0{}']
+    wire = b''.join(broker.HEADER.pack(len(body)) + body for body in bodies)
+    for step in (1, 3, 4096, len(wire)):
+        buf = bytearray()
+        out = []
+        for k in range(0, len(wire), step):
+            buf += wire[k:k + step]
+            out.extend(broker.split_messages(buf))
+        assert out == bodies and not buf, step
+    assert broker.parse_publish(bodies[1]) == ('viewer', b'x' * 70000)
+    body = 'Pviewer\0帧'.encode('utf-8')
+    assert broker.encode(b'P', 'viewer', '帧') == broker.HEADER.pack(len(body)) + body
+
+
+def test_broker_fanout():
+    path = os.path.join(tempfile.mkdtemp(), 'broker.sock')
+    server = broker.Broker(path, max_pending=1024 * 1024)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    while not os.path.exists(path):
+        time.sleep(0.01)
+
+    fast = broker.BrokerClient(path)
+    fast.subscribe(broker.VIEWER_TOPIC)
+    slow = broker.BrokerClient(path) # Subscribes, then never reads
+    slow.subscribe(broker.VIEWER_TOPIC)
+    publisher = broker.BrokerClient(path)
+    time.sleep(0.1)
+
+    payloads = [json.dumps([k, 'p' * 30000]) for k in range(200)]
+    received = []
+
+    def read_fast():
+        deadline = time.monotonic() + 20
+        while len(received) < len(payloads) and time.monotonic() < deadline:
+            received.extend(payload.decode('utf-8') for _, payload in fast.poll())
+            time.sleep(0.001)
+
+    reader = threading.Thread(target=read_fast)
+    reader.start()
+    for payload in payloads: # 6 MB in total, paced so the reader keeps up
+        publisher.publish(broker.VIEWER_TOPIC, payload)
+        time.sleep(0.002)
+    reader.join()
+    assert received == payloads
+    assert slow.sock not in server.inbox and len(server.inbox) == 2
+    # The slow subscriber gets what was already sent, then the broker hangs up
+    slow.sock.settimeout(5)
+    try:
+        while slow.sock.recv(1 << 20):
+            pass
+    except (ConnectionError, socket.timeout) as e:
+        assert not isinstance(e, socket.timeout), "slow subscriber still connected"
+    for client in (fast, slow, publisher):
+        client.close()
+
+
+def test_gateway_join_keeps_mission():
+    import app
+
+    class Control:
+        def __init__(self, *events):
+            self.messages = [(broker.CONTROL_TOPIC, json.dumps({'event': e, 'data': None})) for e in events]
+
+        def poll(self):
+            messages, self.messages = self.messages, []
+            return messages
+
+    app.init_simulation(seed=4)
+    app.PIPELINE = FramePipeline(app.publish_frame, maxsize=8)
+    world = app.WORLD
+    world.step()
+    app.PUBLISHER = Control('join', 'join')
+    app.drain_control()
+    assert app.WORLD is world and world.tick == 1
+    app.PUBLISHER = Control('reset_simulation')
+    app.drain_control()
+    assert app.WORLD is not world and app.WORLD.tick == 0
+    app.PUBLISHER = None
+
+
+def test_compressed_store():
+    root = tempfile.mkdtemp()
+    body = json.dumps([{'tick': t, 'x': t * 0.5} for t in range(2000)]).encode('utf-8')
+    store = http_compression.CompressedStore(root, memory_bytes=3 * len(body))
+    built = []
+
+    def build(data=body):
+        built.append(1)
+        return data
+
+    bodies, _ = store.get('k0', build, persist=True)
+    for encoding in http_compression.ENCODINGS:
+        assert len(bodies[encoding]) < len(body)
+    assert bodies[None] == body and gzip.decompress(bodies['gzip']) == body
+    # A fresh store reads the persisted entry back instead of rebuilding it
+    assert http_compression.CompressedStore(root).get('k0', build, persist=True)[0] == bodies and len(built) == 1
+
+    for k in range(1, 40):
+        store.get(f'k{k}', build)
+    assert store._bytes <= store.memory_bytes and len(store._memory) >= 2
+    assert store._bytes == sum(size for _, size in store._memory.values())
+    assert 'k39' in store._memory and 'k1' not in store._memory
+    store.get('huge', lambda: os.urandom(4 * len(body))) # Over budget: served, never kept
+    assert 'huge' not in store._memory and 'k39' in store._memory
+
+    real = os.replace
+    def failing(src, dst):
+        raise OSError("disk full")
+    os.replace = failing
+    try:
+        store.get('k-fail', build, persist=True) # Logged, still served
+    finally:
+        os.replace = real
+    leftovers = [name for _, _, names in os.walk(root) for name in names if name.endswith('.tmp')]
+    assert not leftovers, leftovers
+
+    app = Flask(__name__)
+    with app.test_request_context(headers={'Accept-Encoding': 'gzip'}):
+        first = http_compression.precompressed_response('r1', lambda: body)
+        assert first.status_code == 200 and first.headers['Content-Encoding'] == 'gzip'
+        etag = first.headers['ETag']
+    with app.test_request_context(headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag}):
+        assert http_compression.precompressed_response('r1', lambda: body).status_code == 304
+    with app.test_request_context(headers={'If-None-Match': '"other"'}):
+        plain = http_compression.precompressed_response('r1', lambda: body)
+        assert plain.status_code == 200 and plain.get_data() == body and 'Content-Encoding' not in plain.headers
+
+
+def test_timeline_endpoints():
+    import app
+    app.init_simulation(seed=11)
+    app.SIM_MODE = 'RUNNING'
+    app.PIPELINE = FramePipeline(app.publish_frame, maxsize=8)
+
+    def advance(n):
+        for _ in range(n):
+            app.WORLD.step()
+            app.submit_frame(history=app.HISTORY)
+
+    advance(300)
+    client = app.app.test_client()
+    meta = client.get('/timeline/meta').get_json()
+    run = meta['run']
+    assert meta['frames'] == 300 and meta['last_tick'] == 300 and not meta['complete']
+
+    stale = client.get('/timeline/range?run=live-old&from_tick=1&to_tick=5')
+    assert stale.status_code == 409 and stale.get_json()['run'] == run
+
+    settled = client.get(f'/timeline/range?run={run}&from_tick=10&to_tick=50')
+    assert settled.status_code == 200 and 'immutable' in settled.headers['Cache-Control']
+    assert [f['tick'] for f in settled.get_json()] == list(range(10, 51))
+    again = client.get(f'/timeline/range?run={run}&from_tick=10&to_tick=50',
+                       headers={'If-None-Match': settled.headers['ETag']})
+    assert again.status_code == 304
+
+    tail = client.get(f'/timeline/range?run={run}&from_tick=250')
+    assert tail.headers['Cache-Control'] == 'no-cache' and len(tail.get_json()) == 51
+    etag = tail.headers['ETag']
+    assert client.get(f'/timeline/range?run={run}&from_tick=250', headers={'If-None-Match': etag}).status_code == 304
+    advance(1)
+    grown = client.get(f'/timeline/range?run={run}&from_tick=250', headers={'If-None-Match': etag})
+    assert grown.status_code == 200 and grown.headers['ETag'] != etag and len(grown.get_json()) == 52
+
+    thinned = client.get(f'/timeline/range?run={run}&budget=20').get_json()
+    ticks = [f['tick'] for f in thinned]
+    assert ticks == sorted(set(ticks)) and len(ticks) < 301
+
+    events = client.get('/events?type=HUMAN_DETECTED').get_json()
+    assert events['events'] == app.WORLD.event_store.query(event_type='HUMAN_DETECTED')
+    assert events['count'] == len(events['events']) > 0
+
+    app.reset_simulation({'seed': 11})
+    assert client.get(f'/timeline/range?run={run}&from_tick=10&to_tick=50').status_code == 409
+
+
+def test_streaming_kpis():
+    import timeline_lod
+    from engine import run_batch
+
+    frames = run_batch(seed=11)
+    expected = analytics.run_kpis(frames)
+    assert expected['targets'] == expected['rescued'] > 0
+    assert expected['mission_ticks'] == frames[-1]['tick'] - frames[0]['tick']
+    assert 0 < expected['coverage'] <= 1 and 0 <= expected['ugv_idle_ratio'] <= 1
+
+    text = json.dumps(frames, ensure_ascii=False)
+    assert list(analytics.iter_json_array(io.StringIO(text), chunk_size=7)) == frames
+    assert list(analytics.iter_json_array(io.StringIO(' [ ] '))) == []
+
+    root = tempfile.mkdtemp()
+    paths = {name: os.path.join(root, name) for name in ('run.json', 'run.json.gz', 'run.ndjson')}
+    with open(paths['run.json'], 'w', encoding='utf-8') as f:
+        f.write(text)
+    with gzip.open(paths['run.json.gz'], 'wt', encoding='utf-8') as f:
+        f.write(text)
+    with open(paths['run.ndjson'], 'w', encoding='utf-8') as f:
+        f.writelines(json.dumps(frame, ensure_ascii=False) + '\n' for frame in frames)
+    for name, path in paths.items():
+        assert analytics.run_kpis(path) == expected, name
+
+    # Frames are weighted by the tick gap, so thinning keeps the UGV ratio and milestones
+    thinned = analytics.run_kpis(timeline_lod.select(frames, 150))
+    assert thinned['ugv_idle_ratio'] == expected['ugv_idle_ratio']
+    for name in ('mission_ticks', 'rescued') + analytics.TARGET_METRICS:
+        assert thinned[name] == expected[name], name
+
+    # Oldest schema: agents only, no ticks, lower-case types and no states
+    legacy = [{'agents': [{'id': 'drone1', 'type': 'drone', 'x': x, 'y': 8.0, 'z': 0.0},
+                          {'id': 'ugv1', 'type': 'ugv', 'x': 0.0, 'y': 0.0, 'z': 0.0}]}
+              for x in range(-20, 21, 2)]
+    row = analytics.run_kpis(legacy)
+    assert row['mission_ticks'] == len(legacy) - 1 and row['targets'] == 0
+    assert row['ugv_idle_ratio'] == 0 and row['coverage'] > 0
+
+    summary = analytics.summarize([expected, row])
+    assert summary['mission_ticks']['runs'] == 2 and summary['time_to_rescue']['runs'] == 1
+    assert summary['time_to_rescue']['mean'] == expected['time_to_rescue']
+    assert all(math.isnan(stats['mean']) for stats in analytics.summarize([]).values())
+
+
+def test_sweep():
+    from engine import run_batch
+    from run_cache import RunCache
+
+    assert sweep.parse_values('8,1.5,true,fast') == [8, 1.5, True, 'fast']
+    assert sweep.expand_grid({'ugv_count': [2, 3], 'confirm_count': [1]}) == \
+        [{'ugv_count': 2, 'confirm_count': 1}, {'ugv_count': 3, 'confirm_count': 1}]
+    assert sweep.expand_grid({}) == [{}]
+    try:
+        sweep.expand_grid({'no_such_key': [1]})
+    except KeyError:
+        pass
+    else:
+        raise AssertionError("unknown config key accepted")
+
+    cache = RunCache(tempfile.mkdtemp())
+    points = sweep.expand_grid({'ugv_count': [2, 3]})
+    seeds = [0, 1]
+    results = dict((sweep.point_label(p), rows) for p, rows in sweep.sweep(points, seeds, jobs=1, cache=cache))
+    assert sorted(results) == ['ugv_count=2', 'ugv_count=3']
+    assert results['ugv_count=3'][1] == analytics.run_kpis(run_batch({'ugv_count': 3}, seed=1))
+
+    # Everything is cached now: the pool must not be started again
+    real = sweep.ProcessPoolExecutor
+    def no_pool(*args, **kwargs):
+        raise AssertionError("cached sweep started a process pool")
+    sweep.ProcessPoolExecutor = no_pool
+    try:
+        again = dict((sweep.point_label(p), rows) for p, rows in sweep.sweep(points, seeds, cache=RunCache(cache.root)))
+    finally:
+        sweep.ProcessPoolExecutor = real
+    assert again == results
+
+    # Widening the grid only runs the new point, and cached points come first
+    wider = sweep.expand_grid({'ugv_count': [2, 3, 4]})
+    widened = RunCache(cache.root)
+    order = [sweep.point_label(p) for p, _ in sweep.sweep(wider, seeds, jobs=1, cache=widened)]
+    assert order == ['ugv_count=2', 'ugv_count=3', 'ugv_count=4']
+    assert widened.hits == 4 and widened.misses == 2
+
+
+def test_telemetry_ingest():
+    from engine import World
+
+    assert telemetry.parse_address('5005') == ('0.0.0.0', 5005)
+    assert telemetry.parse_address('10.0.0.2:6000', '127.0.0.1') == ('10.0.0.2', 6000)
+
+    ingest = telemetry.TelemetryIngest()
+    ingest.feed(b'\n'.join([
+        b'{"id": "R1", "x": 1, "z": 2, "seq": 5}',
+        b'[{"id": "R2", "type": "UGV", "x": 3, "z": 4}, {"id": "R3", "type": "BOAT", "x": 0, "z": 0}]',
+        b'{"id": "R1", "x": 9, "z": 9, "seq": 4}', # Reordered datagram: older than seq 5
+        b'{"id": "R4", "x": NaN, "z": 0}',
+        b'not json',
+        b'',
+        b'{"id": "R1", "x": 1.5, "y": 10, "z": 2.5, "seq": 6, "state": "PATROL"}',
+    ]))
+    assert ingest.stats() == {'reports': 3, 'stale': 1, 'bad': 3, 'clients': 0}
+    latest = ingest.take()
+    assert latest == {'R1': {'type': 'UAV', 'x': 1.5, 'y': 10.0, 'z': 2.5, 'state': 'PATROL'},
+                      'R2': {'type': 'UGV', 'x': 3.0, 'y': 0.0, 'z': 4.0, 'state': None}}
+    assert ingest.take() == {}
+
+    world = World(None, 3)
+    world.mirror(dict(latest, UAV1={'type': 'UAV', 'x': 0.0, 'y': 0.0, 'z': 0.0, 'state': None}))
+    world.step()
+    agents = {a['id']: a for a in world.build_state()['agents']}
+    assert agents['R1']['role'] == 'MIRROR' and (agents['R1']['x'], agents['R1']['z']) == (1.5, 2.5)
+    assert agents['UAV1'].get('role') != 'MIRROR'
+
+    ingest = telemetry.TelemetryIngest(udp=('127.0.0.1', 0), tcp=('127.0.0.1', 0))
+    bound = {key.fileobj.type: key.fileobj.getsockname() for key in ingest.selector.get_map().values()}
+    udp, tcp = bound[socket.SOCK_DGRAM], bound[socket.SOCK_STREAM]
+
+    def wait_for(n):
+        deadline = time.monotonic() + 5
+        while ingest.counts['reports'] < n and time.monotonic() < deadline:
+            ingest.poll(timeout=0.05)
+
+    client = socket.create_connection(tcp)
+    line = json.dumps({'id': 'T1', 'x': 1, 'z': 2, 'seq': 1}).encode('utf-8') + b'\n'
+    for k in range(len(line)): # One byte at a time: only whole lines are parsed
+        client.sendall(line[k:k + 1])
+        ingest.poll(timeout=0.01)
+    wait_for(1)
+    assert ingest.take() == {'T1': {'type': 'UAV', 'x': 1.0, 'y': 0.0, 'z': 2.0, 'state': None}}
+    assert ingest.stats()['clients'] == 1 and ingest.counts['bad'] == 0
+    client.close()
+
+    recording = os.path.join(tempfile.mkdtemp(), 'flight.ndjson')
+    with open(recording, 'w', encoding='utf-8') as f:
+        for k in range(500):
+            f.write(json.dumps({'id': f'U{k % 5}', 'x': k, 'z': -k, 'seq': k, 't': k * 0.001}) + '\n')
+    sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    datagrams = []
+    sent = telemetry.replay(recording, lambda payload: (datagrams.append(len(payload)), sender.sendto(payload, udp)),
+                            speed=0)
+    sender.close()
+    assert sent == 500 and max(datagrams) <= telemetry.MAX_DATAGRAM
+    wait_for(501)
+    assert ingest.counts['reports'] == 501 and ingest.counts['stale'] == 0
+    assert {a_id: r['x'] for a_id, r in ingest.take().items()} == {f'U{k}': 495.0 + k for k in range(5)}
+    ingest.close()
+
+
+def test_structured_log():
+    limit = structured_log.RateLimit(limit=3, window=10.0)
+
+    def passes(msg, created, name='nav.test'):
+        record = logging.LogRecord(name, logging.INFO, __file__, 0, msg, None, None)
+        record.created = created
+        return limit.filter(record), record
+
+    assert [passes("Burst %s", t)[0] for t in range(5)] == [True, True, True, False, False]
+    assert passes("Other", 5)[0] and passes("Burst %s", 5, 'nav.sim')[0] # Separate budgets
+    allowed, record = passes("Burst %s", 10.5) # New window: reports what the last one dropped
+    assert allowed and record.suppressed == 2
+    assert not hasattr(passes("Burst %s", 11)[1], 'suppressed')
+
+    assert structured_log.parse_levels(' sim=debug, session=WARNING,bogus') == {'sim': 'DEBUG', 'session': 'WARNING'}
+
+    root = logging.getLogger(structured_log.ROOT)
+    saved = root.handlers[:], root.propagate, root.level
+    path = os.path.join(tempfile.mkdtemp(), 'log.ndjson')
+    stream = io.StringIO()
+    structured_log.RING.clear()
+    structured_log.setup(level='DEBUG', levels={'quiet': 'WARNING'}, path=path, stream=stream)
+    try:
+        log = logging.getLogger('nav.test')
+        quiet = logging.getLogger('nav.quiet')
+        log.debug("Heartbeat", extra={'tick': 7, 'phase': 'PATROL', 'where': (1, 2)})
+        quiet.info("Not shown")
+        quiet.warning("Shown")
+        for k in range(structured_log.RATE_LIMIT + 10):
+            log.info("Step %d", k)
+        try:
+            raise KeyError('x')
+        except KeyError:
+            log.exception("Failed")
+    finally:
+        structured_log.shutdown()
+        root.handlers[:], root.propagate = saved[:2]
+        root.setLevel(saved[2])
+        logging.getLogger('nav.quiet').setLevel(logging.NOTSET)
+
+    entries = structured_log.recent(1000)
+    with open(path, 'r', encoding='utf-8') as f:
+        assert [json.loads(line) for line in f] == entries
+    assert len(entries) == 3 + structured_log.RATE_LIMIT
+    assert entries[0]['tick'] == 7 and entries[0]['where'] == '(1, 2)' and entries[0]['cat'] == 'test'
+    assert [e['msg'] for e in structured_log.recent(cat='quiet')] == ["Shown"]
+    assert [e['msg'] for e in structured_log.recent(level='warning')] == ["Shown", "Failed"]
+    assert 'KeyError' in entries[-1]['exc'] and 'KeyError' in stream.getvalue()
+    assert entries[-2]['msg'] == f"Step {structured_log.RATE_LIMIT - 1}"
+    assert [e['msg'] for e in structured_log.recent(2, cat='test')] == [entries[-2]['msg'], "Failed"]
+    assert 'tick=7' in stream.getvalue().splitlines()[0]
+    try:
+        structured_log.recent(level='loud')
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("unknown level accepted")
+
+
+CHECKS = [
+    test_pipeline_policies,
+    test_history_survives_drops,
+    test_broker_framing,
+    test_broker_fanout,
+    test_gateway_join_keeps_mission,
+    test_timeline_endpoints,
+    test_compressed_store,
+    test_streaming_kpis,
+    test_sweep,
+    test_telemetry_ingest,
+    test_structured_log,
+]
+
+
+def main():
+    failed = 0
+    for check in CHECKS:
+        try:
+            check()
+            print(f"[ok]   {check.__name__}")
+        except Exception as e:
+            failed += 1
+            print(f"[FAIL] {check.__name__}: {e!r}")
+    print(f"\n{len(CHECKS) - failed}/{len(CHECKS)} checks passed")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,218 @@
+"""
+structured_log.py
+
+Structured, non-blocking logging for the server processes.
+
+Code logs through the stdlib (logging.getLogger('nav.<category>')) with
+optional structured fields in `extra`:
+
+    LOG.info("Heartbeat", extra={'tick': world.tick, 'phase': world.phase})
+
+After setup() a record costs the caller a level check, a rate-limit check
+and a queue put. Formatting and terminal / file writes happen on one writer
+thread, a real OS thread even when eventlet has patched threading, so slow
+terminal I/O never shows up in tick latency. The writer also keeps the last
+RING_SIZE records in memory for the /debug/logs endpoint (recent()).
+
+- Levels are per category: SIM_LOG_LEVELS="sim=DEBUG,session=WARNING"
+  (others: SIM_LOG_LEVEL, default INFO).
+- Rate limiting: at most RATE_LIMIT records per RATE_WINDOW seconds for one
+  (category, message template); the rest are counted and the next record
+  that gets through carries the count as 'suppressed'.
+- SIM_LOG_FILE also writes every record there as one JSON object per line.
+"""
+import importlib
+import json
+import logging
+import os
+import sys
+import time
+from collections import deque
+from logging.handlers import QueueHandler
+
+ROOT = 'nav'
+RING_SIZE = 2000
+RATE_LIMIT = 20
+RATE_WINDOW = 10.0
+WRITE_BATCH = 256 # Records formatted and written per terminal write
+MAX_RATE_KEYS = 10000 # Log with constant messages (details in `extra`), so keys stay few
+
+# Attributes every LogRecord has; anything else on a record came in through `extra`
+_STANDARD = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime', 'taskName'}
+
+RING = deque(maxlen=RING_SIZE)
+_WRITER = None
+
+
+def _original(name):
+    """
+    The unpatched stdlib module: the writer is a real OS thread, so under
+    eventlet it must not touch green threads, locks or queues
+    """
+    if 'eventlet' in sys.modules:
+        from eventlet import patcher
+        if patcher.is_monkey_patched('thread'):
+            return patcher.original(name)
+    return importlib.import_module(name)
+
+
+def fields(record):
+    """The structured fields of a record (its `extra`)"""
+    return {k: v for k, v in vars(record).items() if k not in _STANDARD}
+
+
+def to_dict(record):
+    out = {
+        'ts': round(record.created, 3),
+        'level': record.levelname,
+        'cat': record.name[len(ROOT) + 1:] if record.name.startswith(ROOT + '.') else record.name,
+        'msg': record.getMessage(),
+    }
+    for k, v in fields(record).items():
+        out[k] = v if isinstance(v, (str, int, float, bool, type(None), list, dict)) else str(v)
+    if record.exc_info:
+        out['exc'] = logging.Formatter().formatException(record.exc_info)
+    return out
+
+
+class RateLimit(logging.Filter):
+    """Per (logger, message template) budget of RATE_LIMIT records per RATE_WINDOW seconds"""
+
+    def __init__(self, limit=RATE_LIMIT, window=RATE_WINDOW):
+        super().__init__()
+        self.limit = limit
+        self.window = window
+        self.windows = {} # key -> [window start, records passed, records suppressed]
+
+    def filter(self, record):
+        key = (record.name, record.msg)
+        now = record.created
+        w = self.windows.get(key)
+        if w is None and len(self.windows) >= MAX_RATE_KEYS:
+            self.windows.clear()
+        if w is None or now - w[0] >= self.window:
+            suppressed = w[2] if w is not None else 0
+            w = self.windows[key] = [now, 0, 0]
+            if suppressed:
+                record.suppressed = suppressed
+        if w[1] >= self.limit:
+            w[2] += 1
+            return False
+        w[1] += 1
+        return True
+
+
+class _Enqueue(QueueHandler):
+    def prepare(self, record):
+        # Merge args now (they may change later); exceptions are formatted by the writer
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+class _Writer:
+    """Drains the queue on an OS thread: ring buffer, terminal, optional JSON file"""
+
+    def __init__(self, queue, stream, path):
+        self.empty = queue.Empty
+        self.queue = queue.SimpleQueue() # put never blocks; get blocks only the writer's thread
+        self.stream = stream
+        self.file = open(path, 'a', encoding='utf-8') if path else None
+        self.thread = _original('threading').Thread(target=self.run, name='log-writer', daemon=True)
+        self.thread.start()
+
+    def run(self):
+        stop = False
+        while not stop:
+            batch = [self.queue.get()]
+            # Write whatever else is already queued in one go
+            while len(batch) < WRITE_BATCH:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except self.empty:
+                    break
+            if any(record is None for record in batch): # shutdown() sentinel
+                stop = True
+                batch = [record for record in batch if record is not None]
+            self.write(batch)
+
+    def write(self, batch):
+        lines = []
+        for record in batch:
+            entry = to_dict(record)
+            RING.append(entry)
+            extra = ' '.join(f"{k}={v}" for k, v in entry.items() if k not in ('ts', 'level', 'cat', 'msg', 'exc'))
+            line = f"{time.strftime('%H:%M:%S', time.localtime(entry['ts']))} {entry['level']:<7} {entry['cat']}: {entry['msg']}"
+            lines.append(line + (f" ({extra})" if extra else '') + ('\n' + entry['exc'] if 'exc' in entry else ''))
+            if self.file is not None:
+                self.file.write(json.dumps(entry, ensure_ascii=False, default=str) + '\n')
+        if not lines:
+            return
+        try:
+            self.stream.write('\n'.join(lines) + '\n')
+            self.stream.flush()
+        except (OSError, ValueError):
+            pass
+        if self.file is not None:
+            self.file.flush()
+
+
+def parse_levels(text):
+    """'sim=DEBUG,session=WARNING' -> {'sim': 'DEBUG', 'session': 'WARNING'}"""
+    levels = {}
+    for item in (text or '').split(','):
+        if '=' in item:
+            cat, level = item.split('=', 1)
+            levels[cat.strip()] = level.strip().upper()
+    return levels
+
+
+def setup(level=None, levels=None, path=None, stream=None):
+    """Route every 'nav.*' logger through the queue (call once, from the launcher)"""
+    global _WRITER
+    if _WRITER is not None:
+        return
+    _WRITER = _Writer(_original('queue'), stream or sys.stdout,
+                      path if path is not None else os.environ.get('SIM_LOG_FILE'))
+
+    handler = _Enqueue(_WRITER.queue)
+    handler.addFilter(RateLimit())
+    root = logging.getLogger(ROOT)
+    root.handlers[:] = [handler]
+    root.propagate = False
+    root.setLevel(level or os.environ.get('SIM_LOG_LEVEL', 'INFO').upper())
+    per_cat = parse_levels(os.environ.get('SIM_LOG_LEVELS'))
+    per_cat.update(levels or {})
+    for cat, lvl in per_cat.items():
+        logging.getLogger(f"{ROOT}.{cat}").setLevel(lvl)
+
+
+def shutdown(timeout=2.0):
+    """Write out what is queued and stop the writer"""
+    global _WRITER
+    writer = _WRITER
+    if writer is None:
+        return
+    _WRITER = None
+    writer.queue.put(None)
+    writer.thread.join(timeout)
+    if writer.file is not None:
+        writer.file.close()
+
+
+def recent(n=200, level=None, cat=None):
+    """The last n ring-buffer records, optionally at or above `level` / of one category"""
+    min_level = logging.getLevelName(level.upper()) if level else 0
+    if not isinstance(min_level, int):
+        raise ValueError(f"Unknown level: {level}")
+    out = []
+    for entry in reversed(list(RING)): # Snapshot: the writer thread keeps appending
+        if len(out) >= n:
+            break
+        if cat and entry['cat'] != cat:
+            continue
+        if min_level and logging.getLevelName(entry['level']) < min_level:
+            continue
+        out.append(entry)
+    out.reverse()
+    return out
@@ -0,0 +1,151 @@
+"""
+sweep.py
+
+Parameter sweeps over the simulator, for tuning thresholds offline.
+
+Every point of the grid (one combination of config overrides) is run for each
+seed at full speed across a process pool. A run only keeps its KPI row
+(analytics.py), cached per (config, seed) in the run cache, so re-running a
+sweep, or widening its grid, only computes the points that are missing.
+Each point is reported as soon as all its seeds are done:
+
+    python sweep.py --param sensor_radius=8,10,12 --param confirm_count=1,2 --seeds 20
+    python sweep.py --grid grid.json --seeds 50 --jobs 8 --csv sweep.csv
+
+A grid file maps config keys to lists of values, e.g.
+    {"hover_ticks": [30, 60], "ugv_speed": [0.5, 0.75, 1.0], "ugv_count": [2, 3]}
+"""
+import argparse
+import csv
+import itertools
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import analytics
+from engine import iter_frames, make_config, make_world
+from run_cache import RunCache
+
+# Columns of the streamed table (means over seeds); --csv writes every metric
+TABLE_METRICS = ('rescued', 'mission_ticks', 'time_to_detect', 'detect_to_confirm',
+                 'confirm_to_dispatch', 'time_to_rescue', 'ugv_idle_ratio', 'coverage')
+
+
+def parse_values(text):
+    """'8,10,12' -> [8, 10, 12]; each value is read as JSON, falling back to a plain string"""
+    values = []
+    for token in text.split(','):
+        try:
+            values.append(json.loads(token))
+        except ValueError:
+            values.append(token)
+    return values
+
+
+def expand_grid(grid):
+    """Every combination of a {key: [values]} grid, as a list of override dicts"""
+    keys = list(grid)
+    make_config({k: grid[k][0] for k in keys if grid[k]}) # Reject unknown keys up front
+    return [dict(zip(keys, combo)) for combo in itertools.product(*(grid[k] for k in keys))]
+
+
+def simulate_kpis(seed, config):
+    """KPI row of one run, streamed straight from the World (no timeline is kept)"""
+    kpis = analytics.RunKPIs(config)
+    world = make_world(config, seed)
+    try:
+        for frame in iter_frames(world):
+            kpis.feed(frame)
+    finally:
+        if hasattr(world, 'close'):
+            world.close()
+    return kpis.result()
+
+
+def run_point(overrides, seed, cache_dir):
+    """Pool task: cached KPI row of one (overrides, seed) run"""
+    cfg = make_config(overrides)
+    return RunCache(cache_dir).get_or_compute("kpis", cfg, seed, lambda: simulate_kpis(seed, cfg))
+
+
+def sweep(points, seeds, jobs=None, cache=None):
+    """
+    Run every (point, seed) and yield (point, rows) as each point completes.
+    Cached results are yielded first without touching the pool.
+    """
+    cache = cache or RunCache()
+    rows = [dict() for _ in points]
+    missing = {}
+    for i, overrides in enumerate(points):
+        cfg = make_config(overrides)
+        for seed in seeds:
+            row = cache.get("kpis", cfg, seed)
+            if row is None:
+                missing.setdefault(i, []).append(seed)
+            else:
+                rows[i][seed] = row
+        if i not in missing:
+            yield overrides, [rows[i][s] for s in seeds]
+    if not missing:
+        return
+
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = {pool.submit(run_point, points[i], seed, cache.root): (i, seed)
+                   for i, pending in missing.items() for seed in pending}
+        for future in as_completed(futures):
+            i, seed = futures[future]
+            rows[i][seed] = future.result()
+            missing[i].remove(seed)
+            if not missing[i]:
+                yield points[i], [rows[i][s] for s in seeds]
+                rows[i] = None # Only the point's summary is needed from here on
+
+
+def point_label(overrides):
+    return ' '.join(f"{k}={v}" for k, v in overrides.items()) or 'defaults'
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run a parameter grid across a process pool")
+    parser.add_argument("--param", action="append", default=[], metavar="KEY=V1,V2,...",
+                        help="Config key and the values to sweep (repeatable)")
+    parser.add_argument("--grid", help="JSON file mapping config keys to value lists")
+    parser.add_argument("--seeds", type=int, default=10, help="Seeds 0..N-1 per point")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count(), help="Worker processes")
+    parser.add_argument("--csv", help="Also write per-point means of every KPI here")
+    args = parser.parse_args()
+
+    grid = {}
+    if args.grid:
+        with open(args.grid, 'r', encoding='utf-8') as f:
+            grid.update(json.load(f))
+    for spec in args.param:
+        key, _, values = spec.partition('=')
+        grid[key.strip()] = parse_values(values)
+    points = expand_grid(grid)
+    seeds = list(range(args.seeds))
+    print(f"Sweeping {len(points)} points x {len(seeds)} seeds ({args.jobs} workers)")
+
+    csv_file = open(args.csv, 'w', newline='', encoding='utf-8') if args.csv else None
+    writer = csv.writer(csv_file) if csv_file else None
+    results = []
+    try:
+        if writer:
+            writer.writerow(list(grid) + list(analytics.METRICS))
+        print(analytics.format_row(('point',) + TABLE_METRICS, first_width=40))
+        for overrides, rows in sweep(points, seeds, args.jobs):
+            summary = analytics.summarize(rows)
+            means = {m: summary[m]['mean'] for m in analytics.METRICS}
+            results.append((overrides, means))
+            if writer:
+                writer.writerow([overrides.get(k) for k in grid] + [means[m] for m in analytics.METRICS])
+                csv_file.flush()
+            print(analytics.format_row((point_label(overrides),) + tuple(means[m] for m in TABLE_METRICS),
+                                       first_width=40), flush=True)
+    finally:
+        if csv_file:
+            csv_file.close()
+
+    if results:
+        best = min(results, key=lambda r: (-r[1]['rescued'], r[1]['mission_ticks']))
+        print(f"\nBest (most rescued, then shortest mission): {point_label(best[0])}")
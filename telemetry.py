@@ -0,0 +1,283 @@
+"""
+telemetry.py
+
+External telemetry: mirror real vehicles next to the simulated ones.
+
+Vehicles (or a bridge in front of them) send position reports as NDJSON,
+one JSON object per line, either as UDP datagrams (any number of lines per
+datagram) or over a TCP stream:
+
+    {"id": "R1", "type": "UAV", "x": -12.5, "y": 10.0, "z": 33.1, "state": "PATROL", "seq": 812}
+
+'type' is UAV or UGV (default UAV), 'y' defaults to 0, 'state' is a UAV /
+UGV state name and 'seq' (optional) lets UDP reordering be detected: a
+report older than the last one accepted for its vehicle is dropped. A line
+may also hold a JSON array of reports.
+
+TelemetryIngest reads the sockets from a background task, a bounded number
+of datagrams / reads per poll, and only keeps the latest report per vehicle.
+The simulation loop calls take() once per tick, a dict swap, and hands the
+result to World.mirror(), so ingest rate never shows up in the tick.
+
+Record and replay:
+
+    python telemetry.py record --udp 5005 flight.ndjson
+    python telemetry.py replay flight.ndjson --udp 127.0.0.1:5005 --speed 4
+    python telemetry.py replay flight.ndjson --tcp 127.0.0.1:5006 --speed 0   # as fast as possible
+
+Recorded lines are reports plus "t", their arrival time in seconds.
+"""
+import argparse
+import json
+import math
+import selectors
+import socket
+import time
+
+AGENT_TYPES = ('UAV', 'UGV')
+RECV_BUFFER = 4 * 1024 * 1024 # Kernel UDP buffer: absorbs bursts between polls
+MAX_DATAGRAM = 8192 # Replay batches lines into datagrams of at most this many bytes
+MAX_READS_PER_POLL = 256 # Bounds one poll, so the tick loop always gets the CPU back
+MAX_LINE = 1024 * 1024 # A TCP client that sends a longer line is disconnected
+POLL_INTERVAL = 0.005 # Seconds between polls of the background task
+
+
+def parse_address(text, default_host='0.0.0.0'):
+    """'5005' or 'host:5005' -> (host, port)"""
+    host, _, port = text.rpartition(':')
+    return (host or default_host, int(port))
+
+
+class TelemetryIngest:
+    def __init__(self, udp=None, tcp=None):
+        """udp / tcp: (host, port) to listen on (either or both)"""
+        self.selector = selectors.DefaultSelector()
+        self.latest = {} # Agent id -> latest report since the last take()
+        self.seq = {} # Agent id -> last accepted seq
+        self.buffers = {} # TCP connection -> partial line
+        self.counts = {'reports': 0, 'stale': 0, 'bad': 0}
+        self.listeners = [] # Called with every accepted raw report (see record())
+        self.closed = False
+        if udp is not None:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RECV_BUFFER)
+            sock.bind(udp)
+            sock.setblocking(False)
+            self.selector.register(sock, selectors.EVENT_READ, self._read_udp)
+        if tcp is not None:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            sock.bind(tcp)
+            sock.listen()
+            sock.setblocking(False)
+            self.selector.register(sock, selectors.EVENT_READ, self._accept)
+
+    # --- Sockets ---
+    def serve(self, sleep=time.sleep):
+        """Background loop (sleep: socketio.sleep under the live server)"""
+        while not self.closed:
+            self.poll()
+            sleep(POLL_INTERVAL)
+
+    def poll(self, timeout=0):
+        """Read whatever is pending without blocking (bounded per socket)"""
+        for key, _ in self.selector.select(timeout):
+            key.data(key.fileobj)
+
+    def _read_udp(self, sock):
+        for _ in range(MAX_READS_PER_POLL):
+            try:
+                data = sock.recv(65535)
+            except (BlockingIOError, InterruptedError):
+                return
+            self.feed(data)
+
+    def _accept(self, sock):
+        try:
+            conn, _ = sock.accept()
+        except (BlockingIOError, InterruptedError):
+            return
+        conn.setblocking(False)
+        self.buffers[conn] = b''
+        self.selector.register(conn, selectors.EVENT_READ, self._read_tcp)
+
+    def _read_tcp(self, conn):
+        try:
+            data = conn.recv(1 << 16)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            data = b''
+        if not data:
+            self._drop(conn)
+            return
+        buf = self.buffers[conn] + data
+        end = buf.rfind(b'\n')
+        if end >= 0:
+            self.feed(buf[:end])
+            buf = buf[end + 1:]
+        if len(buf) > MAX_LINE:
+            self._drop(conn)
+            return
+        self.buffers[conn] = buf
+
+    def _drop(self, conn):
+        self.selector.unregister(conn)
+        self.buffers.pop(conn, None)
+        conn.close()
+
+    def close(self):
+        self.closed = True
+        for key in list(self.selector.get_map().values()):
+            key.fileobj.close()
+        self.selector.close()
+
+    # --- Reports ---
+    def feed(self, data):
+        """Parse a chunk of complete NDJSON lines"""
+        lines = [line for line in data.split(b'\n') if line.strip()]
+        if not lines:
+            return
+        try:
+            # One parse for the whole batch; a bad line sends us line by line
+            items = json.loads(b'[' + b','.join(lines) + b']')
+        except ValueError:
+            items = []
+            for line in lines:
+                try:
+                    items.append(json.loads(line))
+                except ValueError:
+                    self.counts['bad'] += 1
+        for item in items:
+            if isinstance(item, list):
+                for report in item:
+                    self.accept(report)
+            else:
+                self.accept(item)
+
+    def accept(self, report):
+        counts = self.counts
+        try:
+            a_id = str(report['id'])
+            x, y, z = float(report['x']), float(report.get('y', 0.0)), float(report['z'])
+            a_type = report.get('type', 'UAV')
+        except (TypeError, KeyError, ValueError, AttributeError):
+            counts['bad'] += 1
+            return
+        if a_type not in AGENT_TYPES or not (math.isfinite(x) and math.isfinite(y) and math.isfinite(z)):
+            counts['bad'] += 1
+            return
+        seq = report.get('seq')
+        if isinstance(seq, (int, float)):
+            last = self.seq.get(a_id)
+            if last is not None and seq <= last:
+                counts['stale'] += 1
+                return
+            self.seq[a_id] = seq
+        self.latest[a_id] = {'type': a_type, 'x': x, 'y': y, 'z': z, 'state': report.get('state')}
+        counts['reports'] += 1
+        for listener in self.listeners:
+            listener(report)
+
+    def take(self):
+        """Latest report per vehicle since the last call ({agent id: report})"""
+        latest, self.latest = self.latest, {}
+        return latest
+
+    def stats(self):
+        return dict(self.counts, clients=len(self.buffers))
+
+
+# --- Record / replay ---
+def record(ingest, path):
+    """Write every accepted report, stamped with its arrival time, until interrupted"""
+    start = time.monotonic()
+    with open(path, 'w', encoding='utf-8') as f:
+        def stamped(report):
+            f.write(json.dumps(dict(report, t=round(time.monotonic() - start, 4)), ensure_ascii=False) + '\n')
+        ingest.listeners.append(stamped)
+        try:
+            while True:
+                ingest.poll(timeout=0.5)
+                ingest.take()
+        except KeyboardInterrupt:
+            pass
+
+
+def replay(path, send, speed=1.0):
+    """
+    Stream a recorded file through send(payload) at `speed` x real time
+    (0 = no pacing). Lines due together go out as batches of up to
+    MAX_DATAGRAM bytes. Returns the number of reports sent.
+    """
+    start = time.monotonic()
+    t0 = None
+    batch, size, sent = [], 0, 0
+
+    def flush():
+        nonlocal batch, size
+        if batch:
+            send(b'\n'.join(batch))
+            batch, size = [], 0
+
+    with open(path, 'rb') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if speed > 0:
+                t = json.loads(line).get('t', 0.0)
+                if t0 is None:
+                    t0 = t
+                wait = start + (t - t0) / speed - time.monotonic()
+                if wait > 0:
+                    flush() # Everything due so far goes out before we wait
+                    time.sleep(wait)
+            if size + len(line) + 1 > MAX_DATAGRAM:
+                flush()
+            batch.append(line)
+            size += len(line) + 1
+            sent += 1
+    flush()
+    return sent
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[1])
+    sub = parser.add_subparsers(dest='command', required=True)
+    rec = sub.add_parser('record', help='listen and write the reports to an NDJSON file')
+    rec.add_argument('path')
+    rep = sub.add_parser('replay', help='stream a recorded NDJSON file to the ingest endpoint')
+    rep.add_argument('path')
+    rep.add_argument('--speed', type=float, default=1.0, help='x real time, 0 = as fast as possible')
+    for p in (rec, rep):
+        p.add_argument('--udp', help='[host:]port')
+        p.add_argument('--tcp', help='[host:]port')
+    args = parser.parse_args()
+    if not (args.udp or args.tcp):
+        parser.error('one of --udp / --tcp is required')
+
+    if args.command == 'record':
+        ingest = TelemetryIngest(udp=parse_address(args.udp) if args.udp else None,
+                                 tcp=parse_address(args.tcp) if args.tcp else None)
+        print(f"Recording to {args.path} (Ctrl+C to stop)")
+        record(ingest, args.path)
+        print(f"Recorded {ingest.counts['reports']} reports")
+        return
+
+    if args.udp:
+        addr = parse_address(args.udp, '127.0.0.1')
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        send = lambda payload: sock.sendto(payload, addr)
+    else:
+        sock = socket.create_connection(parse_address(args.tcp, '127.0.0.1'))
+        send = lambda payload: sock.sendall(payload + b'\n')
+    started = time.monotonic()
+    n = replay(args.path, send, args.speed)
+    elapsed = time.monotonic() - started
+    print(f"Replayed {n} reports in {elapsed:.2f}s ({n / max(elapsed, 1e-9):.0f}/s)")
+    sock.close()
+
+
+if __name__ == '__main__':
+    main()
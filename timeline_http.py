@@ -0,0 +1,105 @@
+"""
+timeline_http.py
+
+Tick-range access to recorded timelines for the chunked playback loader
+(index.html), shared by app.py and gateway.py:
+
+    GET /timeline/meta   -> {run, first_tick, last_tick, frames, complete}
+    GET /timeline/range?run=..&from_tick=..&to_tick=..[&budget=..]
+                         -> frames with from_tick <= tick <= to_tick
+    GET /events?type=..&agent=..&target=..&from_tick=..&to_tick=..&limit=..
+                         -> {count, events} from the run's indexed event store
+
+Both accept the seeded-run parameters of /export_timeline (seed, uav, ugv,
+max_ticks); without a seed they address the live HISTORY.
+
+Every range is addressed by a run token (new per live reset, derived from
+the cache key for seeded runs), so a range of a finished run can never
+change: it gets a strong ETag and "Cache-Control: immutable". Ranges a live
+run has already passed are immutable as well (history is append-only); only
+the open tail is revalidated on every request. Settled ranges are stored
+precompressed (http_compression.py).
+"""
+import hashlib
+import json
+
+from flask import Response, jsonify, request
+
+import http_compression
+import mission_generator
+import timeline_lod
+from engine import make_config
+from run_cache import run_key
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+
+def seeded_config(args):
+    config = make_config()
+    config['uav_count'] = args.get('uav', config['uav_count'], type=int)
+    config['ugv_count'] = args.get('ugv', config['ugv_count'], type=int)
+    config['max_ticks'] = args.get('max_ticks', config['max_ticks'], type=int)
+    return config
+
+
+def seeded_run_token(seed, config):
+    return 'seed-' + run_key("timeline", config, seed)[:16]
+
+
+def seeded_run(seed, config, cache):
+    """(frames, pyramid, run token) of a cached offline run"""
+    frames = mission_generator.cached_mission(seed, config, cache)
+    pyramid = cache.get_or_compute("timeline_lod", config, seed, lambda: timeline_lod.build_pyramid(frames))
+    return frames, pyramid, seeded_run_token(seed, config)
+
+
+def meta_response(frames, run, complete):
+    return jsonify({
+        'run': run,
+        'first_tick': frames[0]['tick'] if frames else 0,
+        'last_tick': frames[-1]['tick'] if frames else 0,
+        'frames': len(frames),
+        'complete': complete,
+    })
+
+
+def range_response(frames, run, complete, pyramid=None):
+    """Serve one tick range of frames (or 409 if the client holds a stale run token)"""
+    args = request.args
+    if args.get('run') != run:
+        return jsonify({'error': 'stale run', 'run': run}), 409
+    from_tick = args.get('from_tick', type=int)
+    to_tick = args.get('to_tick', type=int)
+    budget = args.get('budget', type=int)
+
+    def body():
+        chosen = timeline_lod.select(frames, budget, from_tick, to_tick, pyramid if complete else None)
+        return json.dumps(chosen, ensure_ascii=False, separators=(',', ':'))
+
+    last_tick = frames[-1]['tick'] if frames else 0
+    key = f"range:{run}:{from_tick}:{to_tick}:{budget}"
+    if complete or (to_tick is not None and to_tick < last_tick):
+        # Settled range: compressed once, then served from the store (on disk for seeded runs)
+        return http_compression.precompressed_response(key, body, cache_control=IMMUTABLE,
+                                                       persist=run.startswith('seed-'))
+
+    # Open tail of a live run: revalidated every time, compressed per response
+    etag = hashlib.sha1(f"{key}:{len(frames)}".encode('utf-8')).hexdigest()
+    headers = {'ETag': f'"{etag}"', 'Cache-Control': 'no-cache'}
+    if http_compression.etag_matches(etag):
+        return Response(status=304, headers=headers)
+    return Response(body(), mimetype='application/json', headers=headers)
+
+
+def events_response(store):
+    """/events?type=&agent=&target=&from_tick=&to_tick=&limit= against an EventStore"""
+    args = request.args
+    matches = store.query(
+        event_type=args.get('type'),
+        agent=args.get('agent'),
+        target=args.get('target'),
+        from_tick=args.get('from_tick', type=int),
+        to_tick=args.get('to_tick', type=int),
+        limit=args.get('limit', type=int),
+    )
+    return jsonify({'count': len(matches), 'events': matches})
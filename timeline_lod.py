@@ -0,0 +1,173 @@
+"""
+timeline_lod.py
+
+Level-of-detail for recorded timelines (playback / scrubbing).
+
+A full timeline has one frame per tick, but at high playback speeds or when
+scrubbing a long mission most of them are never drawn. Decimation keeps:
+
+  * every keyframe: frames carrying events, and frames where any agent or
+    target state, a detected_by set or the mission phase changes (plus the
+    first and last frame), so nothing the log or the UI reacts to is lost;
+  * the frames needed to redraw every agent's trajectory within a tolerance:
+    a time-synchronised Douglas-Peucker pass per agent (the error is the
+    distance between the real position and the position interpolated between
+    the kept frames at the same tick).
+
+The tolerance is raised until the frame count fits the requested budget
+(keyframes always stay, so a budget below the keyframe count is exceeded).
+
+A pyramid is a list of nested levels, each holding at most half the frames
+of the one below. It is built once, when a mission completes, and stored as
+frame indices only, so any (budget, tick range) request is a cheap lookup.
+"""
+import bisect
+
+MIN_LEVEL_FRAMES = 64
+START_EPSILON = 0.05 # World units
+MAX_EPSILON = 1000.0
+
+
+def _signature(frame):
+    return (
+        frame.get('mission_phase'),
+        tuple(a.get('state') for a in frame.get('agents', ())),
+        tuple((t.get('state'), len(t.get('detected_by', ()))) for t in frame.get('targets', ())),
+    )
+
+
+def keyframe_indices(frames, candidates=None):
+    """Indices (into frames) that must survive decimation"""
+    idx = range(len(frames)) if candidates is None else candidates
+    keep = set()
+    prev = None
+    for i in idx:
+        frame = frames[i]
+        sig = _signature(frame)
+        if frame.get('events') or sig != prev:
+            keep.add(i)
+        prev = sig
+    if idx:
+        keep.add(idx[0])
+        keep.add(idx[-1])
+    return keep
+
+
+def simplify_track(ticks, xs, ys, zs, epsilon):
+    """Time-synchronised Douglas-Peucker; returns positions (into the inputs) to keep"""
+    n = len(ticks)
+    if n <= 2:
+        return list(range(n))
+    eps_sq = epsilon * epsilon
+    keep = [False] * n
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        a, b = stack.pop()
+        if b - a < 2:
+            continue
+        span = ticks[b] - ticks[a] or 1
+        worst, worst_d = -1, eps_sq
+        for k in range(a + 1, b):
+            u = (ticks[k] - ticks[a]) / span
+            dx = xs[a] + (xs[b] - xs[a]) * u - xs[k]
+            dy = ys[a] + (ys[b] - ys[a]) * u - ys[k]
+            dz = zs[a] + (zs[b] - zs[a]) * u - zs[k]
+            d = dx * dx + dy * dy + dz * dz
+            if d > worst_d:
+                worst, worst_d = k, d
+        if worst >= 0:
+            keep[worst] = True
+            stack.append((a, worst))
+            stack.append((worst, b))
+    return [k for k in range(n) if keep[k]]
+
+
+def _tracks(frames, candidates):
+    """Per-agent (xs, ys, zs) columns over the candidate frames"""
+    columns = {}
+    for pos, i in enumerate(candidates):
+        for agent in frames[i].get('agents', ()):
+            col = columns.get(agent['id'])
+            if col is None:
+                # Agents present for part of the run only (should not happen) start from here
+                col = columns[agent['id']] = ([], [], [], [])
+            col[0].append(pos)
+            col[1].append(agent['x'])
+            col[2].append(agent['y'])
+            col[3].append(agent['z'])
+    return columns
+
+
+def decimate(frames, budget, candidates=None, keyframes=None):
+    """Sorted frame indices (a subset of candidates) that fit the budget as closely as possible"""
+    if candidates is None:
+        candidates = list(range(len(frames)))
+    if len(candidates) <= budget:
+        return list(candidates)
+    if keyframes is None:
+        keyframes = keyframe_indices(frames, candidates)
+    else:
+        keyframes = keyframes.intersection(candidates)
+    ticks = [frames[i].get('tick', i) for i in candidates]
+    tracks = _tracks(frames, candidates)
+
+    epsilon = START_EPSILON
+    while True:
+        keep = set(keyframes)
+        for positions, xs, ys, zs in tracks.values():
+            t = [ticks[p] for p in positions]
+            for k in simplify_track(t, xs, ys, zs, epsilon):
+                keep.add(candidates[positions[k]])
+        if len(keep) <= budget or epsilon >= MAX_EPSILON:
+            return sorted(keep)
+        epsilon *= 2
+
+
+def build_pyramid(frames, min_frames=MIN_LEVEL_FRAMES):
+    """
+    Nested LOD levels as JSON-ready data: levels[0] is the finest decimated
+    level (about half the frames), each next level about half of the previous.
+    """
+    keyframes = keyframe_indices(frames)
+    levels = []
+    current = list(range(len(frames)))
+    while len(current) > min_frames:
+        budget = max(min_frames, len(current) // 2)
+        nxt = decimate(frames, budget, current, keyframes)
+        if len(nxt) >= len(current):
+            break # Keyframes alone fill the level, coarser ones would be identical
+        levels.append(nxt)
+        current = nxt
+    return {'frames': len(frames), 'levels': levels}
+
+
+def _slice(indices, frames, from_tick, to_tick):
+    """The [from_tick, to_tick] window of `indices` (bisected in place: O(log n) per request)"""
+    if from_tick is None and to_tick is None:
+        return indices
+    tick = lambda i: frames[i].get('tick', i)
+    lo = 0 if from_tick is None else bisect.bisect_left(indices, from_tick, key=tick)
+    hi = len(indices) if to_tick is None else bisect.bisect_right(indices, to_tick, key=tick)
+    return indices[lo:hi]
+
+
+def select(frames, budget=None, from_tick=None, to_tick=None, pyramid=None):
+    """
+    Frames for one playback / scrub request: the finest pyramid level whose
+    [from_tick, to_tick] window fits the budget, or an on-the-fly decimation
+    when no pyramid exists yet (e.g. a mission still in progress).
+    """
+    window = _slice(range(len(frames)), frames, from_tick, to_tick)
+    if budget is None or len(window) <= budget:
+        return [frames[i] for i in window]
+    if pyramid is not None and pyramid.get('frames') == len(frames):
+        chosen = window
+        for level in pyramid['levels']:
+            chosen = _slice(level, frames, from_tick, to_tick)
+            if len(chosen) <= budget:
+                return [frames[i] for i in chosen]
+        # Even the coarsest level is too dense for this window: decimate it further
+        window = chosen
+    return [frames[i] for i in decimate(frames, budget, window)]
+